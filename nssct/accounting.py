@@ -0,0 +1,169 @@
+# -*- encoding: utf-8 -*-
+
+"""Attribute the cost of a check to the plugins causing it. Plugins run in
+tasks of the future module (see Controller.start_plugin), so the requests
+issued and the time spent running coroutines can be attributed to the
+plugin that started them. Facts computed once for several plugins are
+attributed to the plugin asking first. The report tells which plugins are
+worth optimising on a device.
+"""
+
+import collections
+import logging
+import time
+
+from . import engine
+from . import future
+from .trace import plugin_name
+
+logger = logging.getLogger(__name__)
+
+try:
+	cputime = time.thread_time
+except AttributeError:
+	try:
+		cputime = time.process_time
+	except AttributeError:
+		cputime = time.clock
+
+COLUMNS = ("requests", "varbinds", "cache_hits", "wall_ms", "cpu_ms")
+
+
+class PluginCosts(object):
+	"""Accumulates the costs of plugins. It is the task profiler of the
+	future module while a check runs.
+
+	@type costs: {str: collections.Counter}
+	@ivar costs: maps plugin names (None for work outside any plugin) to
+			counters of the COLUMNS
+	"""
+	def __init__(self, clock=time.time, cpuclock=cputime):
+		self.clock = clock
+		self.cpuclock = cpuclock
+		self.costs = collections.defaultdict(collections.Counter)
+		self.stack = []
+
+	def count(self, task, key, amount=1):
+		self.costs[None if task is None else plugin_name(task)][key] += amount
+
+	def enter(self, task):
+		self.stack.append([self.clock(), self.cpuclock(), 0.0, 0.0])  # starts and time of nested runs
+
+	def leave(self, task):
+		"""Attribute the time since the matching enter to the task excluding
+		the time of nested runs."""
+		start, cpustart, nested, cpunested = self.stack.pop()
+		wall = self.clock() - start
+		cpu = self.cpuclock() - cpustart
+		self.count(task, "wall_ms", 1000 * (wall - nested))
+		self.count(task, "cpu_ms", 1000 * (cpu - cpunested))
+		if self.stack:
+			self.stack[-1][2] += wall
+			self.stack[-1][3] += cpu
+
+	def rows(self):
+		"""
+		@rtype: [(str, collections.Counter)]
+		@returns: pairs of plugin name and costs sorted by decreasing wall
+				time
+
+		>>> costs = PluginCosts()
+		>>> costs.count("detect", "requests", 2)
+		>>> costs.count("cpu", "wall_ms", 5.0)
+		>>> [name for name, _ in costs.rows()]
+		['cpu', 'detect']
+		"""
+		return sorted(self.costs.items(), key=lambda item: (-item[1]["wall_ms"], -item[1]["requests"], str(item[0])))
+
+	def report(self):
+		"""
+		@rtype: [str]
+		@returns: lines of a table of the costs per plugin
+
+		>>> costs = PluginCosts()
+		>>> costs.count("detect", "requests", 2)
+		>>> costs.count("detect", "varbinds", 3)
+		>>> for line in costs.report(): print(line)
+		plugin  requests  varbinds  cache_hits  wall_ms  cpu_ms
+		detect  2         3         0           0.0      0.0
+		"""
+		table = [("plugin",) + COLUMNS]
+		for name, counter in self.rows():
+			table.append(("(none)" if name is None else name,) +
+						tuple("%.1f" % counter[key] if key.endswith("_ms") else str(counter[key]) for key in COLUMNS))
+		widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+		return ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in table]
+
+	def log(self, level=logging.DEBUG):
+		for line in self.report():
+			logger.log(level, "plugin costs: %s", line)
+
+
+class AccountingEngine(engine.AbstractEngine):
+	"""Counts the requests to another engine, the varbinds delivered and the
+	requests served by a CachingEngine without asking its underlying engine
+	for the plugin issuing them."""
+	def __init__(self, eng, costs):
+		"""
+		@type eng: AbstractEngine
+		@type costs: PluginCosts
+		"""
+		engine.AbstractEngine.__init__(self)
+		self.engine = eng
+		self.batching = eng.batching
+		self.costs = costs
+		self.saved = getattr(eng, "saved", None)  # a CachingEngine counts what it saved
+
+	def _request(self, function, *args):
+		task = future.current_task()
+		self.costs.count(task, "requests")
+		saved = 0 if self.saved is None else self.saved()
+		fut = function(*args)
+		if self.saved is not None:
+			self.costs.count(task, "cache_hits", self.saved() - saved)
+		return task, fut
+
+	def _countvalue(self, task, fut):
+		if fut.exception() is None:
+			self.costs.count(task, "varbinds")
+
+	def get(self, oid):
+		task, fut = self._request(self.engine.get, oid)
+		fut.add_done_callback(lambda fut: self._countvalue(task, fut))
+		return fut
+
+	def getnext(self, oid):
+		task, fut = self._request(self.engine.getnext, oid)
+		fut.add_done_callback(lambda fut: self._countvalue(task, fut))
+		return fut
+
+	def _countrows(self, task, fut):
+		if fut.exception() is not None:
+			return
+		rows, nextfut = fut.result()
+		self.costs.count(task, "varbinds", len(rows))
+		if nextfut is not None:
+			nextfut.add_done_callback(lambda nextfut: self._countrows(task, nextfut))
+
+	def walk(self, baseoid, startoid=None):
+		task, fut = self._request(self.engine.walk, baseoid, startoid)
+		fut.add_done_callback(lambda fut: self._countrows(task, fut))
+		return fut
+
+	def step(self):
+		return self.engine.step()
+
+
+def add_accounting_options(parser):
+	parser.add_argument("--plugin-costs", action="store_true",
+						help="log the requests, varbinds, cache hits and time per plugin at level INFO. This is also done at level DEBUG.")
+
+def setup_accounting(namespace):
+	"""
+	@rtype: PluginCosts or None
+	@returns: a PluginCosts if requested by the parsed arguments or debug
+			logging
+	"""
+	if namespace.plugin_costs or logger.isEnabledFor(logging.DEBUG):
+		return PluginCosts()
+	return None
@@ -52,3 +52,8 @@ class BackendBase(object):
 				res.append((noid, value))
 			oids, nextoids = nextoids, []
 		return res
+
+	def close(self):
+		"""Release the sockets and files held by the backend. It must not be
+		used afterwards."""
+		pass
@@ -32,14 +32,26 @@ class NetworkBackend(backend.BackendBase):
 		@param community: community string used to identify to the agent
 		@type engine: None or pysnmp.entity.engine.SnmpEngine
 		@raises socket.gaierror: if name resolution fails
+
+		The resolved ip address of the agent is available as the address
+		attribute.
 		"""
 		backend.BackendBase.__init__(self)
 		if isinstance(agent, str):
 			agent = (agent, 161)
 		self.authdata = pysnmp.entity.rfc3413.oneliner.cmdgen.CommunityData("unused parameter", community)
 		self.agent = pysnmp.entity.rfc3413.oneliner.cmdgen.UdpTransportTarget(agent)
+		self.address = self.agent.transportAddr[0]
 		self.cmdgen = pysnmp.entity.rfc3413.oneliner.cmdgen.AsynCommandGenerator(engine)
 
+	def close(self):
+		"""Close the transport of the SnmpEngine, which is opened by the first
+		query."""
+		snmpEngine = self.cmdgen.snmpEngine
+		if snmpEngine.transportDispatcher is not None:
+			snmpEngine.transportDispatcher.closeDispatcher()
+			snmpEngine.unregisterTransportDispatcher()
+
 	def get(self, oid):
 		fut = future.Future()
 		@future.future_completer(fut)
@@ -0,0 +1,60 @@
+# -*- encoding: utf-8 -*-
+
+"""Benchmarks for nssct. Every module in this package is a script to be run
+as python -m nssct.bench.<module> from the source tree. The results are
+printed as a table or, when given --json, as a machine readable document."""
+
+import glob
+import json
+import sys
+import time
+
+try:
+	process_time = time.process_time
+except AttributeError:
+	process_time = time.clock  # pylint: disable=E1101
+
+
+def case_files(pattern="cases/*.log"):
+	"""@returns: a sorted list of snmpwalk files"""
+	return sorted(glob.glob(pattern))
+
+
+def measure(function, mintime=1.0):
+	"""Call function without parameters repeatedly for at least mintime
+	seconds of wall clock time.
+	@rtype: (int, float, float)
+	@returns: the number of calls, wall clock seconds and cpu seconds spent
+	"""
+	calls = 0
+	start = time.time()
+	cpustart = process_time()
+	elapsed = 0.0
+	while elapsed < mintime:
+		function()
+		calls += 1
+		elapsed = time.time() - start
+	return calls, elapsed, process_time() - cpustart
+
+
+def add_output_options(parser):
+	parser.add_argument("--json", action="store_true", help="emit results as json")
+	parser.add_argument("--mintime", type=float, default=1.0, metavar="SECONDS",
+						help="minimum time spent measuring each item (default: %(default)s)")
+
+
+def emit(args, columns, rows, outp=sys.stdout):
+	"""Print the given rows either as json or as a table.
+	@type columns: [str]
+	@type rows: [dict]
+	"""
+	if args.json:
+		json.dump(rows, outp, indent=1, sort_keys=True)
+		outp.write("\n")
+		return
+	formatted = [[("%.6g" % row[col]) if isinstance(row[col], float) else str(row[col])
+					for col in columns] for row in rows]
+	widths = [max([len(col)] + [len(line[i]) for line in formatted]) for i, col in enumerate(columns)]
+	outp.write("  ".join(col.ljust(width) for col, width in zip(columns, widths)).rstrip() + "\n")
+	for line in formatted:
+		outp.write("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() + "\n")
@@ -0,0 +1,52 @@
+# -*- encoding: utf-8 -*-
+
+"""Report how many requests the CachingEngine saves when checking the
+recorded snmpwalks. Requests are saved by cache hits, cached NoSuchObject
+answers and by coalescing identical requests in flight. Independently of the
+cache, the controller shares walks of the same subtree between plugins."""
+
+import argparse
+
+from .. import controller
+from .. import engine
+from .. import report
+from ..backend import mock
+from ..plugins import detect
+from . import case_files, emit
+
+
+def check(eng):
+	control = controller.Controller(engine.CachingEngine(eng))
+	control.run(report.Collector(), [detect.detect])
+	return control
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--json", action="store_true", help="emit results as json")
+	parser.add_argument("--bulk", type=int, default=7, metavar="N", help="lookahead of the bulk engine (default: %(default)s)")
+	parser.add_argument("cases", nargs="*", help="snmpwalk files (default: cases/*.log)")
+	args = parser.parse_args()
+	rows = []
+	for filename in args.cases or case_files():
+		backend = mock.MockBackend(filename)
+		for name, eng in (("simple", engine.SimpleEngine(backend)),
+						("bulk", engine.BulkEngine(backend, lookahead=args.bulk))):
+			control = check(eng)
+			counters = control.engine.counters
+			row = dict(case=filename, engine=name)
+			for kind in ("get", "next", "walk"):
+				row["%s_forwarded" % kind] = counters["%s_miss" % kind]
+			row["hit"] = counters["get_hit"] + counters["next_hit"]
+			row["walk_rows_hit"] = counters["walk_hit"]
+			row["negative"] = counters["get_negative"]
+			row["coalesced"] = counters["get_coalesced"] + counters["next_coalesced"]
+			row["saved"] = row["hit"] + row["negative"] + row["coalesced"]
+			row["walk_rows_shared"] = control.counters["walk_shared_rows"]
+			rows.append(row)
+	emit(args, ["case", "engine", "get_forwarded", "next_forwarded", "walk_forwarded",
+				"hit", "walk_rows_hit", "negative", "coalesced", "saved", "walk_rows_shared"], rows)
+
+
+if __name__ == "__main__":
+	main()
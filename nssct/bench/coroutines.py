@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+
+"""Measure how many yields per second the @coroutine plugins achieve when
+checking the recorded snmpwalks. The backend is a MockBackend queried through
+a SimpleEngine, so this mostly measures the overhead of futures."""
+
+import argparse
+
+from .. import controller
+from .. import engine
+from .. import future
+from .. import report
+from ..backend import mock
+from ..plugins import detect
+from . import add_output_options, case_files, emit, measure
+
+
+class CountingGenerator(object):
+	"""Wraps a generator and counts the values it yields."""
+	def __init__(self, generator, counter):
+		self.generator = generator
+		self.counter = counter
+
+	def _count(self, func, *args):
+		value = func(*args)
+		self.counter[0] += 1
+		return value
+
+	def __next__(self):
+		try:
+			next_ = self.generator.__next__
+		except AttributeError:
+			next_ = self.generator.next
+		return self._count(next_)
+
+	next = __next__
+
+	def send(self, value):
+		return self._count(self.generator.send, value)
+
+	def throw(self, exc):
+		return self._count(self.generator.throw, exc)
+
+
+def count_yields(function):
+	"""Call function once and count the yields of all coroutines run.
+	@rtype: int
+	"""
+	counter = [0]
+	orig_init = future.GeneratedFuture.__init__
+	def counting_init(self, generator):
+		orig_init(self, CountingGenerator(generator, counter))
+	future.GeneratedFuture.__init__ = counting_init
+	try:
+		function()
+	finally:
+		future.GeneratedFuture.__init__ = orig_init
+	return counter[0]
+
+
+def check(backend, caching):
+	eng = engine.SimpleEngine(backend)
+	if caching:
+		eng = engine.CachingEngine(eng)
+	control = controller.Controller(eng)
+	control.run(report.Collector(), [detect.detect])
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--cache", action="store_true", help="put a CachingEngine in front")
+	parser.add_argument("cases", nargs="*", help="snmpwalk files (default: cases/*.log)")
+	add_output_options(parser)
+	args = parser.parse_args()
+	rows = []
+	for filename in args.cases or case_files():
+		backend = mock.MockBackend(filename)
+		run = lambda: check(backend, args.cache)
+		yields = count_yields(run)
+		calls, elapsed, cputime = measure(run, args.mintime)
+		rows.append(dict(case=filename, yields=yields, checks=calls,
+						seconds=elapsed, cpu=cputime,
+						yields_per_second=yields * calls / elapsed))
+	emit(args, ["case", "yields", "checks", "seconds", "yields_per_second"], rows)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,161 @@
+# -*- encoding: utf-8 -*-
+
+"""Check the recorded snmpwalks with every engine configuration and report
+the PDUs, varbinds and futures needed as well as the cpu time spent per
+check. The output of --json can be stored and passed as --baseline to a later
+run, which then fails if PDUs or cpu time grow beyond the given thresholds.
+PDUs are deterministic, so by default any growth is a regression. Cpu time
+is noisy and only fails beyond a relative threshold."""
+
+import argparse
+import collections
+import json
+import sys
+
+from .. import backend
+from .. import controller
+from .. import engine
+from .. import future
+from .. import report
+from ..backend import mock
+from ..plugins import detect
+from . import add_output_options, case_files, emit, measure
+
+COLUMNS = ["case", "engine", "get", "getnext", "getbulk", "pdus", "varbinds", "futures", "cpu_ms"]
+
+
+class CountingBackend(backend.BackendBase):
+	"""Counts the PDUs forwarded to another backend and the varbinds in
+	their responses."""
+	def __init__(self, back):
+		backend.BackendBase.__init__(self)
+		self.backend = back
+		self.counters = collections.Counter()
+
+	def get(self, oid):
+		self.counters["get"] += 1
+		self.counters["varbinds"] += 1
+		return self.backend.get(oid)
+
+	def getnext(self, oid):
+		self.counters["getnext"] += 1
+		self.counters["varbinds"] += 1
+		return self.backend.getnext(oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		self.counters["getbulk"] += 1
+		result = self.backend.getbulk(oids, nonrep, maxrep)
+		self.counters["varbinds"] += len(result)
+		return result
+
+
+def count_futures(function):
+	"""Call function once and count the futures created.
+	@rtype: int
+	"""
+	counter = [0]
+	orig_init = future.Future.__init__
+	def counting_init(self):
+		counter[0] += 1
+		orig_init(self)
+	future.Future.__init__ = counting_init
+	try:
+		function()
+	finally:
+		future.Future.__init__ = orig_init
+	return counter[0]
+
+
+def configurations(lookaheads):
+	"""
+	@type lookaheads: [int]
+	@rtype: [(str, function)]
+	@returns: pairs of a name and a function creating an engine for a backend
+	"""
+	configs = [("simple", engine.SimpleEngine)]
+	for lookahead in lookaheads:
+		configs.append(("bulk%d" % lookahead, lambda back, lookahead=lookahead: engine.BulkEngine(back, lookahead=lookahead)))
+	return configs + [(name + "+cache", lambda back, create=create: engine.CachingEngine(create(back)))
+						for name, create in configs]
+
+
+def check(eng):
+	control = controller.Controller(eng)
+	control.run(report.Collector(), [detect.detect])
+
+
+def run_matrix(cases, lookaheads, mintime):
+	"""
+	@type cases: [str]
+	@param cases: snmpwalk files
+	@type lookaheads: [int]
+	@type mintime: float
+	@rtype: [dict]
+	"""
+	rows = []
+	for filename in cases:
+		back = mock.MockBackend(filename)
+		for name, create in configurations(lookaheads):
+			counting = CountingBackend(back)
+			futures = count_futures(lambda: check(create(counting)))
+			calls, _, cputime = measure(lambda: check(create(back)), mintime)
+			row = dict(case=filename, engine=name, futures=futures, cpu_ms=1000 * cputime / calls)
+			for key in ("get", "getnext", "getbulk", "varbinds"):
+				row[key] = counting.counters[key]
+			row["pdus"] = row["get"] + row["getnext"] + row["getbulk"]
+			rows.append(row)
+	return rows
+
+
+def regressions(baseline, rows, max_pdus=0.0, max_cpu=0.25):
+	"""Compare rows with a baseline.
+	@type baseline: [dict]
+	@type rows: [dict]
+	@type max_pdus: float
+	@param max_pdus: is the tolerated relative increase of pdus
+	@type max_cpu: float
+	@param max_cpu: is the tolerated relative increase of cpu_ms
+	@rtype: [str]
+	@returns: descriptions of the regressions found
+
+	>>> regressions([dict(case="a", engine="simple", pdus=10, cpu_ms=1.0)],
+	...             [dict(case="a", engine="simple", pdus=11, cpu_ms=1.2)])
+	['a simple: pdus increased from 10 to 11']
+	"""
+	before = dict(((row["case"], row["engine"]), row) for row in baseline)
+	found = []
+	for row in rows:
+		old = before.get((row["case"], row["engine"]))
+		if old is None:
+			continue
+		for key, tolerance in (("pdus", max_pdus), ("cpu_ms", max_cpu)):
+			if row[key] > old[key] * (1 + tolerance):
+				found.append("%s %s: %s increased from %s to %s" % (row["case"], row["engine"], key, old[key], row[key]))
+	return found
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	add_output_options(parser)
+	parser.add_argument("--bulk", type=int, action="append", metavar="N",
+						help="lookahead of a bulk engine configuration. May be repeated. (default: 0, 3, 7 and 15)")
+	parser.add_argument("--baseline", metavar="FILE", help="compare with the output of an earlier run with --json")
+	parser.add_argument("--max-pdus", type=float, default=0.0, metavar="FRACTION",
+						help="tolerated relative increase of PDUs (default: %(default)s)")
+	parser.add_argument("--max-cpu", type=float, default=0.25, metavar="FRACTION",
+						help="tolerated relative increase of cpu time (default: %(default)s)")
+	parser.add_argument("cases", nargs="*", help="snmpwalk files (default: cases/*.log)")
+	args = parser.parse_args()
+	rows = run_matrix(args.cases or case_files(), args.bulk or [0, 3, 7, 15], args.mintime)
+	emit(args, COLUMNS, rows)
+	if args.baseline:
+		with open(args.baseline) as baselinefile:
+			found = regressions(json.load(baselinefile), rows, args.max_pdus, args.max_cpu)
+		for message in found:
+			sys.stderr.write("regression: %s\n" % message)
+		if found:
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,105 @@
+# -*- encoding: utf-8 -*-
+
+"""Measure how long importing the entry points of nssct takes in a fresh
+interpreter and compare it with a budget. With --top N the slowest modules
+imported are listed as well (requires python -X importtime). The budgets are
+enforced by the test suite, so raise them only knowingly."""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+from . import add_output_options, emit
+
+# module -> (budget in milliseconds, modules that must not be imported)
+BUDGETS = {
+	"nssct.main": (200, ["pysnmp.hlapi", "pysnmp.entity", "distutils", "nssct.plugins.brocade",
+						"nssct.plugins.cisco", "nssct.plugins.hp"]),
+	"nssct.client": (50, ["pysnmp", "nssct.engine"]),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.time()
+import %s
+elapsed = time.time() - start
+json.dump(dict(elapsed=elapsed, modules=sorted(sys.modules)), sys.stdout)
+"""
+
+def probe(module):
+	"""Import module in a fresh interpreter.
+	@type module: str
+	@rtype: (float, [str])
+	@returns: the seconds spent importing and the names of all modules loaded
+	"""
+	output = subprocess.check_output([sys.executable, "-c", _PROBE % module])
+	result = json.loads(output.decode("ascii"))
+	return result["elapsed"], result["modules"]
+
+
+def best_probe(module, repeat=5):
+	"""Like probe, but take the fastest of repeat imports."""
+	results = [probe(module) for _ in range(repeat)]
+	return min(results, key=lambda result: result[0])
+
+
+def violations(module, modules):
+	"""
+	@rtype: [str]
+	@returns: the forbidden modules that were imported along with module
+	"""
+	forbidden = BUDGETS[module][1]
+	return sorted(name for name in modules
+					if any(name == prefix or name.startswith(prefix + ".") for prefix in forbidden))
+
+
+def slowest(module, count):
+	"""
+	@rtype: [(str, int)]
+	@returns: the count modules with the largest self time in microseconds
+	"""
+	proc = subprocess.Popen([sys.executable, "-X", "importtime", "-c", "import %s" % module],
+							stderr=subprocess.PIPE)
+	_, err = proc.communicate()
+	times = []
+	for line in err.decode("utf-8").splitlines():
+		match = re.match(r'^import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)', line)
+		if match:
+			times.append((match.group(2), int(match.group(1))))
+	times.sort(key=lambda item: -item[1])
+	return times[:count]
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	add_output_options(parser)
+	parser.add_argument("--top", type=int, default=0, metavar="N",
+						help="list the N slowest modules. With --json the output becomes an object of the rows (modules) and the slowest modules per imported module (top).")
+	parser.add_argument("modules", nargs="*", help="modules to import (default: %s)" % " ".join(sorted(BUDGETS)))
+	args = parser.parse_args()
+	names = args.modules or sorted(BUDGETS)
+	rows = []
+	for module in names:
+		elapsed, modules = best_probe(module)
+		budget = BUDGETS.get(module, (None, []))[0]
+		rows.append(dict(module=module, ms=1000 * elapsed, budget_ms=budget, modules=len(modules),
+						forbidden=" ".join(violations(module, modules)) if module in BUDGETS else ""))
+	top = {}
+	if args.top:
+		for module in names:
+			top[module] = [dict(module=name, us=us) for name, us in slowest(module, args.top)]
+	if args.json and args.top:  # a single document
+		json.dump(dict(modules=rows, top=top), sys.stdout, indent=1, sort_keys=True)
+		sys.stdout.write("\n")
+		return
+	emit(args, ["module", "ms", "budget_ms", "modules", "forbidden"], rows)
+	if args.top:
+		for module in names:
+			sys.stdout.write("\nslowest modules imported by %s\n" % module)
+			emit(args, ["module", "us"], top[module])
+
+
+if __name__ == "__main__":
+	main()
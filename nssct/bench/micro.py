@@ -0,0 +1,288 @@
+# -*- encoding: utf-8 -*-
+
+"""Microbenchmarks of the hot paths of the ObjectCache and of futures on
+large sets of random oids. Every benchmark reports operations per second and
+the peak memory allocated while running it (requires tracemalloc). The output
+of --json can be stored and passed as --baseline to a later run, which then
+fails if a benchmark became slower or allocates more memory than tolerated."""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+from .. import cache
+from .. import future
+from . import add_output_options, emit
+
+COLUMNS = ["benchmark", "size", "ops", "seconds", "ops_per_sec", "peak_kb"]
+
+
+_random_oids = {}
+
+def random_oids(rng, count):
+	"""
+	@type rng: random.Random
+	@rtype: [(int,)]
+	@returns: count distinct oids below the enterprises subtree in random
+			order. Generating them takes longer than most benchmarks, so
+			they are reused for the same count and shuffled again.
+	"""
+	if count not in _random_oids:
+		oids = set()
+		while len(oids) < count:
+			oids.add((1, 3, 6, 1, 4, 1) + tuple(rng.randrange(64) for _ in range(rng.randrange(4, 10))))
+		_random_oids[count] = sorted(oids)
+	oids = _random_oids[count][:]
+	rng.shuffle(oids)
+	return oids
+
+
+def filled_cache(oids):
+	return cache.ObjectCache.frompairs((oid, i) for i, oid in enumerate(oids))
+
+
+# Every benchmark is a pair of functions. The first one prepares the state
+# for a run given the size and a random generator. The second one runs the
+# operations on the state and returns their number. Only the second one is
+# measured.
+
+def setup_frompairs(size, rng):
+	return [(oid, i) for i, oid in enumerate(random_oids(rng, size))]
+
+def run_frompairs(pairs):
+	cache.ObjectCache.frompairs(pairs)
+	return len(pairs)
+
+
+def setup_lookups(size, rng):
+	"""A filled cache and as many present as absent oids to look up. Absent
+	oids either are known to be missing or are not cached at all."""
+	oids = random_oids(rng, 2 * size)
+	lookups = oids[:]
+	rng.shuffle(lookups)
+	return filled_cache(oids[:size]), lookups
+
+def run_get(state):
+	objcache, lookups = state
+	get = objcache.get
+	for oid in lookups:
+		try:
+			get(oid)
+		except cache.NotCached:
+			pass
+	return len(lookups)
+
+def run_getnext(state):
+	objcache, lookups = state
+	getnext = objcache.getnext
+	for oid in lookups:
+		try:
+			getnext(oid)
+		except cache.NotCached:
+			pass
+	return len(lookups)
+
+
+def setup_setnext(size, rng):
+	"""Adjacent pairs of sorted oids in random order."""
+	oids = sorted(random_oids(rng, size + 1))
+	pairs = list(zip(oids, oids[1:]))
+	rng.shuffle(pairs)
+	return pairs
+
+def run_setnext(pairs):
+	objcache = cache.ObjectCache()
+	for oid, nextoid in pairs:
+		objcache.setnext(oid, nextoid)
+	return len(pairs)
+
+
+def setup_setend(size, rng):
+	"""A filled cache and descending end oids, each cutting off a few
+	entries."""
+	oids = random_oids(rng, size)
+	ends = sorted(rng.sample(oids, max(1, size // 10)), reverse=True)
+	return filled_cache(oids), ends
+
+def run_setend(state):
+	objcache, ends = state
+	for oid in ends:
+		objcache.setend(oid)
+	return len(ends)
+
+
+def setup_invalidate(size, rng):
+	oids = random_oids(rng, size)
+	return filled_cache(oids), oids[:max(1, size // 10)]
+
+def run_invalidate(state):
+	objcache, oids = state
+	for oid in oids:
+		objcache.invalidate(oid)
+	return len(oids)
+
+
+def setup_nextentry_sort(size, rng):
+	return [cache.NextEntry(oid, oid + (1,)) for oid in random_oids(rng, size)]
+
+def run_nextentry_sort(entries):
+	sorted(entries)
+	return len(entries)
+
+
+def setup_callbacks(size, rng):
+	return size
+
+def run_callbacks(size):
+	"""Complete futures with two callbacks each."""
+	callback = lambda fut: None
+	for i in range(size):
+		fut = future.Future()
+		fut.add_done_callback(callback)
+		fut.add_done_callback(callback)
+		fut.set_result(i)
+	return size
+
+
+def setup_coroutine_completed(size, rng):
+	return size
+
+def run_coroutine_completed(size):
+	"""Step a coroutine through futures that are already completed."""
+	done = future.completed()
+	@future.coroutine
+	def consumer():
+		for _ in range(size):
+			yield done
+	consumer()
+	return size
+
+
+def setup_coroutine_pending(size, rng):
+	return [future.Future() for _ in range(size)]
+
+def run_coroutine_pending(futs):
+	"""Step a coroutine waiting for futures completed later, as plugins
+	waiting for responses do."""
+	@future.coroutine
+	def consumer():
+		for fut in futs:
+			yield fut
+	consumer()
+	for i, fut in enumerate(futs):
+		fut.set_result(i)
+	return len(futs)
+
+
+BENCHMARKS = [
+	("cache_frompairs", setup_frompairs, run_frompairs),
+	("cache_get", setup_lookups, run_get),
+	("cache_getnext", setup_lookups, run_getnext),
+	("cache_setnext", setup_setnext, run_setnext),
+	("cache_setend", setup_setend, run_setend),
+	("cache_invalidate", setup_invalidate, run_invalidate),
+	("nextentry_sort", setup_nextentry_sort, run_nextentry_sort),
+	("future_callbacks", setup_callbacks, run_callbacks),
+	("coroutine_completed", setup_coroutine_completed, run_coroutine_completed),
+	("coroutine_pending", setup_coroutine_pending, run_coroutine_pending),
+]
+
+
+def peak_memory(setup, run, size, seed):
+	"""
+	@rtype: int or None
+	@returns: the peak number of bytes allocated by one run or None if
+			tracemalloc is unavailable
+	"""
+	if tracemalloc is None:
+		return None
+	state = setup(size, random.Random(seed))
+	tracemalloc.start()
+	try:
+		run(state)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+def run_benchmark(name, setup, run, size, mintime=1.0, seed=0):
+	"""Run a benchmark with fresh state until at least mintime seconds were
+	spent running it.
+	@rtype: dict
+	"""
+	ops = 0
+	elapsed = 0.0
+	repetition = 0
+	while elapsed < mintime or not ops:
+		state = setup(size, random.Random(seed + repetition))
+		start = time.time()
+		ops += run(state)
+		elapsed += time.time() - start
+		repetition += 1
+	peak = peak_memory(setup, run, size, seed)
+	return dict(benchmark=name, size=size, ops=ops, seconds=elapsed, ops_per_sec=ops / elapsed,
+				peak_kb=None if peak is None else peak / 1024.0)
+
+
+def regressions(baseline, rows, max_slowdown=0.2, max_memory=0.1):
+	"""Compare rows with a baseline of the same size.
+	@type max_slowdown: float
+	@param max_slowdown: is the tolerated relative decrease of ops_per_sec
+	@type max_memory: float
+	@param max_memory: is the tolerated relative increase of peak_kb
+	@rtype: [str]
+
+	>>> regressions([dict(benchmark="get", size=10, ops_per_sec=100.0, peak_kb=1.0)],
+	...             [dict(benchmark="get", size=10, ops_per_sec=70.0, peak_kb=1.0)])
+	['get: ops_per_sec decreased from 100.0 to 70.0']
+	"""
+	before = dict(((row["benchmark"], row["size"]), row) for row in baseline)
+	found = []
+	for row in rows:
+		old = before.get((row["benchmark"], row["size"]))
+		if old is None:
+			continue
+		if row["ops_per_sec"] < old["ops_per_sec"] * (1 - max_slowdown):
+			found.append("%s: ops_per_sec decreased from %s to %s" % (row["benchmark"], old["ops_per_sec"], row["ops_per_sec"]))
+		if None not in (row["peak_kb"], old["peak_kb"]) and row["peak_kb"] > old["peak_kb"] * (1 + max_memory):
+			found.append("%s: peak_kb increased from %s to %s" % (row["benchmark"], old["peak_kb"], row["peak_kb"]))
+	return found
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	add_output_options(parser)
+	parser.add_argument("--size", type=int, default=100000, metavar="N", help="number of oids (default: %(default)s)")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: %(default)s)")
+	parser.add_argument("--baseline", metavar="FILE", help="compare with the output of an earlier run with --json")
+	parser.add_argument("--max-slowdown", type=float, default=0.2, metavar="FRACTION",
+						help="tolerated relative decrease of operations per second (default: %(default)s)")
+	parser.add_argument("--max-memory", type=float, default=0.1, metavar="FRACTION",
+						help="tolerated relative increase of peak memory (default: %(default)s)")
+	parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+						help="benchmarks to run (default: all of %s)" % ", ".join(name for name, _, _ in BENCHMARKS))
+	args = parser.parse_args()
+	unknown = set(args.benchmarks) - set(name for name, _, _ in BENCHMARKS)
+	if unknown:
+		parser.error("unknown benchmarks: %s" % ", ".join(sorted(unknown)))
+	rows = [run_benchmark(name, setup, run, args.size, args.mintime, args.seed)
+			for name, setup, run in BENCHMARKS if not args.benchmarks or name in args.benchmarks]
+	emit(args, COLUMNS, rows)
+	if args.baseline:
+		with open(args.baseline) as baselinefile:
+			found = regressions(json.load(baselinefile), rows, args.max_slowdown, args.max_memory)
+		for message in found:
+			sys.stderr.write("regression: %s\n" % message)
+		if found:
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,67 @@
+# -*- encoding: utf-8 -*-
+
+"""Compare the latency of a check when starting the nssct command for every
+check with running nssct-client against a zygote or a daemon. Every check is
+a separate process as it would be when run by nagios. The checks use a
+recorded snmpwalk, so the numbers are dominated by startup costs."""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import add_output_options, case_files, emit, measure
+
+
+def wait_for(path, process, timeout=30.0):
+	deadline = time.time() + timeout
+	while not os.path.exists(path):
+		if process.poll() is not None or time.time() > deadline:
+			raise RuntimeError("server did not create %s" % path)
+		time.sleep(0.01)
+
+
+def run_check(command):
+	with open(os.devnull, "w") as devnull:
+		subprocess.call(command, stdout=devnull, stderr=devnull)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	add_output_options(parser)
+	parser.add_argument("case", nargs="?", help="snmpwalk file (default: first of cases/*.log)")
+	args = parser.parse_args()
+	case = args.case or case_files()[0]
+	check = ["--mock", case, "--level", "ERROR"]
+	directory = tempfile.mkdtemp()
+	rows = []
+	try:
+		modes = [("cli", None, [sys.executable, "-m", "nssct.main"])]
+		for server in ("zygote", "daemon"):
+			path = os.path.join(directory, server)
+			servercmd = [sys.executable, "-m", "nssct.%s" % server, "--socket", path, "--level", "ERROR"]
+			if server == "daemon":
+				servercmd += ["--mock-dir", os.path.dirname(os.path.abspath(case))]
+			modes.append((server, servercmd, [sys.executable, "-m", "nssct.client", "--socket", path]))
+		for name, servercmd, client in modes:
+			process = None
+			if servercmd is not None:
+				process = subprocess.Popen(servercmd)
+				wait_for(servercmd[4], process)
+			try:
+				calls, wall, _ = measure(lambda: run_check(client + check), args.mintime)
+			finally:
+				if process is not None:
+					process.terminate()
+					process.wait()
+			rows.append(dict(mode=name, checks=calls, ms_per_check=1000 * wall / calls))
+	finally:
+		shutil.rmtree(directory)
+	emit(args, ["mode", "checks", "ms_per_check"], rows)
+
+
+if __name__ == "__main__":
+	main()
@@ -51,11 +51,14 @@ class ObjectCache(object):
 			query for the first oid results in the latter.
 	@type last: (int,) or None
 	@ivar last: the last available oid, if known
+	@type missing: {(int,)}
+	@ivar missing: oids known not to exist although no NextEntry covers them
 	"""
 	def __init__(self):
 		self.oids = {}
 		self.nexts = []
 		self.last = None
+		self.missing = set()
 
 	def get(self, oid):
 		"""
@@ -67,6 +70,8 @@ class ObjectCache(object):
 			return self.oids[oid]
 		except KeyError:
 			pass
+		if oid in self.missing:
+			return pysnmp.proto.rfc1905.noSuchObject
 		i = bisect.bisect_left(self.nexts, NextEntry(oid, None))
 		if i > 0:
 			pair = self.nexts[i - 1]
@@ -122,7 +127,29 @@ class ObjectCache(object):
 		>>> c.get((1, 2))
 		'spam'
 		"""
-		self.oids[tuple(oid)] = value
+		oid = tuple(oid)
+		self.oids[oid] = value
+		self.missing.discard(oid)
+
+	def setnosuchobject(self, oid):
+		"""Remember that a GET query for oid yields no object. Unlike
+		setnext, this does not tell anything about neighbouring oids.
+
+		>>> c = ObjectCache()
+		>>> c.setnosuchobject((1, 2))
+		>>> isinstance(c.get((1, 2)), pysnmp.proto.rfc1905.NoSuchObject)
+		True
+		>>> c.getnext((1, 1)) # doctest: +IGNORE_EXCEPTION_DETAIL
+		Traceback (most recent call last):
+			....
+		NotCached:
+		>>> c.set((1, 2), 'spam')
+		>>> c.get((1, 2))
+		'spam'
+		"""
+		oid = tuple(oid)
+		if oid not in self.oids:
+			self.missing.add(oid)
 
 	def setnext(self, oid, nextoid):
 		"""Remember that the nextgreater oid than oid is nextoid. Any
@@ -220,6 +247,7 @@ class ObjectCache(object):
 			del self.oids[oid]
 		except KeyError:
 			pass
+		self.missing.discard(oid)
 		try:
 			i = self._getnextpointer(oid)[0]
 		except EndOfMib:
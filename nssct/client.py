@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+
+"""A thin replacement for the nssct command, that forwards its arguments to
+a running nssct-daemon. It accepts the same arguments as nssct. The socket
+of the daemon can be given as a leading --socket PATH or via the
+NSSCT_SOCKET environment variable.
+
+Only cheap modules are imported here, so starting the client does not pay
+for loading pysnmp and the plugins.
+"""
+
+import os
+import socket
+import sys
+
+from . import ipc
+from . import report
+
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv[1:]
+	path = os.environ.get("NSSCT_SOCKET", ipc.DEFAULT_SOCKET)
+	if argv[:1] == ["--socket"] and len(argv) > 1:
+		path = argv[1]
+		argv = argv[2:]
+	try:
+		response = ipc.request(path, argv)
+	except (socket.error, ipc.ProtocolError) as err:
+		sys.stdout.write("UNKNOWN - cannot talk to nssct daemon at %s: %s\n" % (path, err))
+		sys.exit(report.UNKNOWN)
+	sys.stderr.write(response.get("errors", ""))
+	sys.stdout.write(response.get("output", ""))
+	sys.exit(response.get("status", report.UNKNOWN))
+
+if __name__ == "__main__":
+	main()
@@ -1,18 +1,90 @@
 # -*- encoding: utf-8 -*-
 
+import collections
 import logging
 
+from . import engine
+from . import future
 from . import report
 
 logger = logging.getLogger(__name__)
 
+class Facts(object):
+	"""Facts about the checked device, such as its model or firmware version,
+	are computed at most once per check and shared by all plugins. A fact is
+	identified by a function taking the controller and returning a Future for
+	the value of the fact. The first plugin asking for a fact invokes this
+	function, later plugins receive the same Future.
+	"""
+
+	def __init__(self, controller):
+		self.controller = controller
+		self.futures = {}
+
+	def get(self, fact):
+		"""
+		@param fact: a function taking a Controller and returning a Future
+		@rtype: Future
+		"""
+		try:
+			return self.futures[fact]
+		except KeyError:
+			logger.debug("computing fact %r", fact)
+			fut = self.futures[fact] = fact(self.controller)
+			return fut
+
+	def set(self, fact, value):
+		"""Provide the value of a fact up front, e.g. when it is known from
+		the command line."""
+		self.futures[fact] = future.completed(value)
+
+
+class PluginSelection(object):
+	"""Decides which plugins are to be run. Plugins can be selected by their
+	function name or by the tags attached with plugins.tags. Untagged plugins
+	are always selected and so is everything if the selection is empty.
+
+	@type specs: frozenset
+	@ivar specs: are the selected names and tags
+	@type matched: bool
+	@ivar matched: is set when a tagged plugin is selected
+	"""
+	def __init__(self, specs=()):
+		"""
+		@type specs: [str]
+		"""
+		self.specs = frozenset(specs)
+		self.matched = False
+
+	def selects(self, plugin):
+		"""
+		@rtype: bool
+		"""
+		plugintags = getattr(plugin, "tags", None)
+		if not self.specs or plugintags is None:
+			return True
+		if plugin.__name__ in self.specs or plugintags & self.specs:
+			self.matched = True
+			return True
+		return False
+
+
 class Controller(object):
 	"""The controller keeps the pieces (engine, collector, and plugins)
 	together. The collector is just passed on to the plugins, the controller
-	does not operate itself on a collector. A plugin is a function that takes
-	references to the controller and the collector and returns a future.
-	Plugins will access the engine attribute of the controller to query SNMP
-	OIDs. They can also use the start_plugin method to start further plugins.
+	does not operate itself on a collector. It only asks the collector for
+	the one to be passed to a particular plugin using for_plugin. A plugin
+	is a function that takes references to the controller and the collector
+	and returns a future. Plugins will access the engine attribute of the
+	controller to query SNMP OIDs. They can also use the start_plugin method
+	to start further plugins. Facts about the device shared by plugins are
+	available from the facts attribute. Only plugins selected by the
+	selection attribute are started. Walks should be started using the walk
+	and walk_all methods, such that plugins walking the same subtree share
+	the queries. The counters attribute counts walks started and joined,
+	rows shared and plugins started, failed or stalled. Plugins run in a
+	task of the future module, the plugin itself, and can be traced by
+	passing a Tracer.
 
 	The main reason to use a controller object instead of just starting
 	plugins is to notice when a plugin fails to complete. Without the
@@ -20,29 +92,101 @@ class Controller(object):
 	anything noticing.
 	"""
 
-	def __init__(self, engine):
+	def __init__(self, engine, selection=None, tracer=None):
+		"""
+		@type selection: PluginSelection or None
+		@param selection: defaults to selecting all plugins
+		@type tracer: Tracer or None
+		@param tracer: records the start and completion of plugins
+		"""
 		self.engine = engine
+		self.tracer = tracer
+		self.selection = PluginSelection() if selection is None else selection
 		self.pending_plugins = []
+		self.facts = Facts(self)
+		self.walks = {}
+		self.counters = collections.Counter()
+
+	def walk(self, baseoid):
+		"""Like AbstractEngine.walk, but if the subtree below baseoid has been
+		walked before during this check, the rows of that walk are delivered
+		instead of starting another one. This works regardless of whether the
+		earlier walk has completed already.
+		@returns: a Future as returned from AbstractEngine.walk
+		"""
+		baseoid = tuple(baseoid)
+		try:
+			head = self.walks[baseoid]
+		except KeyError:
+			self.counters["walk_started"] += 1
+			head = self.walks[baseoid] = self.engine.walk(baseoid)
+			return head
+		logger.debug("joining walk of %r", baseoid)
+		self.counters["walk_joined"] += 1
+		return self._joinwalk(head)
+
+	def _joinwalk(self, fut):
+		"""Follow the batches of a shared walk counting the rows."""
+		joined = future.Future()
+		def forward(fut):
+			try:
+				rows, nextfut = fut.result()
+			except Exception as exc:
+				joined.set_exception(exc)
+			else:
+				self.counters["walk_shared_rows"] += len(rows)
+				joined.set_result((rows, nextfut and self._joinwalk(nextfut)))
+		fut.add_done_callback(forward)
+		return joined
+
+	def walk_all(self, baseoid):
+		"""Like AbstractEngine.walk_all, but sharing walks like walk.
+		@returns: a Future returning the list of all (oid, value) rows below
+				baseoid
+		"""
+		return engine.collect_walk(self.walk(baseoid))
+
+	def selected(self, plugin):
+		"""Check whether the given plugin would be started. Plugins can use
+		this to avoid computing the preconditions of unselected plugins.
+		@rtype: bool
+		"""
+		return self.selection.selects(plugin)
 
 	def start_plugin(self, collector, plugin):
-		"""Start the given plugin with the given collector.
+		"""Start the given plugin with the given collector unless it is not
+		selected.
 		@type collector: Collector
 		"""
+		if not self.selected(plugin):
+			logger.debug("skipping unselected plugin %r", plugin)
+			return
 		logger.debug("starting plugin %r", plugin)
+		if collector is not None:
+			collector = collector.for_plugin(plugin)
+		token = None if self.tracer is None else self.tracer.plugin_started(plugin)
 		def completion(fut):
 			self.pending_plugins.remove(fut)
+			if self.tracer is not None:
+				self.tracer.plugin_finished(plugin, token, fut.exception())
 			try:
 				fut.result()
 			except Exception as exc:
+				self.counters["plugin_failed"] += 1
 				logger.error("plugin %r failed to complete due to %r", plugin, exc, exc_info=True)
-				collector.add_alert(report.Alert(report.CRITICAL, "plugin %r failed to complete with error %r" % (plugin, exc)))
+				if collector is not None:
+					collector.add_alert(report.Alert(report.CRITICAL, "plugin %r failed to complete with error %r" % (plugin, exc)))
 			else:
 				logger.debug("completed plugin %r", plugin)
 		try:
-			fut = plugin(self, collector)
-		except Exception:
+			fut = future.run_in_task(plugin, plugin, self, collector)
+		except Exception as exc:
+			self.counters["plugin_failed"] += 1
+			if self.tracer is not None:
+				self.tracer.plugin_finished(plugin, token, exc)
 			logger.exception("swallowing exception from plugin")
 		else:
+			self.counters["plugin_started"] += 1
 			self.pending_plugins.append(fut)
 			fut.add_done_callback(completion)
 
@@ -53,6 +197,7 @@ class Controller(object):
 		"""
 		workleft = self.engine.step()
 		if self.pending_plugins and not workleft:
+			self.counters["plugin_stalled"] += len(self.pending_plugins)
 			logger.error("some plugins failed to complete")
 			return False
 		return bool(self.pending_plugins)
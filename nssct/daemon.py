@@ -0,0 +1,319 @@
+# -*- encoding: utf-8 -*-
+
+"""A long-running process executing checks on behalf of nssct-client. It
+loads pysnmp and the plugins once and keeps backends around between checks,
+so a check does not pay for interpreter startup and imports. Every
+connection is served by its own thread. The state of a check (engine, cache,
+controller, collector) is created for every request, so results are always
+fresh.
+"""
+
+import argparse
+import contextlib
+import errno
+import logging
+import os
+import socket
+import threading
+import time
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+from . import ipc
+from . import log
+from . import main as nssct_main
+from . import metrics
+from . import perfdata
+from . import report
+from . import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+# Options making a check write to files at the given paths. Clients of the
+# socket must not choose paths written by the daemon, so only checks
+# scheduled by the daemon itself may use them. The same holds for --mock
+# reading a file, unless the daemon is given a directory of recorded walks.
+PATH_OPTIONS = ("--governor", "--command-file", "--checkresult-dir", "--perfdata-dir", "--result-cache",
+				"--profile", "--trace", "--mock")
+
+
+class ParserExit(Exception):
+	"""Raised by RequestParser instead of exiting."""
+
+
+class RequestParser(nssct_main.CustomParser):
+	"""A parser for the arguments of a request. Instead of writing to stdio
+	and exiting, it records its messages and raises ParserExit."""
+	def __init__(self, *args, **kwargs):
+		kwargs.setdefault("prog", "nssct")
+		nssct_main.CustomParser.__init__(self, *args, **kwargs)
+		self.messages = []
+
+	def _print_message(self, message, file=None):  # pylint: disable=W0622
+		if message:
+			self.messages.append(message)
+
+	def exit(self, status=0, message=None):
+		if message:
+			self.messages.append(message)
+		raise ParserExit()
+
+	def reject_path_options(self, args, mock_dir=None):
+		"""Fail if any of PATH_OPTIONS was given. A --mock file inside
+		mock_dir is permitted and its path is resolved relative to mock_dir.
+		@type args: argparse.Namespace
+		@type mock_dir: str or None
+		@raises ParserExit:
+		"""
+		if args.mock is not None and mock_dir is not None:
+			mock_dir = os.path.realpath(mock_dir)
+			path = os.path.realpath(os.path.join(mock_dir, args.mock))
+			if not path.startswith(mock_dir + os.sep):
+				self.error("--mock must name a file in %s" % mock_dir)
+			args.mock = path
+		given = [option for option in PATH_OPTIONS if getattr(args, option[2:].replace("-", "_")) is not None]
+		if args.mock is not None and mock_dir is not None:
+			given.remove("--mock")
+		if given:
+			self.error("not permitted in requests to the daemon: %s" % " ".join(given))
+
+
+def agent_address(args):
+	"""Resolve the agent of the parsed arguments as NetworkBackend does.
+	@rtype: str or None
+	@returns: the ip address of the agent or None for a mock
+	@raises socket.gaierror: if the agent cannot be resolved
+	"""
+	if args.mock:
+		return None
+	return socket.getaddrinfo(args.agent, 161, socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)[0][4][0]
+
+
+class BackendPool(object):
+	"""Keeps idle backends for reuse by later checks. A backend is used by at
+	most one check at a time. Backends idle for longer than idle_timeout
+	seconds or exceeding max_idle idle backends are closed, least recently
+	used first.
+
+	@type max_idle: int
+	@ivar max_idle: is the maximum number of idle backends
+	@type idle_timeout: float
+	@ivar idle_timeout: is the number of seconds a backend is kept idle
+	"""
+	def __init__(self, registry=None, max_idle=32, idle_timeout=300.0, clock=time.time):
+		"""
+		@type registry: metrics.Registry or None
+		@param registry: if given, the PDUs of the backends are recorded in it
+		"""
+		self.lock = threading.Lock()
+		self.idle = []  # (time of release, key, backend) by increasing time
+		self.registry = registry
+		self.max_idle = max_idle
+		self.idle_timeout = idle_timeout
+		self.clock = clock
+
+	def _expire(self):
+		"""Remove the backends to be closed from idle. The lock must be held.
+		@rtype: [BackendBase]
+		"""
+		deadline = self.clock() - self.idle_timeout
+		count = 0
+		while count < len(self.idle) and (self.idle[count][0] < deadline or
+										len(self.idle) - count > self.max_idle):
+			count += 1
+		expired = [back for _, _, back in self.idle[:count]]
+		del self.idle[:count]
+		return expired
+
+	def _take(self, key):
+		"""Remove and return the most recently used idle backend for key.
+		@rtype: BackendBase or None
+		"""
+		with self.lock:
+			expired = self._expire()
+			back = None
+			for i in range(len(self.idle) - 1, -1, -1):
+				if self.idle[i][1] == key:
+					back = self.idle.pop(i)[2]
+					break
+		self._close(expired)
+		return back
+
+	def expire(self):
+		"""Close the backends idle for too long."""
+		with self.lock:
+			expired = self._expire()
+		self._close(expired)
+
+	def _close(self, backends):
+		for back in backends:
+			logger.debug("closing idle backend %r", back)
+			try:
+				back.close()
+			except Exception:
+				logger.exception("failed to close backend %r", back)
+
+	@contextlib.contextmanager
+	def backend(self, args):
+		"""A context manager providing a backend for the parsed arguments.
+		The agent is resolved again, so a backend is not reused after its
+		address changed.
+		@raises socket.gaierror: if the agent cannot be resolved
+		"""
+		key = nssct_main.backend_key(args) + (agent_address(args),)
+		back = self._take(key)
+		if back is None:
+			logger.debug("creating backend for %r", key)
+			back = nssct_main.open_backend(args)
+			if self.registry is not None:
+				back = metrics.InstrumentedBackend(back, self.registry, args.agent or args.mock)
+		try:
+			yield back
+		finally:
+			with self.lock:
+				self.idle.append((self.clock(), key, back))
+				expired = self._expire()
+			self._close(expired)
+
+	def close(self):
+		"""Close all idle backends."""
+		with self.lock:
+			expired = [back for _, _, back in self.idle]
+			del self.idle[:]
+		self._close(expired)
+
+
+class CheckRunner(object):
+	"""Turns requests into responses by running checks.
+	@type registry: metrics.Registry
+	@ivar registry: receives metrics about the checks run
+	@type mock_dir: str or None
+	@ivar mock_dir: contains the recorded snmpwalks clients may check
+	"""
+	def __init__(self, pool=None, registry=None, mock_dir=None):
+		self.mock_dir = mock_dir
+		self.registry = metrics.Registry() if registry is None else registry
+		self.pool = BackendPool(self.registry) if pool is None else pool
+		self.metrics = metrics.CheckMetrics(self.registry)
+
+	def execute(self, argv, trusted=False):
+		"""
+		@type argv: [str]
+		@type trusted: bool
+		@param trusted: whether the check may use PATH_OPTIONS, i.e. it was
+				not requested by a client
+		@rtype: dict
+		@returns: a response message as described in the ipc module
+		"""
+		parser = nssct_main.build_parser(RequestParser)
+		try:
+			args = parser.parse_args(argv)
+			if not trusted:
+				parser.reject_path_options(args, self.mock_dir)
+		except ParserExit:
+			return dict(output="", errors="".join(parser.messages), status=report.UNKNOWN)
+		start = time.time()
+		self.metrics.running.inc()
+		try:
+			with self.pool.backend(args) as back:
+				collector = nssct_main.run(args, back, self.metrics.observe_run, self.metrics.watch_run)
+		except socket.gaierror as err:
+			collector = nssct_main.resolution_failed(args, err)
+		finally:
+			self.metrics.running.dec()
+		self.metrics.observe_check(report.states[collector.state()], time.time() - start)
+		return dict(output=str(collector) + "\n", errors="", status=collector.state())
+
+	def run_scheduled(self, argv):
+		"""Run a check on behalf of the scheduler and log its outcome."""
+		response = self.execute(argv, trusted=True)
+		if response["status"] == report.UNKNOWN:
+			logger.warning("scheduled check %r: %s%s", argv, response["errors"], response["output"])
+		else:
+			logger.debug("scheduled check %r: %s", argv, response["output"])
+
+	def handle(self, request):
+		"""
+		@type request: dict
+		@rtype: dict
+		"""
+		try:
+			argv = ipc.request_argv(request)
+		except ipc.ProtocolError as err:
+			return dict(output="", errors="%s\n" % err, status=report.UNKNOWN)
+		try:
+			return self.execute(argv)
+		except Exception as exc:
+			logger.exception("check %r failed", argv)
+			return dict(output="UNKNOWN - internal error in nssct daemon: %r\n" % exc, errors="", status=report.UNKNOWN)
+
+
+class CheckHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		try:
+			request = ipc.receive_message(self.rfile)
+		except ipc.ProtocolError as err:
+			logger.warning("dropping client: %s", err)
+			return
+		ipc.send_message(self.wfile, self.server.runner.handle(request))
+
+
+class CheckServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, path, runner):
+		"""
+		@type path: str
+		@param path: is where the socket is created. A stale socket is
+				replaced.
+		@type runner: CheckRunner
+		"""
+		try:
+			os.unlink(path)
+		except OSError as err:
+			if err.errno != errno.ENOENT:
+				raise
+		socketserver.UnixStreamServer.__init__(self, path, CheckHandler)
+		self.runner = runner
+
+	def service_actions(self):
+		"""Called by serve_forever about twice a second."""
+		self.runner.pool.expire()
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--socket", default=ipc.DEFAULT_SOCKET, metavar="PATH",
+						help="listen on the Unix socket PATH (default: %(default)s)")
+	parser.add_argument("--mode", default="0660", metavar="MODE",
+						help="permissions of the socket in octal (default: %(default)s)")
+	parser.add_argument("--mock-dir", metavar="DIR", default=None,
+						help="let clients check the recorded snmpwalks in DIR using --mock")
+	log.add_log_options(parser)
+	scheduler.add_scheduler_options(parser)
+	metrics.add_metrics_options(parser)
+	args = parser.parse_args()
+	log.setup_logging(args)
+	nssct_main.preload()
+	runner = CheckRunner(mock_dir=args.mock_dir)
+	server = CheckServer(args.socket, runner)
+	scheduler.setup_scheduler(args, runner.run_scheduled, runner.metrics.lag.observe)
+	metrics.setup_metrics(args, runner.registry)
+	os.chmod(args.socket, int(args.mode, 8))
+	logger.info("listening on %s", args.socket)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.unlink(args.socket)
+		runner.pool.close()
+		perfdata.flush_all()
+
+if __name__ == "__main__":
+	main()
@@ -1,5 +1,6 @@
 # -*- encoding: utf-8 -*-
 
+import collections
 import functools
 import logging
 
@@ -27,7 +28,14 @@ class AbstractEngine(object):
 	and GETNEXT queries using the respective methods. Then issue a call to the
 	step method. Some futures are now completed and can issue further GET and
 	GETNEXT queries in their callbacks. Issue step calls until it returns
-	False signalling the completion of all returned futures."""
+	False signalling the completion of all returned futures.
+
+	The batching attribute tells whether requests issued together are
+	combined into few PDUs, such that walking a short table costs about as
+	much as selecting some of its rows. Engines wrapping another engine
+	inherit its value."""
+	batching = False
+
 	def __init__(self):
 		pass
 
@@ -47,9 +55,35 @@ class AbstractEngine(object):
 		"""
 		raise NotImplementedError
 
+	def walk(self, baseoid, startoid=None):
+		"""Walk the subtree below baseoid beginning after startoid, which
+		defaults to baseoid. The rows are delivered in batches as they
+		arrive. Typical usage in a coroutine::
+
+			fut = engine.walk(baseoid)
+			while fut:
+				rows, fut = (yield fut)
+				for oid, value in rows:
+					# do something with oid and value
+
+		The default implementation issues one getnext per row.
+
+		@returns: a Future returning a pair of a list of (oid, value) rows
+				and a Future for the next such pair or None if the walk is
+				complete
+		"""
+		return getnext_walk(self, tuple(baseoid), tuple(startoid or baseoid))
+
+	def walk_all(self, baseoid):
+		"""
+		@returns: a Future returning the list of all (oid, value) rows below
+				baseoid
+		"""
+		return collect_walk(self.walk(baseoid))
+
 	def step(self):
-		"""Does some work towards completing Futures returned from get and
-		getnext.
+		"""Does some work towards completing Futures returned from get,
+		getnext and walk.
 		@rtype: bool
 		@returns: True if step should be called again
 		"""
@@ -68,6 +102,31 @@ def check_mib_next_pair(pair):
 		raise EndOfMibError
 	return pair
 
+def in_subtree(oid, baseoid):
+	return oid[:len(baseoid)] == baseoid
+
+@future.coroutine
+def getnext_walk(engine, baseoid, startoid):
+	"""Implementation of AbstractEngine.walk using getnext."""
+	try:
+		nextoid, value = (yield engine.getnext(startoid))
+	except EndOfMibError:
+		future.return_(([], None))
+	if not in_subtree(nextoid, baseoid):
+		future.return_(([], None))
+	future.return_(([(nextoid, value)], getnext_walk(engine, baseoid, nextoid)))
+
+@future.coroutine
+def collect_walk(fut):
+	"""Concatenate the batches of rows of a walk.
+	@param fut: a Future as returned from AbstractEngine.walk
+	"""
+	rows = []
+	while fut:
+		batch, fut = (yield fut)
+		rows.extend(batch)
+	future.return_(rows)
+
 class SimpleEngine(AbstractEngine):
 	"""A synchronous engine turning every question into a direct call to the
 	backend."""
@@ -75,48 +134,83 @@ class SimpleEngine(AbstractEngine):
 		AbstractEngine.__init__(self)
 		self.backend = back
 
+	def _get(self, oid):
+		return check_mib_value(self.backend.get(oid))
+
+	def _getnext(self, oid):
+		return check_mib_next_pair(self.backend.getnext(oid))
+
 	def get(self, oid):
 		logger.debug("%r: get %r", self.backend, oid)
-		fut = future.Future()
-		future.complete_with(fut, lambda oid=oid:
-				check_mib_value(self.backend.get(oid)))
-		return fut
+		return future.immediate(self._get, oid)
 
 	def getnext(self, oid):
 		logger.debug("%r: getnext %r", self.backend, oid)
-		fut = future.Future()
-		future.complete_with(fut, lambda oid=oid:
-				check_mib_next_pair(self.backend.getnext(oid)))
-		return fut
+		return future.immediate(self._getnext, oid)
+
+	def _walk(self, baseoid, oid):
+		rows = []
+		while True:
+			oid, value = self.backend.getnext(oid)
+			if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView) or not in_subtree(oid, baseoid):
+				return (rows, None)
+			rows.append((oid, value))
+
+	def walk(self, baseoid, startoid=None):
+		"""Walk the whole subtree synchronously and return a single batch."""
+		logger.debug("%r: walk %r from %r", self.backend, baseoid, startoid)
+		baseoid = tuple(baseoid)
+		return future.immediate(self._walk, baseoid, tuple(startoid or baseoid))
 
 	def step(self):
 		return False
 
 
 class CachingEngine(AbstractEngine):
-	"""An engine caching the results of another engine."""
+	"""An engine caching the results of another engine. Identical GET and
+	GETNEXT requests, that are in flight at the same time, are coalesced into
+	one request of the underlying engine.
+
+	@type counters: collections.Counter
+	@ivar counters: counts requests by how they were served. get_hit,
+			get_negative (answered NoSuchObject from the cache),
+			get_coalesced, next_hit, next_coalesced and walk_hit (rows) were
+			served without asking the underlying engine. get_miss, next_miss
+			and walk_miss were forwarded to it.
+	"""
 	def __init__(self, engine):
 		AbstractEngine.__init__(self)
 		self.engine = engine
+		self.batching = engine.batching
 		self.cache = cache.ObjectCache()
 		self.pendingget = {}
 		self.pendingnext = {}
+		self.counters = collections.Counter()
 		if hasattr(engine, "setcache"):
 			engine.setcache(self)
 
+	def saved(self):
+		"""
+		@rtype: int
+		@returns: the number of requests (or walk rows) not forwarded to the
+				underlying engine
+		"""
+		return sum(self.counters[key] for key in ("get_hit", "get_negative", "get_coalesced",
+												"next_hit", "next_coalesced", "walk_hit"))
+
 	def _cacheget(self, oid, fut):
+		del self.pendingget[oid]
 		exc = fut.exception()
 		if exc:
 			if isinstance(exc, EndOfMibError):
 				self.storeend(oid)
-			return  # we cannot cache exceptions, includes NoSuchObject
+			elif isinstance(exc, NoSuchObjectError):
+				logger.debug("storing %r is no such object", oid)
+				self.cache.setnosuchobject(oid)
+			return  # we cannot cache other exceptions
 		value = fut.result()
 		logger.debug("storing %r set %r", oid, value)
 		self.cache.set(oid, value)
-		try:
-			del self.pendingget[oid]
-		except KeyError:
-			pass
 
 	def get(self, oid):
 		oid = tuple(oid)
@@ -126,20 +220,26 @@ class CachingEngine(AbstractEngine):
 			pass
 		else:
 			logger.debug("get %r in pending cache", oid)
+			self.counters["get_coalesced"] += 1
 			return futvalue
 		try:
 			value = self.cache.get(oid)
 		except cache.NotCached:
 			logger.debug("get %r not in cache", oid)
+			self.counters["get_miss"] += 1
 			futvalue = self.engine.get(oid)
+			self.pendingget[oid] = futvalue
 			futvalue.add_done_callback(functools.partial(self._cacheget, oid))
 			return futvalue
 		else:
-			fut = future.Future()
-			future.complete_with(fut, functools.partial(check_mib_value, value))
-			return fut
+			if isinstance(value, pysnmp.proto.rfc1905.NoSuchObject):
+				self.counters["get_negative"] += 1
+			else:
+				self.counters["get_hit"] += 1
+			return future.immediate(check_mib_value, value)
 
 	def _cachenext(self, oid, futnext):
+		del self.pendingnext[oid]
 		exc = futnext.exception()
 		if exc:
 			if isinstance(exc, EndOfMibError):
@@ -147,10 +247,6 @@ class CachingEngine(AbstractEngine):
 			return  # we cannot cache other exceptions
 		noid, value = futnext.result()
 		self.storenext(oid, noid, value)
-		try:
-			del self.pendingnext[oid]
-		except KeyError:
-			pass
 
 	def getnext(self, oid):
 		oid = tuple(oid)
@@ -160,19 +256,59 @@ class CachingEngine(AbstractEngine):
 			pass
 		else:
 			logger.debug("next %r in pending cache", oid)
+			self.counters["next_coalesced"] += 1
 			return futvalue
 		try:
 			noid, value = self.cache.getnext(oid)
 		except cache.NotCached:
 			logger.debug("next %r not in cache", oid)
+			self.counters["next_miss"] += 1
 			futnext = self.engine.getnext(oid)
 			self.pendingnext[oid] = futnext
 			futnext.add_done_callback(functools.partial(self._cachenext, oid))
 			return futnext
 		else:
-			fut = future.Future()
-			future.complete_with(fut, functools.partial(check_mib_next_pair, (noid, value)))
-			return fut
+			self.counters["next_hit"] += 1
+			return future.immediate(check_mib_next_pair, (noid, value))
+
+	def _cachewalk(self, oid, fut):
+		if fut.exception():
+			return
+		rows, nextfut = fut.result()
+		for noid, value in rows:
+			self.storenext(oid, noid, value)
+			oid = noid
+		if nextfut is not None:
+			nextfut.add_done_callback(functools.partial(self._cachewalk, oid))
+
+	def _forwardwalk(self, baseoid, oid):
+		self.counters["walk_miss"] += 1
+		fut = self.engine.walk(baseoid, oid)
+		fut.add_done_callback(functools.partial(self._cachewalk, oid))
+		return fut
+
+	def walk(self, baseoid, startoid=None):
+		"""Serve as many rows from the cache as possible and continue the walk
+		using the underlying engine from the first row not cached."""
+		baseoid = tuple(baseoid)
+		oid = tuple(startoid or baseoid)
+		rows = []
+		while True:
+			try:
+				noid, value = self.cache.getnext(oid)
+			except cache.NotCached:
+				break
+			if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView) or not in_subtree(noid, baseoid):
+				logger.debug("walk %r served %d rows from cache", baseoid, len(rows))
+				self.counters["walk_hit"] += len(rows)
+				return future.completed((rows, None))
+			rows.append((noid, value))
+			oid = noid
+		logger.debug("walk %r served %d rows from cache, continuing at %r", baseoid, len(rows), oid)
+		self.counters["walk_hit"] += len(rows)
+		if not rows:
+			return self._forwardwalk(baseoid, oid)
+		return future.completed((rows, self._forwardwalk(baseoid, oid)))
 
 	def storenext(self, oid, noid, value):
 		logger.debug("storing %r next %r value %r", oid, noid, value)
@@ -196,13 +332,17 @@ def prev_oid(oid):
 
 class BulkEngine(AbstractEngine):
 	"""An engine that collects requests and turns them into bulk requests when
-	the step method is invoked."""
+	the step method is invoked. Walks are continued in the repeater part of
+	the bulk requests and receive up to 1 + lookahead rows per request."""
+	batching = True
+
 	def __init__(self, back, lookahead=0, bulkmax=64):
 		AbstractEngine.__init__(self)
 		self.backend = back
 		self.cache = None
 		self.pendingget = []
 		self.pendingnext = []
+		self.pendingwalk = []
 		self.maxrep = 1 + lookahead
 		self.bulkmax = bulkmax
 
@@ -219,10 +359,50 @@ class BulkEngine(AbstractEngine):
 		self.pendingnext.append((oid, fut))
 		return fut
 
+	def walk(self, baseoid, startoid=None):
+		fut = future.Future()
+		baseoid = tuple(baseoid)
+		self.pendingwalk.append((baseoid, tuple(startoid or baseoid), fut))
+		return fut
+
+	def _storecolumn(self, oid, column):
+		"""Cache a column of results of a bulk request for the given oid."""
+		for noid, value in column:
+			if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView):
+				logger.debug("bulk caching end of mib at %r", noid)
+				self.cache.storeend(noid)
+				return
+			logger.debug("bulk caching next %r is %r value %r", oid, noid, value)
+			self.cache.storenext(oid, noid, value)
+			oid = noid
+
+	def _walkcolumn(self, baseoid, oid, column):
+		"""Extract the rows of a walk from a column of results of a bulk
+		request for the given oid.
+		@returns: the rows, the oid to continue the walk with and whether
+				the walk is complete
+		@raises BackendError: if the agent does not return increasing oids
+		"""
+		rows = []
+		for noid, value in column:
+			if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView):
+				return rows, oid, True
+			if noid <= oid:
+				raise backend.BackendError("bad bulk result %r does not follow %r" % (noid, oid))
+			if not in_subtree(noid, baseoid):
+				return rows, noid, True
+			rows.append((noid, value))
+			oid = noid
+		return rows, oid, False
+
+	def _hasrepeaters(self):
+		return bool(self.pendingnext) or bool(self.pendingwalk)
+
 	def step(self):
 		completions = []
-		maxrep = self.maxrep if self.cache else 1
-		if len(self.pendingnext) == 0:
+		walking = bool(self.pendingwalk)
+		maxrep = self.maxrep if self.cache or walking else 1
+		if not self._hasrepeaters():
 			if len(self.pendingget) == 0:
 				logger.debug("nothing to do")
 				return False
@@ -231,17 +411,19 @@ class BulkEngine(AbstractEngine):
 				logger.debug("single get query for %r", oid)
 				future.complete_with(fut, lambda oid=oid:
 						check_mib_value(self.backend.get(oid)))
-				return bool(self.pendingget) or bool(self.pendingnext)
-		if maxrep <= 1 and len(self.pendingnext) == 1 and len(self.pendingget) == 0:
+				return bool(self.pendingget) or self._hasrepeaters()
+		if maxrep <= 1 and len(self.pendingnext) == 1 and len(self.pendingget) == 0 and not walking:
 			oid, fut = self.pendingnext.pop(0)
 			logger.debug("single next query for %r", oid)
 			future.complete_with(fut, lambda oid=oid:
 					check_mib_next_pair(self.backend.getnext(oid)))
-			return bool(self.pendingget) or bool(self.pendingnext)
+			return bool(self.pendingget) or self._hasrepeaters()
 
 		oids = [prev_oid(oid) for oid, _ in self.pendingget[:self.bulkmax]]
 		nonrep = len(oids)
-		noids = [oid for oid, _ in self.pendingnext[:self.bulkmax - nonrep]]
+		nexts = self.pendingnext[:self.bulkmax - nonrep]
+		walks = self.pendingwalk[:self.bulkmax - nonrep - len(nexts)]
+		noids = [oid for oid, _ in nexts] + [oid for _, oid, _ in walks]
 		logger.debug("bulk getting nonrep %r and %d rep %r", oids, maxrep, noids)
 		result = self.backend.getbulk(oids + noids, nonrep, maxrep)
 		logger.debug("bulk result %r", result)
@@ -267,36 +449,46 @@ class BulkEngine(AbstractEngine):
 				if self.cache:
 					self.cache.storenext(prev_oid(qoid), noid, value)
 
-		# processing the first row of len(oids) - nonrep items
-		oids, noids = noids, []
-		logger.debug("processing first row of length %d with %d results left", len(oids), len(result))
-		while result and oids:
-			oids.pop(0)  # only for counting
-			qoid, fut = self.pendingnext.pop(0)
-			noid, value = result.pop(0)
+		# splitting the remaining rows of len(noids) items into columns
+		columns = [[] for _ in noids]
+		if columns:
+			for i, pair in enumerate(result):
+				columns[i % len(columns)].append(pair)
+		logger.debug("processing %d repeaters with %d results left", len(noids), len(result))
+		# A truncated result may lack the columns at the end. These requests
+		# remain pending.
+		for column, (qoid, fut) in zip(columns, nexts):
+			if not column:
+				break
+			self.pendingnext.pop(0)
+			noid, value = column[0]
 			if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView):
 				logger.debug("bulk processing next %r is endofmib", qoid)
 				completions.append((fut.set_exception, EndOfMibError()))
 			else:
 				logger.debug("bulk processing next %r is %r value %r", qoid, noid, value)
 				completions.append((fut.set_result, (noid, value)))
-			noids.append(noid)
-		if self.cache:
-			# processing the remainig maxrep - 1 rows
-			oids, noids = noids, []
-			while result and oids:
-				while result and oids:
-					oid = oids.pop(0)
-					noid, value = result.pop(0)
-					if isinstance(value, pysnmp.proto.rfc1905.EndOfMibView):
-						logger.debug("bulk caching end of mib at %r", noid)
-						self.cache.storeend(noid)
-					else:
-						logger.debug("bulk caching next %r is %r value %r", oid, noid, value)
-						self.cache.storenext(oid, noid, value)
-					noids.append(noid)
-				oids, noids = noids, []
+			if self.cache:
+				self._storecolumn(noid, column[1:])
+		for column, (baseoid, qoid, fut) in zip(columns[len(nexts):], walks):
+			if not column:
+				break
+			self.pendingwalk.pop(0)
+			if self.cache:
+				self._storecolumn(qoid, column)
+			try:
+				rows, qoid, done = self._walkcolumn(baseoid, qoid, column)
+			except backend.BackendError as exc:
+				completions.append((fut.set_exception, exc))
+				continue
+			logger.debug("bulk processing walk %r got %d rows", baseoid, len(rows))
+			if done:
+				completions.append((fut.set_result, (rows, None)))
+			else:
+				nextfut = future.Future()
+				self.pendingwalk.append((baseoid, qoid, nextfut))
+				completions.append((fut.set_result, (rows, nextfut)))
 		logger.debug("bulk signalling %d futures", len(completions))
 		for setter, value in completions:
 			setter(value)
-		return bool(self.pendingget) or bool(self.pendingnext)
+		return bool(self.pendingget) or self._hasrepeaters()
@@ -6,7 +6,9 @@ some future. This is what the Future class encapsulates.
 These futures are asynchronous, so if you wan to react to a completing future,
 you attach a callback to it. If it already is completed, the callback will run
 immediately. Otherwise it will run on completion. It is invoked regardless of
-whether the future has a result or terminates with an exception.
+whether the future has a result or terminates with an exception. Callbacks
+triggered while another callback is running are queued and run as soon as the
+running one returns, so completions never nest deeply on the stack.
 
 The easiest way to use Futures is to use the coroutine decorator::
 
@@ -25,11 +27,20 @@ The easiest way to use Futures is to use the coroutine decorator::
 		return_(actual_result + other_result)
 
 Now some_function is a function that returns a Future when called.
+
+Coroutines belong to tasks. A coroutine belongs to the task that was current
+when it was created and that task is current whenever the coroutine runs.
+Tasks are set with run_in_task and can be any object, e.g. the plugin that
+started a chain of coroutines, so work such as SNMP requests can be
+attributed to it. The time spent running coroutines can be attributed to
+their tasks by a profiler installed with set_task_profiler.
 """
 
+import collections
 import functools
 import logging
 import sys
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -39,12 +50,18 @@ FT_ERROR = 2
 
 
 class Future(object):
-	"""PEP3148/PEP3156 inspired future class"""
-	state = FT_PENDING
-	value = None
+	"""PEP3148/PEP3156 inspired future class
+
+	Futures are created in large numbers, so they use __slots__ and store
+	callbacks as None (no callbacks), a single callable or a list of
+	callables.
+	"""
+	__slots__ = ("state", "value", "callbacks")
 
 	def __init__(self):
-		self.callbacks = []
+		self.state = FT_PENDING
+		self.value = None
+		self.callbacks = None
 
 	def done(self):
 		return self.state != FT_PENDING
@@ -63,9 +80,16 @@ class Future(object):
 		self._run_callbacks()
 
 	def add_done_callback(self, func):
-		self.callbacks.append(func)
-		if self.state > FT_PENDING:
-			self._run_callbacks()
+		if self.state != FT_PENDING:
+			_schedule(func, self)
+			return
+		callbacks = self.callbacks
+		if callbacks is None:
+			self.callbacks = func
+		elif type(callbacks) is list:
+			callbacks.append(func)
+		else:
+			self.callbacks = [callbacks, func]
 
 	def result(self):
 		assert self.state > FT_PENDING
@@ -83,12 +107,137 @@ class Future(object):
 
 	def _run_callbacks(self):
 		assert self.state > FT_PENDING
-		while self.callbacks:
-			callback = self.callbacks.pop(0)
+		callbacks = self.callbacks
+		if callbacks is None:
+			return
+		self.callbacks = None
+		if type(callbacks) is list:
+			for callback in callbacks:
+				_schedule(callback, self)
+		else:
+			_schedule(callbacks, self)
+
+
+class _RunQueue(threading.local):
+	"""The per-thread state of the trampoline."""
+	def __init__(self):
+		threading.local.__init__(self)
+		self.calls = collections.deque()
+		self.dispatching = False
+		self.task = None
+		self.profiler = None
+
+_runqueue = _RunQueue()
+
+def _schedule(function, argument):
+	"""Invoke function(argument). If a scheduled function is already running
+	further up the stack, the invocation is queued instead and will be run by
+	the outermost dispatch loop once the running one returns. Callbacks and
+	the first steps of coroutines go through this trampoline, so arbitrarily
+	long chains of synchronously completing futures run in constant stack
+	depth. Every thread has its own queue, so independent sets of futures can
+	be driven from different threads, but a single Future must not be shared
+	between threads."""
+	queue = _runqueue
+	if queue.dispatching:
+		queue.calls.append((function, argument))
+		return
+	queue.dispatching = True
+	calls = queue.calls
+	try:
+		while True:
 			try:
-				callback(self)
+				function(argument)
 			except Exception:
 				logger.exception("swallowing exception from callback")
+			if not calls:
+				break
+			function, argument = calls.popleft()
+	finally:
+		queue.dispatching = False
+
+def current_task():
+	"""
+	@returns: the task of the running coroutine or None
+	"""
+	return _runqueue.task
+
+def run_in_task(task, function, *args):
+	"""Call function(*args) with the given task being current, such that
+	coroutines created by it belong to the task.
+
+	>>> @coroutine
+	... def whoami():
+	...     yield completed()
+	...     return_(current_task())
+	>>> run_in_task("spam", whoami).result()
+	'spam'
+	>>> current_task() is None
+	True
+	"""
+	queue = _runqueue
+	outer = queue.task
+	queue.task = task
+	profiler = queue.profiler
+	if profiler is not None:
+		profiler.enter(task)
+	try:
+		return function(*args)
+	finally:
+		queue.task = outer
+		if profiler is not None:
+			profiler.leave(task)
+
+def set_task_profiler(profiler):
+	"""Install a profiler for the current thread. Its enter method is called
+	with the task whenever a coroutine or run_in_task starts running and its
+	leave method when it stops. Calls may nest.
+	@param profiler: an object with enter and leave methods or None to
+			uninstall the profiler
+	@returns: the previously installed profiler
+	"""
+	queue = _runqueue
+	previous = queue.profiler
+	queue.profiler = profiler
+	return previous
+
+def completed(result=None):
+	"""Create a Future that already is completed with the given result. This
+	is cheaper than creating a Future and calling set_result on it.
+
+	>>> completed(42).result()
+	42
+	"""
+	fut = Future()
+	fut.state = FT_COMPLETED
+	fut.value = result
+	return fut
+
+def failed(exc):
+	"""Create a Future that already is completed with the given exception.
+	@type exc: Exception
+	"""
+	assert isinstance(exc, Exception)
+	fut = Future()
+	fut.state = FT_ERROR
+	fut.value = exc
+	return fut
+
+def immediate(function, *args):
+	"""Call the given function with the given arguments and return a
+	completed Future carrying its result or exception. It is a cheaper
+	variant of complete_with for new futures as it needs no closure.
+
+	>>> immediate(int, "spam").exception() # doctest: +ELLIPSIS
+	ValueError(...)
+	"""
+	try:
+		result = function(*args)
+	except Exception as exc:
+		attach_traceback(exc)
+		logger.debug("forwarding exception from function %r", function, exc_info=True)
+		return failed(exc)
+	return completed(result)
 
 
 def attach_traceback(exception, exc_info=None):
@@ -181,11 +330,23 @@ class GeneratedFuture(Future):
 	"""Turn a generator into a future by treating the elements yielded as
 	futures and passing back the results of these futures. If a StopIteration
 	is raised with a value, this value is used as the result of the future.
+
+	A GeneratedFuture is its own completion callback for the futures it waits
+	for, so stepping the generator does not allocate bound methods. When
+	created from within a callback or another coroutine, the generator is
+	started once the running one yields rather than right away. The task
+	current on creation is made current whenever the generator runs.
 	"""
+	__slots__ = ("generator", "waiting", "task")
+
 	def __init__(self, generator):
 		Future.__init__(self)
 		self.generator = generator
 		self.waiting = None
+		self.task = _runqueue.task
+		_schedule(GeneratedFuture._start, self)
+
+	def _start(self):
 		try:
 			next_ = self.generator.__next__
 		except AttributeError:
@@ -193,21 +354,62 @@ class GeneratedFuture(Future):
 		self._invoke(next_)
 
 	def _invoke(self, func, *args):
+		"""Step the generator by calling func(*args). As long as it yields
+		futures that are completed already, it is resumed right away in a
+		loop rather than through a callback."""
+		queue = _runqueue
+		outer = queue.task
+		queue.task = self.task
+		profiler = queue.profiler
+		if profiler is not None:
+			profiler.enter(self.task)
 		try:
-			self.waiting = func(*args)
-		except StopIteration as stop:
-			if stop.args:
-				self.set_result(stop.args[0])
-			else:
-				self.set_result(None)
-		except Exception as exc:
-			attach_traceback(exc)
-			logger.debug("propagating exception from generator", exc_info=True)
-			self.set_exception(exc)
+			while True:
+				try:
+					waiting = func(*args)
+				except StopIteration as stop:
+					self._finish(stop)
+					return
+				except RuntimeError as exc:
+					# PEP 479 turns a StopIteration raised by return_ inside the
+					# generator into a RuntimeError caused by it.
+					stop = getattr(exc, "__cause__", None)
+					if isinstance(stop, StopIteration):
+						self._finish(stop)
+					else:
+						self._fail(exc)
+					return
+				except Exception as exc:
+					self._fail(exc)
+					return
+				self.waiting = waiting
+				if waiting.state == FT_PENDING:
+					waiting.add_done_callback(self)
+					return
+				if waiting.state == FT_COMPLETED:
+					func, args = self.generator.send, (waiting.value,)
+				else:
+					logger.debug("forwarding exception %s from future to generator", waiting.value)
+					func, args = self.generator.throw, (waiting.value,)
+		finally:
+			queue.task = outer
+			if profiler is not None:
+				profiler.leave(self.task)
+
+	def _finish(self, stop):
+		if stop.args:
+			self.set_result(stop.args[0])
 		else:
-			self.waiting.add_done_callback(self._handle_completion)
+			self.set_result(None)
+
+	def _fail(self, exc):
+		attach_traceback(exc)
+		logger.debug("propagating exception from generator", exc_info=True)
+		self.set_exception(exc)
 
-	def _handle_completion(self, future):
+	def __call__(self, future):
+		"""Resume the generator with the outcome of the completed future it
+		is waiting for."""
 		assert self.waiting is future
 		try:
 			result = future.result()
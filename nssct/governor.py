@@ -0,0 +1,237 @@
+# -*- encoding: utf-8 -*-
+
+"""The governor coordinates the SNMP traffic of all nssct processes running on
+a host. Nagios tends to start many checks at the same time and those would
+otherwise overrun UDP receive buffers or hit a single agent from several
+service checks at once.
+
+Coordination happens through lock files in a shared directory, so that a
+process dying for whatever reason never leaves stale state behind: the kernel
+drops its locks. The directory contains a fixed number of slot files. Holding
+an exclusive lock on one of them grants the right to have one PDU
+outstanding, so the number of slot files is the global cap. Furthermore there
+is one bucket file per agent, which stores the state of a token bucket
+limiting the rate of PDUs sent to that agent. It is only ever modified while
+holding a lock on it.
+"""
+
+import contextlib
+import errno
+import fcntl
+import logging
+import os
+import random
+import re
+import time
+
+from . import backend
+
+logger = logging.getLogger(__name__)
+
+
+class GovernorTimeout(backend.BackendError):
+	"""Raised when no permission to send a PDU could be obtained in time."""
+
+
+def agent_filename(agent):
+	"""
+	@type agent: str
+	@rtype: str
+
+	>>> agent_filename("192.0.2.1")
+	'bucket-192.0.2.1'
+	>>> agent_filename("../etc/passwd")
+	'bucket-.._etc_passwd'
+	"""
+	return "bucket-%s" % re.sub(r'[^A-Za-z0-9.:_-]', "_", agent)
+
+
+class Governor(object):
+	"""Grants permission to send PDUs in a host-wide coordinated manner.
+
+	@type directory: str
+	@ivar directory: is the shared directory containing the lock files
+	@type slots: int
+	@ivar slots: is the host-wide maximum of outstanding PDUs
+	@type rate: float
+	@ivar rate: is the number of PDUs per second an agent may receive
+	@type burst: float
+	@ivar burst: is the capacity of each token bucket
+	@type timeout: float
+	@ivar timeout: is the number of seconds to wait for permission
+	"""
+	def __init__(self, directory, slots=16, rate=50.0, burst=10.0, timeout=10.0):
+		assert slots > 0
+		assert rate > 0
+		assert burst >= 1
+		self.directory = directory
+		self.slots = slots
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.timeout = timeout
+		self.slotfds = None
+		try:
+			os.makedirs(directory)
+		except OSError as err:
+			if err.errno != errno.EEXIST:
+				raise
+
+	def _openslots(self):
+		if self.slotfds is None:
+			self.slotfds = [os.open(os.path.join(self.directory, "slot-%d" % i), os.O_RDWR | os.O_CREAT, 0o644)
+							for i in range(self.slots)]
+		return self.slotfds
+
+	def close(self):
+		if self.slotfds is not None:
+			for fd in self.slotfds:
+				os.close(fd)
+			self.slotfds = None
+
+	def _backoff(self, deadline, delay, what):
+		"""Sleep for about delay seconds and return the next delay.
+		@raises GovernorTimeout: if the deadline would be exceeded
+		"""
+		now = time.time()
+		if now >= deadline:
+			raise GovernorTimeout("timed out waiting for %s" % what)
+		time.sleep(min(delay * random.uniform(0.5, 1.5), deadline - now))
+		return min(delay * 2, 0.1)
+
+	def acquire_slot(self):
+		"""Wait until one of the slots is available and lock it.
+		@rtype: int
+		@returns: the file descriptor of the locked slot
+		@raises GovernorTimeout:
+		"""
+		fds = list(self._openslots())
+		deadline = time.time() + self.timeout
+		delay = 0.001
+		while True:
+			random.shuffle(fds)  # spread contention over all slots
+			for fd in fds:
+				try:
+					fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				except (IOError, OSError) as err:
+					if err.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+						raise
+				else:
+					return fd
+			logger.debug("all %d PDU slots busy, backing off", self.slots)
+			delay = self._backoff(deadline, delay, "a PDU slot")
+
+	def release_slot(self, fd):
+		fcntl.flock(fd, fcntl.LOCK_UN)
+
+	def _take(self, fd, now):
+		"""Try to take a token from the bucket stored in the locked file fd.
+		@rtype: float
+		@returns: 0 if a token was taken or the number of seconds until one
+				becomes available
+		"""
+		os.lseek(fd, 0, os.SEEK_SET)
+		content = os.read(fd, 64)
+		try:
+			tokens, stamp = map(float, content.split())
+		except ValueError:  # new or corrupted bucket
+			tokens, stamp = self.burst, now
+		tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+		if tokens < 1:
+			return (1 - tokens) / self.rate
+		state = ("%.6f %.6f\n" % (tokens - 1, now)).encode("ascii")
+		os.lseek(fd, 0, os.SEEK_SET)
+		os.write(fd, state)
+		os.ftruncate(fd, len(state))
+		return 0
+
+	def take_token(self, agent):
+		"""Wait until the token bucket of the given agent permits sending a
+		PDU and consume one token.
+		@type agent: str
+		@raises GovernorTimeout:
+		"""
+		deadline = time.time() + self.timeout
+		fd = os.open(os.path.join(self.directory, agent_filename(agent)), os.O_RDWR | os.O_CREAT, 0o644)
+		try:
+			while True:
+				fcntl.flock(fd, fcntl.LOCK_EX)
+				try:
+					wait = self._take(fd, time.time())
+				finally:
+					fcntl.flock(fd, fcntl.LOCK_UN)
+				if not wait:
+					return
+				logger.debug("rate limit for agent %s exceeded, waiting %.3fs", agent, wait)
+				if time.time() + wait > deadline:
+					raise GovernorTimeout("timed out waiting for the rate limit of %s" % agent)
+				time.sleep(wait)
+		finally:
+			os.close(fd)
+
+	@contextlib.contextmanager
+	def pdu(self, agent):
+		"""A context manager that is to be wrapped around sending a PDU to
+		the given agent and receiving its response."""
+		self.take_token(agent)
+		fd = self.acquire_slot()
+		try:
+			yield
+		finally:
+			self.release_slot(fd)
+
+
+class GovernedBackend(backend.BackendBase):
+	"""A backend asking a Governor for permission before forwarding any
+	query to another backend."""
+	def __init__(self, back, governor, agent):
+		"""
+		@type back: BackendBase
+		@type governor: Governor
+		@type agent: str
+		@param agent: is the address of the agent used for rate limiting
+		"""
+		backend.BackendBase.__init__(self)
+		self.backend = back
+		self.governor = governor
+		self.address = agent
+
+	def get(self, oid):
+		with self.governor.pdu(self.address):
+			return self.backend.get(oid)
+
+	def getnext(self, oid):
+		with self.governor.pdu(self.address):
+			return self.backend.getnext(oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		with self.governor.pdu(self.address):
+			return self.backend.getbulk(oids, nonrep, maxrep)
+
+	def close(self):
+		self.governor.close()
+		self.backend.close()
+
+	def __repr__(self):
+		return "GovernedBackend(%r)" % (self.backend,)
+
+
+def add_governor_options(parser):
+	group = parser.add_argument_group("coordination", "host-wide limits shared by all nssct processes")
+	group.add_argument("--governor", metavar="DIR", default=None,
+						help="coordinate with other nssct processes using lock files in DIR")
+	group.add_argument("--max-pdus", type=int, default=16, metavar="N",
+						help="host-wide maximum of outstanding PDUs (default: %(default)s)")
+	group.add_argument("--agent-rate", type=float, default=50.0, metavar="R",
+						help="maximum PDUs per second sent to one agent (default: %(default)s)")
+	group.add_argument("--agent-burst", type=float, default=10.0, metavar="B",
+						help="number of PDUs an agent may receive in a burst (default: %(default)s)")
+
+def setup_governor(namespace, back, agent):
+	"""Wrap the given backend in a GovernedBackend if requested by the
+	parsed arguments.
+	@rtype: BackendBase
+	"""
+	if namespace.governor is None:
+		return back
+	gov = Governor(namespace.governor, namespace.max_pdus, namespace.agent_rate, namespace.agent_burst)
+	return GovernedBackend(back, gov, agent)
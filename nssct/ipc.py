@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+
+"""The protocol spoken between nssct-client and nssct-daemon over a Unix
+stream socket. Every message is a JSON object on a single line. The client
+sends one request of the form {"argv": [arguments]} and the daemon answers
+with {"output": text, "errors": text, "status": int}, where output is to be
+written to stdout, errors to stderr and status is the exit code of the check.
+
+This module is imported by the client, so it must stay cheap to import.
+"""
+
+import json
+import socket
+
+DEFAULT_SOCKET = "/run/nssct/nssct.sock"
+
+MAX_MESSAGE = 1 << 20
+
+
+class ProtocolError(Exception):
+	"""Raised when the peer sends something that is not a message."""
+
+
+def send_message(stream, message):
+	"""
+	@param stream: a binary file-like object
+	@type message: dict
+	"""
+	stream.write(json.dumps(message).encode("utf-8") + b"\n")
+	stream.flush()
+
+
+def receive_message(stream):
+	"""
+	@param stream: a binary file-like object
+	@rtype: dict
+	@raises ProtocolError:
+	"""
+	line = stream.readline(MAX_MESSAGE)
+	if not line.endswith(b"\n"):
+		raise ProtocolError("truncated message")
+	try:
+		message = json.loads(line.decode("utf-8"))
+	except ValueError as err:
+		raise ProtocolError("malformed message: %s" % err)
+	if not isinstance(message, dict):
+		raise ProtocolError("message is not an object")
+	return message
+
+
+def request_argv(message):
+	"""Extract the arguments from a request.
+	@type message: dict
+	@rtype: [str]
+	@raises ProtocolError:
+	"""
+	argv = message.get("argv")
+	if not isinstance(argv, list) or not all(isinstance(arg, type(u"")) for arg in argv):
+		raise ProtocolError("bad request")
+	return [str(arg) for arg in argv]
+
+
+def request(path, argv):
+	"""Ask the daemon listening on path to run a check.
+	@type path: str
+	@type argv: [str]
+	@rtype: dict
+	@returns: the response of the daemon
+	@raises socket.error:
+	@raises ProtocolError:
+	"""
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(path)
+		stream = sock.makefile("rwb")
+		try:
+			send_message(stream, dict(argv=argv))
+			return receive_message(stream)
+		finally:
+			stream.close()
+	finally:
+		sock.close()
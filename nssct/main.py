@@ -1,16 +1,32 @@
 # -*- encoding: utf-8 -*-
 
+import time
+LOADED = time.time()  # the imports phase starts here unless the process start is known
+
+import contextlib
+import logging
 import socket
 import sys
 
 import argparse
 
+from . import accounting
 from . import controller
 from . import engine
+from . import future
+from . import governor
 from . import log
+from . import passive
+from . import perfdata
+from . import plugins
+from . import profiling
 from .plugins import detect
 from . import report
-from .backend import mock, network
+from . import resultcache
+from . import trace
+from .backend import mock
+
+logger = logging.getLogger(__name__)
 
 class CustomParser(argparse.ArgumentParser):
 	def exit(self, status=0, message=None):
@@ -23,34 +39,179 @@ def finish(collector):
 	sys.exit(collector.state())
 
 
-def main():
-	parser = CustomParser()
+def build_parser(parser_class=CustomParser):
+	"""Create the parser for the command line of a check.
+	@param parser_class: an ArgumentParser subclass to instantiate
+	"""
+	parser = parser_class()
 	group = parser.add_mutually_exclusive_group(required=True)
 	group.add_argument("--mock", metavar="FILE", help="check recorded snmpwalk")
 	group.add_argument("--agent", metavar="IP", help="check given SNMP agent")
 	parser.add_argument("--community", default="public", help="SNMP community to use when --agent is given")
 	parser.add_argument("--bulk", nargs='?', type=int, default=-1, const=0, metavar="N", help="use the bulk engine. If a parameter is given it specifies how many additional getnext should be issued in bulk mode.")
 	parser.add_argument("--cache", action="store_true", help="Cache SNMP results. If two plugins request the same object, a cached version is returned.")
+	parser.add_argument("--select", action="append", default=[], metavar="NAMES",
+						help="Only run the plugins with the given comma separated names or tags (e.g. cpu, memory, temperature, fan, psu, environment, stack). May be repeated.")
 	log.add_log_options(parser)
-	args = parser.parse_args()
-	log.setup_logging(args)
-	collector = report.Collector()
+	governor.add_governor_options(parser)
+	passive.add_passive_options(parser)
+	perfdata.add_perfdata_options(parser)
+	resultcache.add_resultcache_options(parser)
+	profiling.add_profile_options(parser)
+	trace.add_trace_options(parser)
+	accounting.add_accounting_options(parser)
+	return parser
+
+
+def preload():
+	"""Import the modules otherwise imported lazily by a check. Long running
+	processes do this up front, such that checks do not pay for it."""
+	import distutils.version  # pylint: disable=W0611
+	from .backend import network  # pylint: disable=W0611
+	detect.collect_oids()
+
+
+def backend_key(args):
+	"""Backends created from parsed arguments with equal keys are
+	interchangeable.
+	@rtype: tuple
+	"""
+	return (args.mock, args.agent, args.community, args.governor, args.max_pdus, args.agent_rate, args.agent_burst)
+
+
+def open_backend(args):
+	"""Create the backend described by the parsed arguments.
+	@rtype: BackendBase
+	@raises socket.gaierror: if the agent cannot be resolved
+	"""
 	if args.mock:
-		backend = mock.MockBackend(args.mock)
-	else:
-		try:
-			backend = network.NetworkBackend(args.agent, args.community)
-		except socket.gaierror as err:
-			collector.add_alert(report.Alert(report.UNKNOWN, "resolution of %s failed: %s" % (args.agent, err.strerror)))
-			finish(collector)
+		return mock.MockBackend(args.mock)
+	from .backend import network  # importing pysnmp's oneliner api is slow
+	backend = network.NetworkBackend(args.agent, args.community)
+	return governor.setup_governor(args, backend, backend.address)
+
+
+def resolution_failed(args, err):
+	"""Report a socket.gaierror from open_backend.
+	@rtype: Collector
+	"""
+	collector = report.Collector()
+	collector.add_alert(report.Alert(report.UNKNOWN, "resolution of %s failed: %s" % (args.agent, err.strerror)))
+	return collector
+
+
+def run(args, backend, observer=None, watch=None, timer=None):
+	"""Check the device behind the given backend as configured by the parsed
+	arguments.
+	@param observer: a function called with the controller and engine after
+			polling the device. It is not called for a stored result.
+	@param watch: a function called with the controller returning a context
+			manager, which is entered while the controller runs
+	@type timer: PhaseTimer or None
+	@param timer: receives the time spent in detection plugins, other
+			plugins and engine steps
+	@rtype: Collector
+	"""
+	collector = report.Collector()
+	problem = passive.usage_error(args) or perfdata.usage_error(args)
+	if problem is not None:
+		collector.add_alert(report.Alert(report.UNKNOWN, problem))
+		return collector
+	splitter = passive.setup_passive(args)
+	cache = resultcache.setup_resultcache(args)
+	if cache is None or splitter is not None:  # passive results must be submitted
+		return poll(args, backend, splitter, observer, watch, timer)
+	if args.trace is not None or args.plugin_costs:
+		logger.info("not using stored results, the poll is traced or accounted")
+		return poll(args, backend, splitter, observer, watch, timer)
+	return cache.lookup(resultcache.result_key(args), lambda: poll(args, backend, splitter, observer, watch, timer))
+
+
+@contextlib.contextmanager
+def unwatched(control):
+	yield
+
+
+def poll(args, backend, splitter, observer=None, watch=None, timer=None):
+	"""Poll the device behind the given backend.
+	@type splitter: ServiceSplitter or None
+	@param observer: see run
+	@param watch: see run
+	@param timer: see run
+	@rtype: Collector
+	"""
+	collector = report.Collector()
+	tracer = trace.setup_trace(args)
+	if tracer is not None:
+		backend = trace.TracingBackend(backend, tracer)
 	if args.bulk >= 0:
 		eng = engine.BulkEngine(backend, lookahead=args.bulk)
 	else:
 		eng = engine.SimpleEngine(backend)
 	if args.cache:
 		eng = engine.CachingEngine(eng)
-	control = controller.Controller(eng)
-	control.run(collector, [detect.detect])
+	specs = [spec for value in args.select for spec in value.split(",") if spec]
+	if splitter is None:
+		selection = controller.PluginSelection(specs)
+	else:
+		selection = splitter.selection()
+	costs = accounting.setup_accounting(args)
+	controleng = eng if costs is None else accounting.AccountingEngine(eng, costs)
+	if tracer is not None:
+		controleng = trace.TracingEngine(controleng, tracer)
+	profiler = costs
+	if timer is not None:
+		controleng = profiling.TimedEngine(controleng, timer)
+		profiler = profiling.TaskPhases(timer, costs)
+	control = controller.Controller(controleng, selection, tracer)
+	control.facts.set(plugins.agent_address, getattr(backend, "address", None))
+	previous = future.set_task_profiler(profiler)
+	try:
+		with (unwatched if watch is None else watch)(control):
+			control.run(splitter or collector, [detect.detect])
+	finally:
+		future.set_task_profiler(previous)
+	logger.debug("walk statistics: %r", dict(control.counters))
+	if costs is not None:
+		costs.log(logging.INFO if args.plugin_costs else logging.DEBUG)
+	if tracer is not None:
+		tracer.write(args.trace)
+	if observer is not None:
+		observer(control, eng)
+	if splitter is not None:
+		return passive.submit(args, splitter)
+	if specs and not control.selection.matched:
+		collector.add_alert(report.Alert(report.UNKNOWN, "no plugin matches the selection %s" % ",".join(specs)))
+	return collector
+
+
+def main(argv=None):
+	timer = profiling.PhaseTimer()
+	timer.add("imports", timer.clock() - (profiling.process_start(timer.clock) or LOADED))
+	with timer.phase("parse"):
+		args = build_parser().parse_args(argv)
+		log.setup_logging(args)
+	profile = profiling.setup_profile(args)
+	if profile is not None:
+		profile.start()
+	try:
+		with timer.phase("backend"):
+			try:
+				backend = open_backend(args)
+			except socket.gaierror as err:
+				backend = None
+				collector = resolution_failed(args, err)
+		if backend is not None:
+			with timer.phase("poll"):
+				collector = run(args, profiling.TimedBackend(backend, timer), timer=timer)
+		with timer.phase("flush"):
+			perfdata.flush_all()
+	finally:
+		if profile is not None:
+			profile.stop()
+	logger.debug("phases: %s", timer.breakdown())
+	if args.phase_perfdata:
+		collector.metrics.extend(timer.metrics())  # no alerts, just perfdata
 	finish(collector)
 
 if __name__ == "__main__":
@@ -0,0 +1,375 @@
+# -*- encoding: utf-8 -*-
+
+"""Metrics about nssct itself in the text exposition format of Prometheus.
+The daemon serves them over HTTP, such that the capacity of a poller can be
+planned from the number of PDUs, their round trip times, cache efficiency,
+scheduling lag and plugin failures actually observed.
+
+A Registry holds counters, gauges and histograms with labels. Values are
+updated from the threads running checks, so all updates take a lock.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+try:
+	from http import server as httpserver
+except ImportError:
+	import BaseHTTPServer as httpserver
+
+from . import backend
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_value(value):
+	"""
+	>>> format_value(3)
+	'3'
+	>>> format_value(0.25)
+	'0.25'
+	>>> format_value(float("inf"))
+	'+Inf'
+	"""
+	if isinstance(value, float):
+		if value == float("inf"):
+			return "+Inf"
+		if value == float("-inf"):
+			return "-Inf"
+		return repr(value)
+	return str(value)
+
+
+def format_labels(pairs):
+	"""
+	>>> format_labels([("agent", '192.0.2.1'), ("note", 'a "b"\\n')])
+	'{agent="192.0.2.1",note="a \\\\"b\\\\"\\\\n"}'
+	>>> format_labels([])
+	''
+	"""
+	if not pairs:
+		return ""
+	return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+							for name, value in pairs)
+
+
+class Metric(object):
+	"""A named family of values distinguished by labels.
+	@type name: str
+	@type help: str
+	@type labelnames: (str,)
+	"""
+	kind = None
+
+	def __init__(self, name, help, labelnames=()):  # pylint: disable=W0622
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self.lock = threading.Lock()
+		self.values = {}
+
+	def _key(self, labels):
+		if set(labels) != set(self.labelnames):
+			raise ValueError("%s requires the labels %s" % (self.name, ", ".join(self.labelnames)))
+		return tuple(labels[name] for name in self.labelnames)
+
+	def samples(self):
+		"""
+		@rtype: [(str, [(str, object)], int or float)]
+		@returns: triples of sample name, label pairs and value
+		"""
+		with self.lock:
+			return [(self.name, list(zip(self.labelnames, key)), value)
+					for key, value in sorted(self.values.items())]
+
+
+class Counter(Metric):
+	kind = "counter"
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		with self.lock:
+			self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+	kind = "gauge"
+
+	def __init__(self, name, help, labelnames=()):  # pylint: disable=W0622
+		Metric.__init__(self, name, help, labelnames)
+		self.function = None
+
+	def set_function(self, function):
+		"""Compute the value of a gauge without labels when it is rendered.
+		@param function: a function without parameters returning the value
+		"""
+		self.function = function
+
+	def samples(self):
+		if self.function is not None:
+			return [(self.name, [], self.function())]
+		return Metric.samples(self)
+
+	def set(self, value, **labels):
+		key = self._key(labels)
+		with self.lock:
+			self.values[key] = value
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		with self.lock:
+			self.values[key] = self.values.get(key, 0) + amount
+
+	def dec(self, amount=1, **labels):
+		self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+	kind = "histogram"
+
+	def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):  # pylint: disable=W0622
+		Metric.__init__(self, name, help, labelnames)
+		self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		with self.lock:
+			counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					counts[i] += 1
+					break
+			self.values[key] = (counts, total + value)
+
+	def samples(self):
+		result = []
+		with self.lock:
+			for key, (counts, total) in sorted(self.values.items()):
+				pairs = list(zip(self.labelnames, key))
+				cumulative = 0
+				for bound, count in zip(self.buckets, counts):
+					cumulative += count
+					result.append((self.name + "_bucket", pairs + [("le", format_value(float(bound)))], cumulative))
+				result.append((self.name + "_sum", pairs, total))
+				result.append((self.name + "_count", pairs, cumulative))
+		return result
+
+
+class Registry(object):
+	"""A collection of metrics. Metrics are created on first use, so
+	independent parts of nssct can share a metric by name."""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.metrics = {}
+
+	def _get(self, cls, name, help, labelnames, **kwargs):  # pylint: disable=W0622
+		with self.lock:
+			metric = self.metrics.get(name)
+			if metric is None:
+				metric = self.metrics[name] = cls(name, help, labelnames, **kwargs)
+			elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+				raise ValueError("metric %s redefined" % name)
+			return metric
+
+	def counter(self, name, help, labelnames=()):  # pylint: disable=W0622
+		"""@rtype: Counter"""
+		return self._get(Counter, name, help, labelnames)
+
+	def gauge(self, name, help, labelnames=()):  # pylint: disable=W0622
+		"""@rtype: Gauge"""
+		return self._get(Gauge, name, help, labelnames)
+
+	def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):  # pylint: disable=W0622
+		"""@rtype: Histogram"""
+		return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+	def render(self):
+		"""
+		@rtype: str
+		@returns: all metrics in the text exposition format
+
+		>>> registry = Registry()
+		>>> registry.counter("nssct_pdus_total", "PDUs sent", ["agent"]).inc(agent="192.0.2.1")
+		>>> print(registry.render().strip())
+		# HELP nssct_pdus_total PDUs sent
+		# TYPE nssct_pdus_total counter
+		nssct_pdus_total{agent="192.0.2.1"} 1
+		"""
+		with self.lock:
+			metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+		lines = []
+		for metric in metrics:
+			lines.append("# HELP %s %s" % (metric.name, metric.help))
+			lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+			for name, pairs, value in metric.samples():
+				lines.append("%s%s %s" % (name, format_labels(pairs), format_value(value)))
+		return "".join(line + "\n" for line in lines)
+
+
+class InstrumentedBackend(backend.BackendBase):
+	"""A backend counting the PDUs forwarded to another backend and
+	measuring their round trip times."""
+	def __init__(self, back, registry, agent):
+		"""
+		@type back: BackendBase
+		@type registry: Registry
+		@type agent: str
+		@param agent: is the value of the agent label
+		"""
+		backend.BackendBase.__init__(self)
+		self.backend = back
+		self.agent = agent
+		self.address = getattr(back, "address", None)
+		self.pdus = registry.counter("nssct_pdus_total", "SNMP PDUs sent", ["agent", "operation"])
+		self.errors = registry.counter("nssct_pdu_errors_total", "SNMP PDUs failing with a backend error",
+										["agent", "operation"])
+		self.rtt = registry.histogram("nssct_pdu_rtt_seconds", "Round trip time of SNMP PDUs", ["agent"],
+									RTT_BUCKETS)
+
+	def _query(self, operation, function, *args):
+		self.pdus.inc(agent=self.agent, operation=operation)
+		start = time.time()
+		try:
+			return function(*args)
+		except backend.BackendError:
+			self.errors.inc(agent=self.agent, operation=operation)
+			raise
+		finally:
+			self.rtt.observe(time.time() - start, agent=self.agent)
+
+	def get(self, oid):
+		return self._query("get", self.backend.get, oid)
+
+	def getnext(self, oid):
+		return self._query("getnext", self.backend.getnext, oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		return self._query("getbulk", self.backend.getbulk, oids, nonrep, maxrep)
+
+	def close(self):
+		self.backend.close()
+
+	def __repr__(self):
+		return "InstrumentedBackend(%r)" % (self.backend,)
+
+
+class CheckMetrics(object):
+	"""Records the outcome of checks and the statistics of their controllers
+	and engines in a Registry."""
+	def __init__(self, registry):
+		self.registry = registry
+		self.checks = registry.counter("nssct_checks_total", "Checks run by final state", ["state"])
+		self.duration = registry.histogram("nssct_check_duration_seconds", "Duration of checks")
+		self.running = registry.gauge("nssct_checks_running", "Checks currently running")
+		self.controller = registry.counter("nssct_controller_events_total",
+											"Walks started, joined and shared and plugins started, failed and stalled",
+											["event"])
+		self.cache = registry.counter("nssct_cache_requests_total",
+									"Requests to the caching engine by how they were served", ["result"])
+		self.cache_entries = registry.histogram("nssct_cache_entries", "Objects cached per check",
+												buckets=(10, 100, 1000, 10000, 100000))
+		self.lag = registry.histogram("nssct_scheduler_lag_seconds",
+									"Delay of scheduled checks beyond their planned start",
+									buckets=(0.01, 0.1, 1.0, 10.0, 60.0, 300.0))
+		self.lock = threading.Lock()
+		self.controllers = set()  # of the checks polling
+		registry.gauge("nssct_pending_plugins",
+						"Plugins started and not yet completed by the checks polling").set_function(self.pending_plugins)
+
+	@contextlib.contextmanager
+	def watch_run(self, control):
+		"""Count the pending plugins of a controller while it runs.
+		@type control: Controller
+		"""
+		with self.lock:
+			self.controllers.add(control)
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.controllers.discard(control)
+
+	def pending_plugins(self):
+		"""
+		@rtype: int
+		"""
+		with self.lock:
+			return sum(len(control.pending_plugins) for control in self.controllers)
+
+	def observe_run(self, control, eng):
+		"""Record the statistics of a finished check.
+		@type control: Controller
+		@type eng: AbstractEngine
+		"""
+		for event, count in control.counters.items():
+			self.controller.inc(count, event=event)
+		counters = getattr(eng, "counters", None)
+		if counters is not None:
+			for result, count in counters.items():
+				self.cache.inc(count, result=result)
+			self.cache_entries.observe(len(eng.cache.oids) + len(eng.cache.nexts))
+
+	def observe_check(self, state, duration):
+		self.checks.inc(state=state)
+		self.duration.observe(duration)
+
+
+class MetricsHandler(httpserver.BaseHTTPRequestHandler):
+	def do_GET(self):  # pylint: disable=C0103
+		if self.path.split("?")[0] not in ("/", "/metrics"):
+			self.send_error(404)
+			return
+		body = self.server.registry.render().encode("utf-8")
+		self.send_response(200)
+		self.send_header("Content-Type", CONTENT_TYPE)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):  # pylint: disable=W0622
+		logger.debug("%s " + format, self.address_string(), *args)
+
+
+class MetricsServer(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, registry):
+		"""
+		@type address: (str, int)
+		@type registry: Registry
+		"""
+		httpserver.HTTPServer.__init__(self, address, MetricsHandler)
+		self.registry = registry
+
+
+def add_metrics_options(parser):
+	group = parser.add_argument_group("metrics", "expose metrics about nssct itself")
+	group.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+						help="serve metrics in the Prometheus text format over HTTP on PORT")
+	group.add_argument("--metrics-address", default="127.0.0.1", metavar="IP",
+						help="address to serve metrics on (default: %(default)s)")
+
+def setup_metrics(namespace, registry):
+	"""Start a thread serving the metrics of registry if requested.
+	@rtype: MetricsServer or None
+	"""
+	if namespace.metrics_port is None:
+		return None
+	server = MetricsServer((namespace.metrics_address, namespace.metrics_port), registry)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	logger.info("serving metrics on %s:%d", *server.server_address[:2])
+	return server
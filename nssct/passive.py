@@ -0,0 +1,262 @@
+# -*- encoding: utf-8 -*-
+
+"""Submit the results of one check as passive check results for several
+Nagios services. Every service is given by its service description and a
+plugin selection. The plugins run once for the union of all selections and
+each service receives the results of the plugins it selects. Results of
+untagged plugins, such as an unknown device, go to every service.
+
+Results are written either to the external command file of Nagios or as
+files to its check result spool directory. Their performance data may be
+diverted to spool files (see the perfdata module).
+"""
+
+import argparse
+import errno
+import fcntl
+import logging
+import os
+import random
+import string
+import time
+
+from . import controller
+from . import perfdata
+from . import report
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceSplitter(object):
+	"""A collector distributing results to one Collector per service by the
+	plugin reporting them. Results reported directly to it go to every
+	service."""
+	def __init__(self, services):
+		"""
+		@type services: [(str, PluginSelection)]
+		@param services: pairs of service description and plugin selection
+		"""
+		self.services = [(description, selection, report.Collector()) for description, selection in services]
+
+	def collectors(self, plugin=None):
+		"""
+		@returns: the collectors of the services selecting plugin or of all
+				services if no plugin is given
+		"""
+		return [collector for _, selection, collector in self.services
+				if plugin is None or selection.selects(plugin)]
+
+	def add_alert(self, alert):
+		for collector in self.collectors():
+			collector.add_alert(alert)
+
+	def add_metric(self, metric):
+		for collector in self.collectors():
+			collector.add_metric(metric)
+
+	def for_plugin(self, plugin):
+		return ScopedCollector(self, self.collectors(plugin))
+
+	def selection(self):
+		"""
+		@rtype: PluginSelection
+		@returns: a selection of all plugins selected by any service
+		"""
+		specs = set()
+		for _, selection, _ in self.services:
+			if not selection.specs:
+				return controller.PluginSelection()
+			specs.update(selection.specs)
+		return controller.PluginSelection(specs)
+
+	def results(self):
+		"""
+		@rtype: [(str, Collector)]
+		"""
+		return [(description, collector) for description, _, collector in self.services]
+
+
+class ScopedCollector(object):
+	"""Forwards the results of a plugin to the collectors of the services
+	selecting it."""
+	def __init__(self, splitter, collectors):
+		self.splitter = splitter
+		self.collectors = collectors
+
+	def add_alert(self, alert):
+		for collector in self.collectors:
+			collector.add_alert(alert)
+
+	def add_metric(self, metric):
+		for collector in self.collectors:
+			collector.add_metric(metric)
+
+	def for_plugin(self, plugin):
+		return self.splitter.for_plugin(plugin)
+
+
+def escape_output(text):
+	"""Encode plugin output for a single line as understood by Nagios.
+
+	>>> escape_output("OK - 2 subchecks\\nOK - fan is good")
+	'OK - 2 subchecks\\\\nOK - fan is good'
+	"""
+	return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def write_command_file(path, host, results, now=None, perfdata=True):
+	"""Append PROCESS_SERVICE_CHECK_RESULT commands to the external command
+	file of Nagios.
+	@type path: str
+	@type host: str
+	@type results: [(str, Collector)]
+	@type perfdata: bool
+	@param perfdata: whether to submit the performance data
+	@raises OSError: with errno ENXIO if path is a named pipe nobody reads
+	"""
+	now = int(time.time() if now is None else now)
+	# Usually path is a named pipe. Opening it blocks until Nagios reads it
+	# unless O_NONBLOCK is given. Writes may block again.
+	fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+	try:
+		fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+		for service, collector in results:
+			line = "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s\n" % \
+					(now, host, service, collector.state(), escape_output(collector.output(perfdata)))
+			# A single write keeps lines up to PIPE_BUF from interleaving
+			# with other writers.
+			os.write(fd, line.encode("utf-8"))
+	finally:
+		os.close(fd)
+
+
+def _create_result_file(directory):
+	"""Nagios only picks up files named c followed by six characters.
+	@rtype: (int, str)
+	@returns: a file descriptor and the name of a new file
+	"""
+	chars = string.ascii_letters + string.digits
+	while True:
+		name = os.path.join(directory, "c" + "".join(random.choice(chars) for _ in range(6)))
+		try:
+			return os.open(name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), name
+		except OSError as err:
+			if err.errno != errno.EEXIST:
+				raise
+
+
+def write_checkresults(directory, host, results, now=None, perfdata=True):
+	"""Write files to the check result spool directory of Nagios. A file is
+	only processed after the accompanying .ok file is created.
+	@type directory: str
+	@type host: str
+	@type results: [(str, Collector)]
+	@type perfdata: bool
+	@param perfdata: whether to submit the performance data
+	@raises OSError:
+	"""
+	now = time.time() if now is None else now
+	for service, collector in results:
+		content = "".join([
+			"### Passive Check Result File ###\n",
+			"file_time=%d\n\n" % now,
+			"### Nagios Service Check Result ###\n",
+			"host_name=%s\n" % host,
+			"service_description=%s\n" % service,
+			"check_type=1\n",
+			"check_options=0\n",
+			"scheduled_check=0\n",
+			"reschedule_check=0\n",
+			"latency=0.0\n",
+			"start_time=%.6f\n" % now,
+			"finish_time=%.6f\n" % now,
+			"early_timeout=0\n",
+			"exited_ok=1\n",
+			"return_code=%d\n" % collector.state(),
+			"output=%s\n" % escape_output(collector.output(perfdata)),
+		])
+		fd, name = _create_result_file(directory)
+		try:
+			os.write(fd, content.encode("utf-8"))
+		finally:
+			os.close(fd)
+		os.close(os.open(name + ".ok", os.O_WRONLY | os.O_CREAT, 0o644))
+
+
+def parse_service(text):
+	"""Parse a --service argument.
+	@type text: str
+	@rtype: (str, [str])
+
+	>>> parse_service("CPU=cpu")
+	('CPU', ['cpu'])
+	>>> parse_service("Environment=fan,psu,temperature")
+	('Environment', ['fan', 'psu', 'temperature'])
+	"""
+	description, sep, specs = text.rpartition("=")
+	if not sep or not description:
+		raise argparse.ArgumentTypeError("expected DESCRIPTION=NAMES, got %r" % text)
+	return description, [spec for spec in specs.split(",") if spec]
+
+
+def add_passive_options(parser):
+	group = parser.add_argument_group("passive results", "submit the results for several services")
+	group.add_argument("--service", action="append", type=parse_service, default=[], metavar="DESCRIPTION=NAMES",
+						help="submit the results of the plugins with the given comma separated names or tags as passive result for the given service description. May be repeated.")
+	group.add_argument("--host", metavar="NAME", help="host name to submit passive results for")
+	target = group.add_mutually_exclusive_group()
+	target.add_argument("--command-file", metavar="FILE", help="write passive results to the nagios command file FILE")
+	target.add_argument("--checkresult-dir", metavar="DIR", help="write passive results to the nagios check result directory DIR")
+
+def setup_passive(namespace):
+	"""
+	@rtype: ServiceSplitter or None
+	@returns: a splitter if passive results were requested
+	"""
+	if not namespace.service:
+		return None
+	return ServiceSplitter([(description, controller.PluginSelection(specs))
+							for description, specs in namespace.service])
+
+def usage_error(namespace):
+	"""Check the passive options for consistency.
+	@rtype: str or None
+	@returns: a message describing the problem if there is one
+	"""
+	if not namespace.service:
+		return None
+	if namespace.select:
+		return "--select cannot be combined with --service"
+	if namespace.host is None or (namespace.command_file is None and namespace.checkresult_dir is None):
+		return "--service requires --host and either --command-file or --checkresult-dir"
+	return None
+
+def submit(namespace, splitter):
+	"""Write the passive results and summarize the outcome.
+	@type splitter: ServiceSplitter
+	@rtype: Collector
+	@returns: the result of the check submitting the passive results
+	"""
+	collector = report.Collector()
+	results = splitter.results()
+	spool = perfdata.setup_perfdata(namespace)
+	try:
+		if namespace.command_file is not None:
+			write_command_file(namespace.command_file, namespace.host, results, perfdata=spool is None)
+		else:
+			write_checkresults(namespace.checkresult_dir, namespace.host, results, perfdata=spool is None)
+	except OSError as err:
+		if err.errno == errno.ENXIO and namespace.command_file is not None:
+			problem = "nagios does not read the command file %s" % namespace.command_file
+			logger.error("failed to submit passive results: %s", problem)
+		else:
+			problem = str(err)
+			logger.exception("failed to submit passive results")
+		collector.add_alert(report.Alert(report.UNKNOWN, "failed to submit passive results: %s" % problem))
+		return collector
+	if spool is not None:
+		spool.add(namespace.host, results)
+	collector.add_alert(report.Alert(report.OK, "submitted results for %d services" % len(results)))
+	for service, result in results:
+		collector.add_alert(report.Alert(report.OK, "%s is %s" % (service, report.states[result.state()])))
+	return collector
@@ -0,0 +1,224 @@
+# -*- encoding: utf-8 -*-
+
+"""Write performance data directly to spool files instead of passing it
+through Nagios. Combined with passive results (see the passive module), the
+results submitted to Nagios no longer carry performance data and the metrics
+are written in batches to a spool directory processed by npcd of pnp4nagios
+or by a collector reading the InfluxDB line protocol.
+
+Records are buffered per process and written as one file per batch. A batch
+is written once it contains the given number of records or its oldest
+record is older than the given delay. Every file is written under a name
+starting with a dot, which npcd ignores, and renamed when complete, so
+readers never see partial files.
+"""
+
+import errno
+import itertools
+import logging
+import os
+import threading
+import time
+
+from . import report
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("npcd", "line")
+
+
+def npcd_record(now, host, service, collector, command="check_nssct"):
+	"""Format the metrics of a service as a line in the bulk format of npcd.
+	@type now: float
+	@type host: str
+	@type service: str
+	@type collector: Collector
+	@type command: str
+	@param command: is the check command used by pnp4nagios to choose a
+			template
+	@rtype: [str]
+
+	>>> collector = report.Collector()
+	>>> collector.add_metric(report.PerfMetric("cpu", 5, "%", 80, 90))
+	>>> npcd_record(1000, "sw1", "CPU", collector)[0].split("\\t")
+	['DATATYPE::SERVICEPERFDATA', 'TIMET::1000', 'HOSTNAME::sw1', 'SERVICEDESC::CPU', 'SERVICEPERFDATA::cpu=5%;80;90', 'SERVICECHECKCOMMAND::check_nssct', 'SERVICESTATE::OK', 'SERVICESTATETYPE::HARD']
+	"""
+	if not collector.metrics:
+		return []
+	fields = [
+		("DATATYPE", "SERVICEPERFDATA"),
+		("TIMET", "%d" % now),
+		("HOSTNAME", host),
+		("SERVICEDESC", service),
+		("SERVICEPERFDATA", " ".join(map(str, collector.metrics))),
+		("SERVICECHECKCOMMAND", command),
+		("SERVICESTATE", report.states[collector.state()]),
+		("SERVICESTATETYPE", "HARD"),
+	]
+	return ["\t".join("%s::%s" % field for field in fields)]
+
+
+def _escape_tag(text):
+	"""
+	>>> _escape_tag("Power supply 1, rear=A")
+	'Power\\\\ supply\\\\ 1\\\\,\\\\ rear\\\\=A'
+	"""
+	for char in "\\, =":
+		text = text.replace(char, "\\" + char)
+	return text
+
+
+def line_record(now, host, service, collector, command=None):
+	"""Format the metrics of a service as lines of the InfluxDB line protocol.
+	The command is ignored.
+	@rtype: [str]
+
+	>>> collector = report.Collector()
+	>>> collector.add_metric(report.PerfMetric("cpu", 5, "%", maxval=100))
+	>>> line_record(1000, "sw1", "CPU", collector)
+	['nssct,host=sw1,service=CPU,label=cpu,uom=% value=5.0,max=100.0 1000000000000']
+	"""
+	lines = []
+	for metric in collector.metrics:
+		tags = [("host", host), ("service", service), ("label", metric.label)]
+		if metric.uom:
+			tags.append(("uom", metric.uom))
+		values = [("value", metric.value), ("min", metric.minval), ("max", metric.maxval)]
+		lines.append("nssct,%s %s %d" % (
+			",".join("%s=%s" % (key, _escape_tag(value)) for key, value in tags),
+			",".join("%s=%r" % (key, float(value)) for key, value in values if value is not None),
+			int(now) * 1000000000))
+	return lines
+
+
+class Spool(object):
+	"""Buffers records and writes them to a spool directory in batches.
+
+	@type directory: str
+	@type fmt: str
+	@ivar fmt: is one of FORMATS
+	@type batch: int
+	@ivar batch: is the number of records written to one file at most
+	@type delay: float
+	@ivar delay: is the number of seconds a record is buffered at most
+	"""
+	def __init__(self, directory, fmt="npcd", batch=500, delay=10.0, command="check_nssct"):
+		assert fmt in FORMATS
+		assert batch > 0
+		self.directory = directory
+		self.fmt = fmt
+		self.batch = batch
+		self.delay = delay
+		self.command = command
+		self.lock = threading.Lock()
+		self.records = []
+		self.timer = None
+		self.sequence = itertools.count()
+		try:
+			os.makedirs(directory)
+		except OSError as err:
+			if err.errno != errno.EEXIST:
+				raise
+
+	def add(self, host, results, now=None):
+		"""Buffer the metrics of several services.
+		@type host: str
+		@type results: [(str, Collector)]
+		"""
+		now = time.time() if now is None else now
+		formatter = npcd_record if self.fmt == "npcd" else line_record
+		records = [record for service, collector in results
+					for record in formatter(now, host, service, collector, self.command)]
+		with self.lock:
+			self.records.extend(records)
+			while len(self.records) >= self.batch:
+				self._write(self.records[:self.batch])
+				del self.records[:self.batch]
+			if self.records and self.timer is None:
+				self.timer = threading.Timer(self.delay, self.flush)
+				self.timer.daemon = True
+				self.timer.start()
+
+	def flush(self):
+		"""Write all buffered records."""
+		with self.lock:
+			if self.timer is not None:
+				self.timer.cancel()
+				self.timer = None
+			if self.records:
+				self._write(self.records)
+				self.records = []
+
+	def _write(self, records):
+		"""Write one batch. Errors are logged and the records are lost."""
+		name = "%s.%d.%d.%d" % ("perfdata" if self.fmt == "npcd" else "metrics",
+								time.time(), os.getpid(), next(self.sequence))
+		temporary = os.path.join(self.directory, "." + name)
+		try:
+			fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+			try:
+				os.write(fd, "".join(record + "\n" for record in records).encode("utf-8"))
+			finally:
+				os.close(fd)
+			os.rename(temporary, os.path.join(self.directory, name))
+		except OSError:
+			logger.exception("failed to write %d perfdata records to %s", len(records), self.directory)
+		else:
+			logger.debug("wrote %d perfdata records to %s", len(records), name)
+
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+
+def get_spool(directory, fmt, batch, delay, command):
+	"""Return the spool of this process for the given directory and format,
+	such that the checks run by a daemon share batches. The parameters of
+	the first call creating the spool remain in effect.
+	@rtype: Spool
+	"""
+	with _spools_lock:
+		key = (directory, fmt)
+		if key not in _spools:
+			_spools[key] = Spool(directory, fmt, batch, delay, command)
+		return _spools[key]
+
+
+def flush_all():
+	"""Write the buffered records of all spools of this process."""
+	with _spools_lock:
+		spools = list(_spools.values())
+	for spool in spools:
+		spool.flush()
+
+
+def add_perfdata_options(parser):
+	group = parser.add_argument_group("perfdata spool", "write the performance data of passive results to spool files")
+	group.add_argument("--perfdata-dir", metavar="DIR", default=None,
+						help="write performance data to spool files in DIR instead of submitting it to nagios")
+	group.add_argument("--perfdata-format", choices=FORMATS, default="npcd",
+						help="format of the spool files: npcd bulk mode or InfluxDB line protocol (default: %(default)s)")
+	group.add_argument("--perfdata-batch", type=int, default=500, metavar="N",
+						help="maximum number of records per spool file (default: %(default)s)")
+	group.add_argument("--perfdata-delay", type=float, default=10.0, metavar="SECONDS",
+						help="maximum time records are buffered by a daemon (default: %(default)s)")
+	group.add_argument("--perfdata-command", default="check_nssct", metavar="NAME",
+						help="check command recorded for pnp4nagios to choose a template (default: %(default)s)")
+
+def setup_perfdata(namespace):
+	"""
+	@rtype: Spool or None
+	@returns: the spool requested by the parsed arguments if any
+	"""
+	if namespace.perfdata_dir is None:
+		return None
+	return get_spool(namespace.perfdata_dir, namespace.perfdata_format, namespace.perfdata_batch,
+					namespace.perfdata_delay, namespace.perfdata_command)
+
+def usage_error(namespace):
+	"""
+	@rtype: str or None
+	"""
+	if namespace.perfdata_dir is not None and not namespace.service:
+		return "--perfdata-dir requires --service"
+	return None
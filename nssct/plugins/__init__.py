@@ -23,6 +23,21 @@ def noop_plugin(*_):
 	return iter(())  # tricky, be a generator, yield nothing
 
 
+def tags(*names):
+	"""A decorator attaching tags to a plugin. Plugins producing results
+	should be tagged with what they check (e.g. "cpu" or "fan"), such that
+	they can be selected using a PluginSelection. Plugins without tags, such
+	as the detection plugins, always run. A plugin starting further tagged
+	plugins should also be tagged with their names, such that selecting
+	them by name starts it.
+	@type names: str
+	"""
+	def decorate(plugin):
+		plugin.tags = frozenset(names)
+		return plugin
+	return decorate
+
+
 def as_decimal(intval, factor=1):
 	"""
 	@param intval: an integer-like value
@@ -64,5 +79,160 @@ def snmpwalk(controller, baseoid, startoid=None):
 	future.return_((nextoid, value, snmpwalk(controller, baseoid, nextoid)))
 
 
+def walk(controller, baseoid):
+	"""Walk over all oids, that start with baseoid. Rows are delivered in
+	batches of (oid, value) pairs as the engine receives them. With a bulk
+	engine a batch corresponds to a response PDU. Typical usage in a
+	coroutine::
+
+		fut = walk(controller, baseoid)
+		while fut:
+			rows, fut = (yield fut)
+			for oid, value in rows:
+				# do something with oid and value
+
+	Plugins walking the same subtree share the queries.
+	"""
+	return controller.walk(baseoid)
+
+
+def walk_all(controller, baseoid):
+	"""
+	@returns: a Future returning the list of all (oid, value) pairs below
+			baseoid
+	"""
+	return controller.walk_all(baseoid)
+
+
+@future.coroutine
+def table(controller, columns):
+	"""Walk the given columns of a table side by side. Since the walks are
+	started together, a bulk engine fetches them in the same requests. The
+	cells are joined by their index, i.e. the part of the oid following the
+	column oid.
+
+	@type columns: [(int,)]
+	@returns: a Future returning a list of (index, values) pairs ordered by
+			index, where values is a list with one value per column or None
+			if the row lacks the column
+	"""
+	walks = [walk_all(controller, column) for column in columns]
+	rows = {}
+	for position, (column, fut) in enumerate(zip(columns, walks)):
+		for oid, value in (yield fut):
+			cells = rows.setdefault(oid[len(column):], [None] * len(columns))
+			cells[position] = value
+	future.return_(sorted(rows.items()))
+
+
+MAX_SUBID = 4294967295
+
+@future.coroutine
+def _skipscan(controller, column, depth):
+	"""Discover the index prefixes of the given length in column using one
+	getnext per prefix. The row after a prefix is found by asking for the
+	successor of the largest possible oid beginning with it."""
+	indices = []
+	oid = column
+	while True:
+		try:
+			oid, _ = (yield controller.engine.getnext(oid))
+		except engine.EndOfMibError:
+			break
+		if not oid_startswith(oid, column) or len(oid) < len(column) + depth:
+			break
+		index = oid[len(column):len(column) + depth]
+		indices.append(index)
+		oid = column + index + (MAX_SUBID,)
+	future.return_(indices)
+
+@future.coroutine
+def _walkscan(controller, column, depth):
+	"""Derive the index prefixes from a full walk of column."""
+	indices = []
+	for oid, _ in (yield controller.walk_all(column)):
+		index = oid[len(column):len(column) + depth]
+		if len(index) == depth and (not indices or indices[-1] != index):
+			indices.append(index)
+	future.return_(indices)
+
+class TableIndices(object):
+	"""Fact: the distinct prefixes of length depth of the indices in a table
+	column. If the column is walked anyway, the prefixes are taken from that
+	walk. Otherwise they are discovered by skipping over the rows sharing a
+	prefix.
+	"""
+	def __init__(self, column, depth):
+		"""
+		@type column: (int,)
+		@type depth: int
+		"""
+		self.column = tuple(column)
+		self.depth = depth
+
+	def __eq__(self, other):
+		return isinstance(other, TableIndices) and \
+				(self.column, self.depth) == (other.column, other.depth)
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash((self.column, self.depth))
+
+	def __repr__(self):
+		return "TableIndices(%r, %d)" % (self.column, self.depth)
+
+	def __call__(self, controller):
+		if self.column in controller.walks:
+			return _walkscan(controller, self.column, self.depth)
+		return _skipscan(controller, self.column, self.depth)
+
+
+def table_indices(controller, column, depth):
+	"""Discover the index prefixes of a table once per check.
+	@type column: (int,)
+	@param column: is a column of the table, preferably a narrow one
+	@type depth: int
+	@param depth: is the length of the index prefixes to discover
+	@returns: a Future returning a list of index prefixes in oid order
+	"""
+	return controller.facts.get(TableIndices(column, depth))
+
+
+@future.coroutine
+def select_rows(controller, column, indices):
+	"""Fetch the cells of column with the given indices. All queries are
+	issued at once, so a bulk engine batches them into few requests.
+	Missing cells are skipped.
+
+	@type column: (int,)
+	@type indices: [(int,)]
+	@returns: a Future returning a list of (index, value) pairs
+	"""
+	queries = [(index, controller.engine.get(column + index)) for index in indices]
+	rows = []
+	for index, fut in queries:
+		try:
+			rows.append((index, (yield fut)))
+		except engine.NoSuchObjectError:
+			pass
+	future.return_(rows)
+
+
+sysDescr = (1, 3, 6, 1, 2, 1, 1, 1, 0)
 sysObjectID = (1, 3, 6, 1, 2, 1, 1, 2, 0)
-all_oids.add(sysObjectID)
+all_oids.update((sysDescr, sysObjectID))
+
+def sys_descr(controller):
+	"""Fact: the sysDescr of the device."""
+	return controller.engine.get(sysDescr)
+
+def sys_object_id(controller):
+	"""Fact: the sysObjectID of the device."""
+	return controller.engine.get(sysObjectID)
+
+def agent_address(controller):
+	"""Fact: the ip address of the agent or None if unknown. The value
+	should be set by whoever creates the controller."""
+	return future.completed(None)
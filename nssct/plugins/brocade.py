@@ -1,10 +1,8 @@
 # -*- encoding: utf-8 -*-
 
-import distutils.version
 import logging
 import re
 
-from ..backend import network as networkbackend
 from .. import engine
 from .. import future
 from .. import plugins
@@ -33,27 +31,56 @@ def brcd_temp(value):
 	return plugins.as_decimal(value, "0.5")
 
 
-def get_third_octet(controller):
-	if isinstance(controller.engine, engine.SimpleEngine):
-		backend = controller.engine.backend
-	elif isinstance(controller.engine, engine.CachingEngine):
-		backend = controller.engine.engine.backend
-	else:
-		backend = None
-	if isinstance(backend, networkbackend.NetworkBackend):
-		ip = backend.agent.transportAddr[0]
-		octets = ip.split('.')
-		assert len(octets) == 4
-		return int(octets[2])
+snAgImgVer = brcdIp + (1, 1, 2, 1, 11, 0)
+snStackingGlobalConfigSt = brcdIp + (1, 1, 3, 31, 1, 1, 0)
+all_oids.update((snAgImgVer, snStackingGlobalConfigSt))
+
+@future.coroutine
+def switch_type(controller):
+	"""Fact: the model of the switch as found in sysDescr or None."""
+	descr = (yield controller.facts.get(plugins.sys_descr))
+	match = re.match(SWITCH_TYPE_REGEX, str(descr))
+	future.return_(match.groupdict()['type'] if match else None)
+
+def loose_version(version):
+	"""Parse a version string into a distutils LooseVersion. Importing
+	distutils is slow, so it only happens when needed."""
+	import distutils.version
+	return distutils.version.LooseVersion(version)
+
+@future.coroutine
+def firmware_version(controller):
+	"""Fact: the running image version as a LooseVersion."""
+	img_ver = (yield controller.engine.get(snAgImgVer))
+	future.return_(loose_version(str(img_ver)))
+
+@future.coroutine
+def stacking_enabled(controller):
+	"""Fact: True if stacking is enabled, False if it is disabled and None if
+	the device does not support stacking."""
+	try:
+		stackcfg = (yield controller.engine.get(snStackingGlobalConfigSt))
+	except (engine.NoSuchObjectError, engine.EndOfMibError):
+		future.return_(None)
+	future.return_(stackcfg == 1)
 
-	return -1
+@future.coroutine
+def management_vlan(controller):
+	"""Fact: the management vlan of the switch, which by convention equals
+	the third octet of its ip address, or -1 if unknown."""
+	ip = (yield controller.facts.get(plugins.agent_address))
+	if ip is None:
+		future.return_(-1)
+	octets = ip.split('.')
+	assert len(octets) == 4
+	future.return_(int(octets[2]))
 
 
 snVLanByPortMemberTagMode = brcdIp + (1, 1, 3, 2, 6, 1, 4)
 
 @future.coroutine
 def has_userports(controller):
-	vlan_id = get_third_octet(controller)
+	vlan_id = (yield controller.facts.get(management_vlan))
 	untagged = False
 	if 20 <= vlan_id < 60:
 		# Switch is in user VLANs range, check if untagged userports configured
@@ -71,6 +98,7 @@ snChasWarningTemperature = brcdIp + (1, 1, 1, 1, 19, 0)
 snChasShutdownTemperature = brcdIp + (1, 1, 1, 1, 20, 0)
 all_oids.update((snChasActualTemperature, snChasWarningTemperature, snChasShutdownTemperature))
 
+@plugins.tags("temperature", "environment")
 @future.coroutine
 def brocade_temperature_plugin(controller, collector):
 	act = controller.engine.get(snChasActualTemperature)
@@ -89,148 +117,168 @@ snChasUnitWarningTem = brcdIp + (1, 1, 1, 4, 1, 1, 5)
 snChasUnitShutdownTemperature = brcdIp + (1, 1, 1, 4, 1, 1, 6)
 all_oids.update((snChasUnitActualTemp, snChasUnitWarningTem, snChasUnitShutdownTemperature))
 
+@plugins.tags("temperature", "environment")
 @future.coroutine
 def brocade_unit_temperature_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snChasUnitActualTemp)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		unit = oid[-1]
-		act = brcd_temp(value)
-		warn = brcd_temp((yield controller.engine.get(snChasUnitWarningTem + (unit,))))
-		if act < warn:
+	columns = (snChasUnitActualTemp, snChasUnitWarningTem, snChasUnitShutdownTemperature)
+	for index, (act, warn, crit) in (yield plugins.table(controller, columns)):
+		if act is None or warn is None:
+			continue  # incomplete row
+		unit = index[-1]
+		act = brcd_temp(act)
+		warn = brcd_temp(warn)
+		if act < warn or crit is None:
 			collector.add_metric(report.PerfMetric("chasunit%dtemp" % unit, act, warn=warn, minval=-110, maxval=250))
-			future.return_()
-		logger.debug("unit %d temperature is %s, checking shutdown point", unit, act)
-		crit = brcd_temp((yield controller.engine.get(snChasUnitShutdownTemperature + (unit,))))
+			continue
+		logger.debug("unit %d temperature is %s, reporting shutdown point", unit, act)
+		crit = brcd_temp(crit)
 		collector.add_metric(report.PerfMetric("chasunit%dtemp" % unit, act, warn=warn, crit=crit, minval=-110, maxval=250))
 
 
 snAgentTempValue = brcdIp + (1, 1, 2, 13, 1, 1, 4)
 all_oids.add(snAgentTempValue)
 
+@plugins.tags("temperature", "environment")
 @future.coroutine
 def brocade_agent_temperature_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snAgentTempValue)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		ident = oid[len(snAgentTempValue):]
-		ident = "_".join(map(str, ident))
-		act = brcd_temp(value)
-		collector.add_metric(report.PerfMetric("agent_%s_temp" % ident, act, minval=-110, maxval=250))
+	fut = plugins.walk(controller, snAgentTempValue)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			ident = oid[len(snAgentTempValue):]
+			ident = "_".join(map(str, ident))
+			act = brcd_temp(value)
+			collector.add_metric(report.PerfMetric("agent_%s_temp" % ident, act, minval=-110, maxval=250))
 
 
 snChasFanOperStatus = brcdIp + (1, 1, 1, 3, 1, 1, 3)
 all_oids.add(snChasFanOperStatus)
 
+@plugins.tags("fan", "environment")
 @future.coroutine
 def brocade_fan_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snChasFanOperStatus)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		value = int(value)
-		if value == 2:
-			msg = "fan %d is ok" % oid[-1]
-			collector.add_alert(report.Alert(report.OK, msg))
-		else:
-			msg = "fan %d is critical with status %d" % (oid[-1], value)
-			collector.add_alert(report.Alert(report.CRITICAL, msg))
+	fut = plugins.walk(controller, snChasFanOperStatus)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			value = int(value)
+			if value == 2:
+				msg = "fan %d is ok" % oid[-1]
+				collector.add_alert(report.Alert(report.OK, msg))
+			else:
+				msg = "fan %d is critical with status %d" % (oid[-1], value)
+				collector.add_alert(report.Alert(report.CRITICAL, msg))
 
 
 snChasFan2OperStatus = brcdIp + (1, 1, 1, 3, 2, 1, 4)
 all_oids.add(snChasFan2OperStatus)
 
+@plugins.tags("fan", "environment")
 @future.coroutine
 def brocade_stack_fan_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snChasFan2OperStatus)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		index = "_".join(map(str, oid[len(snChasFan2OperStatus):]))
-		value = int(value)
-		if value == 2:
-			alert = report.Alert(report.OK, "stack fan %s is ok" % index)
-		else:
-			msg = "stack fan %s is critical with status %d" % (index, value)
-			alert = report.Alert(report.CRITICAL, msg)
-		collector.add_alert(alert)
+	fut = plugins.walk(controller, snChasFan2OperStatus)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			index = "_".join(map(str, oid[len(snChasFan2OperStatus):]))
+			value = int(value)
+			if value == 2:
+				alert = report.Alert(report.OK, "stack fan %s is ok" % index)
+			else:
+				msg = "stack fan %s is critical with status %d" % (index, value)
+				alert = report.Alert(report.CRITICAL, msg)
+			collector.add_alert(alert)
 
 
 snChasPwrSupplyDescription = brcdIp + (1, 1, 1, 2, 1, 1, 2)
 snChasPwrSupplyOperStatus = brcdIp + (1, 1, 1, 2, 1, 1, 3)
 all_oids.update((snChasPwrSupplyDescription, snChasPwrSupplyOperStatus))
 
+@plugins.tags("psu", "environment")
 @future.coroutine
 def brocade_psu_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snChasPwrSupplyOperStatus)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		value = int(value)
-		index = oid[-1]
-		if value == 2: # normal
-			alert = report.Alert(report.OK, "psu %d is ok" % index)
-		elif value == 3: # failure
-			msg = str((yield controller.engine.get(snChasPwrSupplyDescription + (index,))))
-			logger.debug("failed psu %d described as %r", index, msg)
-			if msg.rstrip().endswith(" not present"):
-				alert = report.Alert(report.OK, "psu %d is not present" % index)
+	fut = plugins.walk(controller, snChasPwrSupplyOperStatus)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			value = int(value)
+			index = oid[-1]
+			if value == 2: # normal
+				alert = report.Alert(report.OK, "psu %d is ok" % index)
+			elif value == 3: # failure
+				msg = str((yield controller.engine.get(snChasPwrSupplyDescription + (index,))))
+				logger.debug("failed psu %d described as %r", index, msg)
+				if msg.rstrip().endswith(" not present"):
+					alert = report.Alert(report.OK, "psu %d is not present" % index)
+				else:
+					alert = report.Alert(report.CRITICAL, "psu %d has failed" % index)
+			elif value == 1:  # other
+				alert = report.Alert(report.OK, "psu %d is state other (possibly not present)" % index)
 			else:
-				alert = report.Alert(report.CRITICAL, "psu %d has failed" % index)
-		elif value == 1:  # other
-			alert = report.Alert(report.OK, "psu %d is state other (possibly not present)" % index)
-		else:
-			msg = "psu %d has unexpected status %d" % (index, value)
-			alert = report.Alert(report.CRITICAL, msg)
-		collector.add_alert(alert)
+				msg = "psu %d has unexpected status %d" % (index, value)
+				alert = report.Alert(report.CRITICAL, msg)
+			collector.add_alert(alert)
 
 
 snChasPwrSupply2Description = brcdIp + (1, 1, 1, 2, 2, 1, 3)
 snChasPwrSupply2OperStatus = brcdIp + (1, 1, 1, 2, 2, 1, 4)
 all_oids.update((snChasPwrSupply2Description, snChasPwrSupply2OperStatus))
 
+@plugins.tags("psu", "environment")
 @future.coroutine
 def brocade_stack_psu_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snChasPwrSupply2OperStatus)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		value = int(value)
-		index_tuple = oid[len(snChasPwrSupply2OperStatus):]
-		index = "_".join(map(str, index_tuple))
-		if value == 2: # normal
-			alert = report.Alert(report.OK, "stack psu %s is ok" % index)
-		elif value == 3: # failure
-			msg = str((yield controller.engine.get(snChasPwrSupply2Description + index_tuple)))
-			logger.debug("failed stack psu %s described as %r", index, msg)
-			if msg.rstrip().endswith(" not present"):
-				alert = report.Alert(report.OK, "stack psu %s is not present" % index)
+	fut = plugins.walk(controller, snChasPwrSupply2OperStatus)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			value = int(value)
+			index_tuple = oid[len(snChasPwrSupply2OperStatus):]
+			index = "_".join(map(str, index_tuple))
+			if value == 2: # normal
+				alert = report.Alert(report.OK, "stack psu %s is ok" % index)
+			elif value == 3: # failure
+				msg = str((yield controller.engine.get(snChasPwrSupply2Description + index_tuple)))
+				logger.debug("failed stack psu %s described as %r", index, msg)
+				if msg.rstrip().endswith(" not present"):
+					alert = report.Alert(report.OK, "stack psu %s is not present" % index)
+				else:
+					alert = report.Alert(report.CRITICAL, "stack psu %s has failed" % index)
+			elif value == 1:  # other
+				alert = report.Alert(report.OK, "stack psu %s is state other (possibly not present)" % index)
 			else:
-				alert = report.Alert(report.CRITICAL, "stack psu %s has failed" % index)
-		elif value == 1:  # other
-			alert = report.Alert(report.OK, "stack psu %s is state other (possibly not present)" % index)
-		else:
-			msg = "stack psu %s has unexpected status %d" % (index, value)
-			alert = report.Alert(report.CRITICAL, msg)
-		collector.add_alert(alert)
+				msg = "stack psu %s has unexpected status %d" % (index, value)
+				alert = report.Alert(report.CRITICAL, msg)
+			collector.add_alert(alert)
 
 
 snAgentCpuUtilValue = brcdIp + (1, 1, 2, 11, 1, 1, 4)
 all_oids.add(snAgentCpuUtilValue)
 
+@plugins.tags("cpu")
 @future.coroutine
 def brocade_cpu_usage_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snAgentCpuUtilValue)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		if oid[-1] != 300:  # select 5min interval
+	# The table is indexed by slot, cpu and interval and only the 5min
+	# interval is reported. A batching engine walks the whole column in few
+	# PDUs. Otherwise every row costs a PDU, so only the 5min cells are
+	# fetched after discovering the cpus.
+	if controller.engine.batching:
+		rows = [(oid[len(snAgentCpuUtilValue):], value)
+				for oid, value in (yield controller.walk_all(snAgentCpuUtilValue))]
+	else:
+		cpus = (yield plugins.table_indices(controller, snAgentCpuUtilValue, 2))
+		rows = (yield plugins.select_rows(controller, snAgentCpuUtilValue, [cpu + (300,) for cpu in cpus]))
+	for index, value in rows:
+		if len(index) != 3 or index[2] != 300:  # select 5min interval
 			continue
-		slot = oid[-3]
-		cpu = oid[-2]
 		value = plugins.as_decimal(value, "0.01")
-		collector.add_metric(report.PerfMetric("cpu_%d_%d" % (slot, cpu), value, "%"))
+		collector.add_metric(report.PerfMetric("cpu_%d_%d" % index[:2], value, "%"))
 
 
 snAgGblDynMemTotal = brcdIp + (1, 1, 2, 1, 54, 0)
 snAgGblDynMemFree = brcdIp + (1, 1, 2, 1, 55, 0)
 all_oids.update((snAgGblDynMemTotal, snAgGblDynMemFree))
 
+@plugins.tags("memory")
 @future.coroutine
 def brocade_mem_usage_plugin(controller, collector):
 	total = controller.engine.get(snAgGblDynMemTotal)
@@ -240,26 +288,22 @@ def brocade_mem_usage_plugin(controller, collector):
 	collector.add_metric(report.PerfMetric("dynmem", total - free, uom="B", minval=0, maxval=total))
 
 
-sysDescr = (1, 3, 6, 1, 2, 1, 1, 1, 0)
 snmpEngineTime = (1, 3, 6, 1, 6, 3, 10, 2, 1, 3, 0)
-snAgImgVer = brcdIp + (1, 1, 2, 1, 11, 0)
-all_oids.add((sysDescr, snmpEngineTime, snAgImgVer))
+all_oids.add(snmpEngineTime)
 
+@plugins.tags("uptime")
 @future.coroutine
 def brocade_uptime_plugin(controller, collector):
 	warn = None
 	crit = None
 
-	descr = yield controller.engine.get(sysDescr)
-	img_ver = yield controller.engine.get(snAgImgVer)
-	match = re.match(SWITCH_TYPE_REGEX, str(descr))
-
-	if match:
-		switch_type = match.groupdict()['type']
-		if switch_type.startswith('ICX6430') or switch_type.startswith('ICX7'):
-			if distutils.version.LooseVersion(str(img_ver)) < distutils.version.LooseVersion(UPTIME_FIX_MIN_VERSION):
-				warn = 1100 * 86400
-				crit = 1200 * 86400
+	model = controller.facts.get(switch_type)
+	img_ver = controller.facts.get(firmware_version)
+	model = yield model
+	if model is not None and (model.startswith('ICX6430') or model.startswith('ICX7')):
+		if (yield img_ver) < loose_version(UPTIME_FIX_MIN_VERSION):
+			warn = 1100 * 86400
+			crit = 1200 * 86400
 
 	uptime = yield controller.engine.get(snmpEngineTime)
 	uptime_days = round(float(uptime)/86400, 2)
@@ -267,30 +311,31 @@ def brocade_uptime_plugin(controller, collector):
 	collector.add_metric(report.PerfMetric("uptime", uptime, uom="s", warn=warn, crit=crit, msg="uptime=%4.2f days" % uptime_days))
 
 
-snAgImgVer = brcdIp + (1, 1, 2, 1, 11, 0)
 snAgFlashImgVer = brcdIp + (1, 1, 2, 1, 12, 0)
-all_oids.add(snAgImgVer)
+all_oids.add(snAgFlashImgVer)
 
+@plugins.tags("version")
 @future.coroutine
 def brocade_version_plugin(controller, collector):
 	alert = None
-	img_ver = yield controller.engine.get(snAgImgVer)
-	flash_img_ver = yield controller.engine.get(snAgImgVer)
-	descr = yield controller.engine.get(sysDescr)
-	img_ver = str(img_ver)
-	flash_img_ver = str(flash_img_ver)
+	img_ver = controller.facts.get(firmware_version)
+	flash_img_ver = controller.engine.get(snAgFlashImgVer)
+	model = controller.facts.get(switch_type)
+	img_ver = yield img_ver
+	try:
+		flash_img_ver = str((yield flash_img_ver))
+	except engine.NoSuchObjectError:
+		flash_img_ver = None
+	model = yield model
 
-	if img_ver != flash_img_ver:
+	if flash_img_ver is not None and str(img_ver) != flash_img_ver:
 		alert = report.Alert(report.WARNING, "running image version %s is not primary flash version %s" % (img_ver, flash_img_ver))
 		collector.add_alert(alert)
 
-	match = re.match(SWITCH_TYPE_REGEX, str(descr))
-	if match:
-		switch_type = match.groupdict()['type']
-		if switch_type in MIN_VERSIONS:
-			if distutils.version.LooseVersion(img_ver) < distutils.version.LooseVersion(MIN_VERSIONS[switch_type]):
-				alert = report.Alert(report.WARNING, "image version %s is too old - require version %s" % (img_ver, MIN_VERSIONS[switch_type]))
-				collector.add_alert(alert)
+	if model in MIN_VERSIONS:
+		if img_ver < loose_version(MIN_VERSIONS[model]):
+			alert = report.Alert(report.WARNING, "image version %s is too old - require version %s" % (img_ver, MIN_VERSIONS[model]))
+			collector.add_alert(alert)
 
 	if alert is None:
 		alert = report.Alert(report.OK, "image version is %s" % img_ver)
@@ -300,15 +345,13 @@ def brocade_version_plugin(controller, collector):
 snStackingGlobalTopology = brcdIp + (1, 1, 3, 31, 1, 5, 0)
 all_oids.add(snStackingGlobalTopology)
 
+@plugins.tags("stack")
 @future.coroutine
 def brocade_stacking_topology_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, snStackingConfigUnitPriority)
-	count = 0
-	while (yield fut):
-		_, _, fut = fut.result()
-		count += 1
-
-	value = yield controller.engine.get(snStackingGlobalTopology)
+	units = plugins.walk_all(controller, snStackingConfigUnitPriority)
+	value = controller.engine.get(snStackingGlobalTopology)
+	count = len((yield units))
+	value = yield value
 	value = int(value)
 	if value == 3:  # ring
 		alert = report.Alert(report.OK, "stacking topology is ring")
@@ -334,31 +377,34 @@ def brocade_stacking_topology_plugin(controller, collector):
 snStackingConfigUnitState = brcdIp + (1, 1, 3, 31, 2, 1, 1, 6)
 all_oids.add(snStackingConfigUnitState)
 
+@plugins.tags("stack")
 @future.coroutine
 def brocade_stacking_unit_state(controller, collector):
-	fut = plugins.snmpwalk(controller, snStackingConfigUnitState)
-
-	while (yield fut):
-		oid, value, fut = fut.result()
-		value = int(value)
-		index = oid[len(snStackingConfigUnitState):]
-
-		if value == 1:
-			alert = report.Alert(report.OK, "unit %s state is local" % index)
-		if value == 2:
-			alert = report.Alert(report.OK, "unit %s state is remote" % index)
-		if value == 3:
-			alert = report.Alert(report.CRITICAL, "unit %s state is reserved" % index)
-		if value == 4:
-			alert = report.Alert(report.CRITICAL, "unit %s state is empty" % index)
+	fut = plugins.walk(controller, snStackingConfigUnitState)
 
-		collector.add_alert(alert)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			value = int(value)
+			index = oid[len(snStackingConfigUnitState):]
+
+			if value == 1:
+				alert = report.Alert(report.OK, "unit %s state is local" % index)
+			if value == 2:
+				alert = report.Alert(report.OK, "unit %s state is remote" % index)
+			if value == 3:
+				alert = report.Alert(report.CRITICAL, "unit %s state is reserved" % index)
+			if value == 4:
+				alert = report.Alert(report.CRITICAL, "unit %s state is empty" % index)
+
+			collector.add_alert(alert)
 
 
 snStackingOperUnitImgVer = brcdIp + (1, 1, 3, 31, 2, 2, 1, 13)
 snStackingOperUnitBuildlVer = brcdIp + (1, 1, 3, 31, 2, 2, 1, 14)
 all_oids.update((snStackingOperUnitImgVer, snStackingOperUnitBuildlVer))
 
+@plugins.tags("stack")
 @future.coroutine
 def brocade_stacking_version_plugin(controller, collector):
 	def __check_versions(version_type, versions):
@@ -372,38 +418,38 @@ def brocade_stacking_version_plugin(controller, collector):
 			alert = report.Alert(report.WARNING, "stack %s versions not equal - %s" % (version_type, ", ".join(version_strings)))
 		collector.add_alert(alert)
 
-	fut = plugins.snmpwalk(controller, snStackingOperUnitImgVer)
+	img_rows = plugins.walk_all(controller, snStackingOperUnitImgVer)
+	build_rows = plugins.walk_all(controller, snStackingOperUnitBuildlVer)
 
 	img_version = dict()
 	build_version = dict()
-	while (yield fut):
-		oid, value, fut = fut.result()
+	for oid, value in (yield img_rows):
 		index = oid[len(snStackingOperUnitImgVer)]
 		img_version[index] = value
 
 	__check_versions('image', img_version)
 
-	fut = plugins.snmpwalk(controller, snStackingOperUnitBuildlVer)
-	while (yield fut):
-		oid, value, fut = fut.result()
+	for oid, value in (yield build_rows):
 		index = oid[len(snStackingOperUnitBuildlVer)]
 		build_version[index] = value
 
 	__check_versions('build', build_version)
 
 
-snStackingGlobalConfigSt = brcdIp + (1, 1, 3, 31, 1, 1, 0)
 snStackingConfigUnitPriority = brcdIp + (1, 1, 3, 31, 2, 1, 1, 2)
-all_oids.update((snStackingGlobalConfigSt, snStackingConfigUnitPriority))
+all_oids.add(snStackingConfigUnitPriority)
 
+# The nested plugins are only started from here, so selecting them by name
+# must start this plugin as well.
+@plugins.tags("stack", "brocade_stacking_topology_plugin", "brocade_stacking_version_plugin",
+				"brocade_stacking_unit_state")
 @future.coroutine
 def brocade_stack_plugin(controller, collector):
-	try:
-		stackcfg = (yield controller.engine.get(snStackingGlobalConfigSt))
-	except (engine.NoSuchObjectError, engine.EndOfMibError):
+	stacking = (yield controller.facts.get(stacking_enabled))
+	if stacking is None:
 		alert = report.Alert(report.OK, "stacking not available")
 	else:
-		if stackcfg != 1:  # enabled
+		if not stacking:
 			alert = report.Alert(report.OK, "stacking not enabled")
 		else:
 			# start stack-specific plugins
@@ -411,11 +457,7 @@ def brocade_stack_plugin(controller, collector):
 			controller.start_plugin(collector, brocade_stacking_version_plugin)
 			controller.start_plugin(collector, brocade_stacking_unit_state)
 
-			fut = plugins.snmpwalk(controller, snStackingConfigUnitPriority)
-			count = 0
-			while (yield fut):
-				_, _, fut = fut.result()
-				count += 1
+			count = len((yield plugins.walk_all(controller, snStackingConfigUnitPriority)))
 			if count == 0:
 				alert = report.Alert(report.CRITICAL, "stacking switch without units")
 			elif count == 1:
@@ -430,6 +472,7 @@ snSWACLPerPortPerVlanMode = brcdIp + (1, 1, 3, 1, 46, 0)
 fdryDhcpSnoopVlanDhcpSnoopEnable = brcdIp + (1, 1, 3, 36, 2, 1, 1, 2)
 all_oids.update((snSWACLPerPortPerVlanMode, fdryDhcpSnoopVlanDhcpSnoopEnable))
 
+@plugins.tags("dhcp")
 @future.coroutine
 def brocade_dhcp_snooping_plugin(controller, collector):
 	try:
@@ -444,7 +487,7 @@ def brocade_dhcp_snooping_plugin(controller, collector):
 		pass
 
 	try:
-		uservlan = get_third_octet(controller)
+		uservlan = (yield controller.facts.get(management_vlan))
 		dhcpSnoopingEnable = (yield controller.engine.get(fdryDhcpSnoopVlanDhcpSnoopEnable + (uservlan, )))
 		if dhcpSnoopingEnable == 1:
 			alert = report.Alert(report.OK, "DHCP snooping enabled on user vlan %d" % uservlan)
@@ -471,9 +514,10 @@ def brocade_detect(controller, collector):
 	controller.start_plugin(collector, brocade_uptime_plugin)
 	controller.start_plugin(collector, brocade_version_plugin)
 
-	userports = yield has_userports(controller)
-	if userports:
-		controller.start_plugin(collector, brocade_dhcp_snooping_plugin)
-	oid = (yield controller.engine.get(plugins.sysObjectID))
+	if controller.selected(brocade_dhcp_snooping_plugin):
+		userports = yield has_userports(controller)
+		if userports:
+			controller.start_plugin(collector, brocade_dhcp_snooping_plugin)
+	oid = (yield controller.facts.get(plugins.sys_object_id))
 	if not plugins.oid_startswith(oid, snBigIronRXFamily):
 		controller.start_plugin(collector, brocade_temperature_plugin)
@@ -25,12 +25,15 @@ ciscoEnvMonFanState = cisco + (9, 13, 1, 4, 1, 3)
 all_oids.update((ciscoEnvMonFanStatusDescr, ciscoEnvMonFanState))
 
 
+@plugins.tags("fan", "environment")
 @future.coroutine
 def cisco_fan_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, ciscoEnvMonFanState)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		name = (yield controller.engine.get(ciscoEnvMonFanStatusDescr + (oid[-1],)))
+	rows = (yield plugins.table(controller, (ciscoEnvMonFanState, ciscoEnvMonFanStatusDescr)))
+	for index, (value, name) in rows:
+		if value is None:
+			continue
+		if name is None:
+			name = index[-1]
 		state, reason = cisco_state(value)
 		collector.add_alert(report.Alert(state, "fan_%s is %s" % (name, reason)))
 
@@ -39,12 +42,15 @@ ciscoEnvMonSupplyStatusDescr = cisco + (9, 13, 1, 5, 1, 2)
 ciscoEnvMonSupplyState = cisco + (9, 13, 1, 5, 1, 3)
 all_oids.update((ciscoEnvMonSupplyStatusDescr, ciscoEnvMonSupplyState))
 
+@plugins.tags("psu", "environment")
 @future.coroutine
 def cisco_psu_table_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, ciscoEnvMonSupplyState)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		name = (yield controller.engine.get(ciscoEnvMonSupplyStatusDescr + (oid[-1],)))
+	rows = (yield plugins.table(controller, (ciscoEnvMonSupplyState, ciscoEnvMonSupplyStatusDescr)))
+	for index, (value, name) in rows:
+		if value is None:
+			continue
+		if name is None:
+			name = index[-1]
 		state, reason = cisco_state(value)
 		collector.add_alert(report.Alert(state, "psu_%s is %s" % (name, reason)))
 
@@ -54,26 +60,28 @@ ciscoMemoryPoolUsed = cisco + (9, 48, 1, 1, 1, 5)
 ciscoMemoryPoolFree = cisco + (9, 48, 1, 1, 1, 6)
 all_oids.update((ciscoMemoryPoolName, ciscoMemoryPoolUsed, ciscoMemoryPoolFree))
 
+@plugins.tags("memory")
 @future.coroutine
 def cisco_mem_usage_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, ciscoMemoryPoolName)
-	while (yield fut):
-		oid, name, fut = fut.result()
-		used = controller.engine.get(ciscoMemoryPoolUsed + (oid[-1],))
-		free = controller.engine.get(ciscoMemoryPoolFree + (oid[-1],))
-		used = plugins.as_decimal((yield used))
-		total = used + plugins.as_decimal((yield free))
+	rows = (yield plugins.table(controller, (ciscoMemoryPoolName, ciscoMemoryPoolUsed, ciscoMemoryPoolFree)))
+	for _, (name, used, free) in rows:
+		if name is None or used is None or free is None:
+			continue  # incomplete row
+		used = plugins.as_decimal(used)
+		total = used + plugins.as_decimal(free)
 		collector.add_metric(report.PerfMetric("mem_%s" % name, used, uom="B", minval=0, maxval=total))
 
 
 ciscoCpmCPUTotal5minRev = cisco + (9, 109, 1, 1, 1, 1, 8)
 all_oids.add(ciscoCpmCPUTotal5minRev)
+@plugins.tags("cpu")
 @future.coroutine
 def cisco_cpu_usage_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, ciscoCpmCPUTotal5minRev)
-	while (yield fut):
-		oid, usage, fut = fut.result()
-		collector.add_metric(report.PerfMetric("cpu_%d" % oid[-1], usage, uom="%", minval=0, maxval=100))
+	fut = plugins.walk(controller, ciscoCpmCPUTotal5minRev)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, usage in rows:
+			collector.add_metric(report.PerfMetric("cpu_%d" % oid[-1], usage, uom="%", minval=0, maxval=100))
 
 @future.coroutine
 def cisco_detect(controller, collector):
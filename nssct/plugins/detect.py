@@ -1,30 +1,44 @@
 # -*- encoding: utf-8 -*-
 
+import sys
+
 from .. import future
 from .. import plugins
 from .. import report
-from . import brocade
-from . import cisco
-from . import hp
+from . import registry as vendor_registry
+
+def allied_telesis_detect(_, collector):
+	collector.add_alert(report.Alert(report.OK, "Allied Telesis does not report health"))
+	return future.completed()
+
+registry = vendor_registry.VendorRegistry()
+registry.register("brocade", (1, 3, 6, 1, 4, 1, 1991), "nssct.plugins.brocade:brocade_detect")
+registry.register("cisco", (1, 3, 6, 1, 4, 1, 9), "nssct.plugins.cisco:cisco_detect")
+registry.register("hp", (1, 3, 6, 1, 4, 1, 11), "nssct.plugins.hp:hp_detect")
+registry.register("allied_telesis", (1, 3, 6, 1, 4, 1, 207), lambda: allied_telesis_detect)
 
-all_oids = set()
-all_oids.update(plugins.all_oids)
-all_oids.update(brocade.all_oids)
-all_oids.update(cisco.all_oids)
-all_oids.update(hp.all_oids)
+def collect_oids():
+	"""Import all vendor modules and collect the oids they query.
+	@rtype: set
+	"""
+	oids = set(plugins.all_oids)
+	for vendor in registry.vendors():
+		module = sys.modules[vendor.load().__module__]
+		oids.update(getattr(module, "all_oids", ()))
+	return oids
 
-allied_telesis = (1, 3, 6, 1, 4, 1, 207)
+@future.coroutine
+def vendor(controller):
+	"""Fact: the name of the vendor of the device or None if unknown."""
+	oid = (yield controller.facts.get(plugins.sys_object_id))
+	found = registry.lookup(oid)
+	future.return_(None if found is None else found.name)
 
 @future.coroutine
 def detect(controller, collector):
-	oid = (yield controller.engine.get(plugins.sysObjectID))
-	if plugins.oid_startswith(oid, brocade.brcdIp):
-		yield brocade.brocade_detect(controller, collector)
-	elif plugins.oid_startswith(oid, cisco.cisco):
-		yield cisco.cisco_detect(controller, collector)
-	elif plugins.oid_startswith(oid, hp.hpmib):
-		yield hp.hp_detect(controller, collector)
-	elif plugins.oid_startswith(oid, allied_telesis):
-		collector.add_alert(report.Alert(report.OK, "Allied Telesis does not report health"))
-	else:
+	oid = (yield controller.facts.get(plugins.sys_object_id))
+	found = registry.lookup(oid)
+	if found is None:
 		collector.add_alert(report.Alert(report.UNKNOWN, "unknown device identified by %r" % oid))
+	else:
+		yield found.load()(controller, collector)
@@ -26,23 +26,25 @@ def hp_state(numeric):
 hpicfSensorEntry = hpmib + (2, 14, 11, 1, 2, 6, 1)
 all_oids.add(hpicfSensorEntry)
 
+@plugins.tags("fan", "psu", "temperature", "environment")
 @future.coroutine
 def hp_sensors_plugin(controller, collector):
 	device_num = device_type = None
-	fut = plugins.snmpwalk(controller, hpicfSensorEntry)
-	while (yield fut):
-		oid, value, fut = fut.result()
-		tail = oid[len(hpicfSensorEntry):]
-		if tail[0] == 1:  # hpicfSensorIndex
-			device_num = value
-		elif tail[0] == 2:  # hpicfSensorObjectId
-			if plugins.oid_startswith(value, icfSensors):
-				device_type = icfSensorType.get(value[len(icfSensors)])
-		elif tail[0] == 4:  # hpicfSensorStatus
-			if device_num is not None and device_type is not None:
-				state, message = hp_state(value)
-				collector.add_alert(report.Alert(state, "%s_%d is %s" % (device_type, device_num, message)))
-			device_num = device_type = None
+	fut = plugins.walk(controller, hpicfSensorEntry)
+	while fut:
+		rows, fut = (yield fut)
+		for oid, value in rows:
+			tail = oid[len(hpicfSensorEntry):]
+			if tail[0] == 1:  # hpicfSensorIndex
+				device_num = value
+			elif tail[0] == 2:  # hpicfSensorObjectId
+				if plugins.oid_startswith(value, icfSensors):
+					device_type = icfSensorType.get(value[len(icfSensors)])
+			elif tail[0] == 4:  # hpicfSensorStatus
+				if device_num is not None and device_type is not None:
+					state, message = hp_state(value)
+					collector.add_alert(report.Alert(state, "%s_%d is %s" % (device_type, device_num, message)))
+				device_num = device_type = None
 
 
 hpGlobalMemTotalBytes = hpmib + (2, 14, 11, 5, 1, 1, 2, 2, 1, 1, 5)
@@ -50,14 +52,16 @@ hpGlobalMemAllocBytes = hpmib + (2, 14, 11, 5, 1, 1, 2, 2, 1, 1, 7)
 all_oids.update((hpGlobalMemTotalBytes, hpGlobalMemAllocBytes))
 
 
+@plugins.tags("memory")
 @future.coroutine
 def hp_mem_usage_plugin(controller, collector):
-	fut = plugins.snmpwalk(controller, hpGlobalMemAllocBytes)
-	while (yield fut):
-		oid, value, fut = fut.result()
+	rows = (yield plugins.table(controller, (hpGlobalMemAllocBytes, hpGlobalMemTotalBytes)))
+	for index, (value, total) in rows:
+		if value is None or total is None:
+			continue  # incomplete row
 		value = plugins.as_decimal(value)
-		total = plugins.as_decimal((yield controller.engine.get(hpGlobalMemTotalBytes + (oid[-1],))))
-		collector.add_metric(report.PerfMetric("mem_%d" % oid[-1], value, uom="B", minval=0, maxval=total))
+		total = plugins.as_decimal(total)
+		collector.add_metric(report.PerfMetric("mem_%d" % index[-1], value, uom="B", minval=0, maxval=total))
 
 @future.coroutine
 def hp_detect(controller, collector):
@@ -0,0 +1,183 @@
+# -*- encoding: utf-8 -*-
+
+"""A registry mapping sysObjectID prefixes to vendor detection plugins. The
+plugins are given as import paths and only imported when a device of the
+vendor is detected, so supporting many vendors does not slow down startup.
+Prefixes are kept in a trie, so matching a sysObjectID takes time
+proportional to its length regardless of the number of vendors.
+
+Further vendors can be provided by other distributions using the entry point
+group nssct.vendors. The name of an entry point is the sysObjectID prefix in
+dotted notation and it refers to the detection plugin::
+
+	entry_points={"nssct.vendors": ["1.3.6.1.4.1.2636 = nssct_juniper:detect"]}
+
+Importing the machinery for entry points takes about as long as the rest of
+the startup of nssct, so entry points are only consulted for devices not
+matching any registered vendor. Thus they can add vendors, but cannot refine
+the prefixes of registered ones.
+"""
+
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "nssct.vendors"
+
+
+def parse_prefix(text):
+	"""
+	@type text: str
+	@rtype: (int,)
+
+	>>> parse_prefix("1.3.6.1.4.1.9")
+	(1, 3, 6, 1, 4, 1, 9)
+	>>> parse_prefix(".1.3.6")
+	(1, 3, 6)
+	"""
+	return tuple(int(part) for part in text.strip(".").split("."))
+
+
+def import_target(target):
+	"""Import an object given as "module:attribute".
+	@type target: str
+	"""
+	module, attribute = target.split(":")
+	return getattr(importlib.import_module(module), attribute)
+
+
+def _entry_points(group):
+	"""List the entry points of the given group without loading them."""
+	try:
+		from importlib import metadata
+	except ImportError:
+		try:
+			import pkg_resources
+		except ImportError:
+			return []
+		return list(pkg_resources.iter_entry_points(group))
+	entry_points = metadata.entry_points()
+	if hasattr(entry_points, "select"):
+		return list(entry_points.select(group=group))
+	return list(entry_points.get(group, ()))
+
+
+class Vendor(object):
+	"""A registered vendor.
+	@type name: str
+	@ivar name: is a short identifier of the vendor
+	@type prefix: (int,)
+	@ivar prefix: is the prefix of the sysObjectID of the devices
+	"""
+	def __init__(self, name, prefix, loader):
+		"""
+		@param loader: a function without parameters returning the detection
+				plugin
+		"""
+		self.name = name
+		self.prefix = prefix
+		self.loader = loader
+		self.plugin = None
+
+	def load(self):
+		"""Import the detection plugin on first use.
+		@returns: a plugin function
+		"""
+		if self.plugin is None:
+			logger.debug("loading detection plugin of %s", self.name)
+			self.plugin = self.loader()
+		return self.plugin
+
+	def __repr__(self):
+		return "Vendor(%r, %r)" % (self.name, self.prefix)
+
+
+def _insert(trie, vendor):
+	node = trie
+	for subid in vendor.prefix:
+		node = node.setdefault(subid, {})
+	node[None] = vendor
+
+
+def _match(trie, oid):
+	"""Find the vendor with the longest prefix of oid in trie."""
+	node = trie
+	found = node.get(None)
+	for subid in oid:
+		try:
+			node = node[subid]
+		except KeyError:
+			break
+		found = node.get(None, found)
+	return found
+
+
+def _iterate(trie):
+	pending = [trie]
+	while pending:
+		node = pending.pop()
+		if None in node:
+			yield node[None]
+		pending.extend(child for key, child in node.items() if key is not None)
+
+
+class VendorRegistry(object):
+	"""Maps sysObjectID prefixes to vendors."""
+	def __init__(self, entry_point_group=ENTRY_POINT_GROUP):
+		"""
+		@type entry_point_group: str or None
+		@param entry_point_group: is the entry point group to load further
+				vendors from or None to not use entry points
+		"""
+		self.trie = {}
+		self.entry_point_group = entry_point_group
+		self.entry_point_trie = None
+
+	def register(self, name, prefix, target):
+		"""Register a vendor. A later registration of the same prefix
+		replaces the earlier one.
+		@type name: str
+		@type prefix: (int,)
+		@param target: the detection plugin as "module:attribute" or a
+				function without parameters returning it
+		"""
+		loader = target
+		if not callable(target):
+			loader = lambda: import_target(target)
+		_insert(self.trie, Vendor(name, tuple(prefix), loader))
+
+	def _entry_point_trie(self):
+		"""Scan the entry points on first use."""
+		if self.entry_point_trie is None:
+			self.entry_point_trie = {}
+			if self.entry_point_group is not None:
+				for entry_point in _entry_points(self.entry_point_group):
+					try:
+						prefix = parse_prefix(entry_point.name)
+					except ValueError:
+						logger.warning("ignoring entry point %r with invalid prefix", entry_point)
+						continue
+					_insert(self.entry_point_trie, Vendor(entry_point.name, prefix, entry_point.load))
+		return self.entry_point_trie
+
+	def lookup(self, oid):
+		"""Find the vendor with the longest prefix of oid.
+		@type oid: (int,)
+		@rtype: Vendor or None
+		"""
+		found = _match(self.trie, oid)
+		if found is None:
+			found = _match(self._entry_point_trie(), oid)
+		return found
+
+	def vendors(self):
+		"""
+		@rtype: [Vendor]
+		@returns: all vendors including those from entry points ordered by
+				prefix
+		"""
+		found = list(_iterate(self.trie))
+		found.extend(_iterate(self._entry_point_trie()))
+		found.sort(key=lambda vendor: vendor.prefix)
+		return found
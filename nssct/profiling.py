@@ -0,0 +1,276 @@
+# -*- encoding: utf-8 -*-
+
+"""Find out where a check spends its time. A PhaseTimer is always active in
+nssct.main and splits the wall clock time of a check into phases: starting
+the interpreter and importing modules, parsing arguments, setting up the
+backend, running the detection plugins, running the other plugins, running
+engine steps and waiting for SNMP responses. Its breakdown is logged at
+DEBUG level and can be added to the performance data of the check. For a closer look,
+--profile writes cProfile statistics and optionally logs the lines
+allocating the most memory as recorded by tracemalloc.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import time
+
+from . import backend
+from . import engine
+from . import report
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseTimer(object):
+	"""Accumulates the wall clock time spent in named phases. Phases may
+	nest. The time of a phase excludes the time of the phases nested in it,
+	so the durations add up to the total time measured.
+
+	@type durations: collections.OrderedDict
+	@ivar durations: maps phase names to seconds in the order the phases
+			were first entered
+	"""
+	def __init__(self, clock=time.time):
+		self.clock = clock
+		self.durations = collections.OrderedDict()
+		self.stack = []
+
+	def enter(self, name):
+		"""Start attributing time to the named phase until the matching
+		leave."""
+		self.durations.setdefault(name, 0.0)
+		self.stack.append([name, self.clock(), 0.0])  # name, start and time of nested phases
+
+	def leave(self):
+		name, start, nested = self.stack.pop()
+		elapsed = self.clock() - start
+		self.durations[name] += elapsed - nested
+		if self.stack:
+			self.stack[-1][2] += elapsed
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""A context manager attributing the time spent in it to the named
+		phase.
+
+		>>> now = [0.0]
+		>>> timer = PhaseTimer(lambda: now[0])
+		>>> with timer.phase("poll"):
+		...     now[0] += 1.0
+		...     with timer.phase("snmp"):
+		...         now[0] += 3.0
+		>>> list(timer.durations.items())
+		[('poll', 1.0), ('snmp', 3.0)]
+		"""
+		self.enter(name)
+		try:
+			yield
+		finally:
+			self.leave()
+
+	def add(self, name, seconds):
+		"""Attribute time measured elsewhere to the named phase."""
+		self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+	def total(self):
+		"""
+		@rtype: float
+		"""
+		return sum(self.durations.values())
+
+	def breakdown(self):
+		"""
+		@rtype: str
+
+		>>> timer = PhaseTimer()
+		>>> timer.durations.update([("parse", 0.002), ("snmp", 0.5)])
+		>>> timer.breakdown()
+		'parse=2.0ms snmp=500.0ms total=502.0ms'
+		"""
+		return " ".join("%s=%.1fms" % (name, 1000 * seconds)
+						for name, seconds in list(self.durations.items()) + [("total", self.total())])
+
+	def metrics(self):
+		"""
+		@rtype: [PerfMetric]
+		@returns: one metric per phase in milliseconds
+		"""
+		return [report.PerfMetric("phase_%s" % name, round(1000 * seconds, 3), "ms", minval=0)
+				for name, seconds in self.durations.items()]
+
+
+class TimedBackend(backend.BackendBase):
+	"""Attributes the time spent in another backend, i.e. waiting for
+	responses of the agent, to a phase of a PhaseTimer."""
+	def __init__(self, back, timer, name="snmp"):
+		"""
+		@type back: BackendBase
+		@type timer: PhaseTimer
+		@type name: str
+		"""
+		backend.BackendBase.__init__(self)
+		self.backend = back
+		self.timer = timer
+		self.name = name
+		self.address = getattr(back, "address", None)
+
+	def get(self, oid):
+		with self.timer.phase(self.name):
+			return self.backend.get(oid)
+
+	def getnext(self, oid):
+		with self.timer.phase(self.name):
+			return self.backend.getnext(oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		with self.timer.phase(self.name):
+			return self.backend.getbulk(oids, nonrep, maxrep)
+
+	def __repr__(self):
+		return repr(self.backend)
+
+
+class TimedEngine(engine.AbstractEngine):
+	"""Attributes the time spent in the steps of another engine to a phase
+	of a PhaseTimer. Steps complete futures and thereby resume plugins, so
+	TaskPhases should separate the time of plugins."""
+	def __init__(self, eng, timer, name="engine"):
+		"""
+		@type eng: AbstractEngine
+		@type timer: PhaseTimer
+		@type name: str
+		"""
+		engine.AbstractEngine.__init__(self)
+		self.engine = eng
+		self.batching = eng.batching
+		self.timer = timer
+		self.name = name
+
+	def get(self, oid):
+		return self.engine.get(oid)
+
+	def getnext(self, oid):
+		return self.engine.getnext(oid)
+
+	def walk(self, baseoid, startoid=None):
+		return self.engine.walk(baseoid, startoid)
+
+	def step(self):
+		with self.timer.phase(self.name):
+			return self.engine.step()
+
+
+class TaskPhases(object):
+	"""A task profiler of the future module attributing the time spent
+	running plugins to phases of a PhaseTimer. Untagged plugins detect the
+	device, so their time goes to the detect phase. The time of tagged
+	plugins goes to the plugins phase. Calls are forwarded to another task
+	profiler, if given."""
+	def __init__(self, timer, profiler=None):
+		"""
+		@type timer: PhaseTimer
+		@param profiler: an object with enter and leave methods or None
+		"""
+		self.timer = timer
+		self.profiler = profiler
+
+	def enter(self, task):
+		self.timer.enter("detect" if getattr(task, "tags", None) is None else "plugins")
+		if self.profiler is not None:
+			self.profiler.enter(task)
+
+	def leave(self, task):
+		if self.profiler is not None:
+			self.profiler.leave(task)
+		self.timer.leave()
+
+
+def process_start(clock=time.time):
+	"""
+	@rtype: float or None
+	@returns: the time the current process was started with a resolution of
+			about 10ms or None if unknown, i.e. not on Linux
+	"""
+	try:
+		with open("/proc/self/stat") as statfile:
+			ticks = float(statfile.read().rsplit(")", 1)[1].split()[19])  # starttime
+		with open("/proc/uptime") as uptimefile:
+			uptime = float(uptimefile.read().split()[0])
+		hertz = os.sysconf("SC_CLK_TCK")
+	except (IOError, OSError, IndexError, ValueError, AttributeError):
+		return None
+	return clock() - (uptime - ticks / hertz)
+
+
+class Profile(object):
+	"""Runs cProfile and tracemalloc between start and stop.
+
+	@type filename: str or None
+	@ivar filename: receives the cProfile statistics for pstats
+	@type memory_top: int
+	@ivar memory_top: is the number of lines allocating most memory to log
+	"""
+	def __init__(self, filename=None, memory_top=0):
+		self.filename = filename
+		self.memory_top = memory_top
+		self.profiler = None
+		self.tracing = False
+
+	def start(self):
+		if self.filename is not None:
+			import cProfile  # only needed when profiling
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		if self.memory_top > 0:
+			try:
+				import tracemalloc
+			except ImportError:
+				logger.warning("tracemalloc is not available, not tracing memory allocations")
+			else:
+				tracemalloc.start()
+				self.tracing = True
+
+	def stop(self):
+		"""Write the cProfile statistics and log the top memory allocations."""
+		if self.profiler is not None:
+			self.profiler.disable()
+			try:
+				self.profiler.dump_stats(self.filename)
+			except (IOError, OSError) as err:
+				logger.error("failed to write profile to %s: %s", self.filename, err)
+			else:
+				logger.info("wrote profile to %s", self.filename)
+			self.profiler = None
+		if self.tracing:
+			import tracemalloc
+			snapshot = tracemalloc.take_snapshot().filter_traces([
+				tracemalloc.Filter(False, tracemalloc.__file__),
+				tracemalloc.Filter(False, "*/cProfile.py"),
+			])
+			current, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			self.tracing = False
+			logger.info("traced memory: current %.1fKB, peak %.1fKB", current / 1024.0, peak / 1024.0)
+			for stat in snapshot.statistics("lineno")[:self.memory_top]:
+				logger.info("allocated %s", stat)
+
+
+def add_profile_options(parser):
+	group = parser.add_argument_group("profiling", "find out where a check spends its time")
+	group.add_argument("--profile", metavar="FILE", default=None,
+						help="write cProfile statistics of the check to FILE (see the pstats module)")
+	group.add_argument("--profile-memory", type=int, default=0, metavar="N",
+						help="log the N source lines allocating the most memory during the check")
+	group.add_argument("--phase-perfdata", action="store_true",
+						help="add the time spent in every phase of the check to the performance data")
+
+def setup_profile(namespace):
+	"""
+	@rtype: Profile or None
+	@returns: a Profile if requested by the parsed arguments
+	"""
+	if namespace.profile is None and namespace.profile_memory <= 0:
+		return None
+	return Profile(namespace.profile, namespace.profile_memory)
@@ -248,6 +248,13 @@ class Collector(object):
 		self.metrics.append(metric)
 		self.add_alert(metric.alert())
 
+	def for_plugin(self, plugin):
+		"""Return the collector the given plugin should report to. A plain
+		Collector receives everything.
+		@rtype: Collector
+		"""
+		return self
+
 	def state(self):
 		for st in (CRITICAL, WARNING, OK, UNKNOWN):
 			if st in self.alerts:
@@ -262,7 +269,13 @@ class Collector(object):
 			return Alert(st, "%d subchecks" % (len(self.alerts[st])))
 		return self.alerts[st][0]
 
-	def __str__(self):
+	def output(self, perfdata=True):
+		"""
+		@type perfdata: bool
+		@param perfdata: whether to include the performance data
+		@rtype: str
+		@returns: the output of the check as expected by nagios
+		"""
 		main = self.summary()
 		parts = [main]
 		for st in (CRITICAL, WARNING, OK, UNKNOWN):
@@ -271,6 +284,9 @@ class Collector(object):
 					continue
 				parts.append(alert)
 		result = "\n".join(map(str, parts))
-		if not self.metrics:
+		if not perfdata or not self.metrics:
 			return result
 		return "%s | %s" % (result, " ".join(map(str, self.metrics)))
+
+	def __str__(self):
+		return self.output()
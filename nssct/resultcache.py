@@ -0,0 +1,205 @@
+# -*- encoding: utf-8 -*-
+
+"""Reuse the result of a recent check of the same agent instead of polling it
+again. Nagios retries, manual rechecks and several services polling the same
+device tend to run identical checks within seconds of each other.
+
+Results are stored in a shared directory with one file per agent and plugin
+selection. A process holds an exclusive lock on the file while looking up and
+possibly polling, so identical checks started concurrently wait for the one
+polling and then use its result instead of polling as well. As with the
+governor, the kernel drops the locks of dying processes.
+
+Results in state UNKNOWN are never stored, because they usually indicate a
+transient problem that a retry is meant to resolve.
+"""
+
+import decimal
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+
+from . import report
+
+logger = logging.getLogger(__name__)
+
+
+class StoredResult(report.Collector):
+	"""The result of an earlier check rebuilt from its alerts and metrics.
+
+	@type stamp: float
+	@ivar stamp: is the time the result was stored at
+	"""
+	def __init__(self, stamp):
+		report.Collector.__init__(self)
+		self.stamp = stamp
+
+	@classmethod
+	def fromdict(cls, stored):
+		"""
+		@type stored: dict
+		@param stored: as returned from todict
+		@rtype: StoredResult
+		@raises KeyError, TypeError, ValueError: if stored is malformed
+		"""
+		result = cls(stored["time"])
+		for state, message in stored["alerts"]:
+			if state not in (report.OK, report.WARNING, report.CRITICAL, report.UNKNOWN):
+				raise ValueError("invalid state %r" % (state,))
+			result.add_alert(report.Alert(state, message))
+		for label, value, uom, warn, crit, minval, maxval in stored["metrics"]:
+			# metric alerts are part of the stored alerts
+			result.metrics.append(report.PerfMetric(label, decode_number(value), uom,
+													decode_range(warn), decode_range(crit),
+													decode_number(minval), decode_number(maxval)))
+		return result
+
+
+def encode_number(value):
+	"""JSON lacks decimals and the numbers of SNMP libraries, so they are
+	stored as strings.
+
+	>>> encode_number(decimal.Decimal("0.10")), encode_number(5), encode_number(None)
+	('0.10', 5, None)
+	"""
+	if value is None or type(value) in (int, float):
+		return value
+	return str(value)
+
+def decode_number(value):
+	"""
+	>>> decode_number("0.10"), decode_number(5)
+	(Decimal('0.10'), 5)
+	"""
+	if isinstance(value, (str, type(u""))):
+		return decimal.Decimal(value)
+	return value
+
+
+def encode_range(perfrange):
+	"""
+	@type perfrange: PerfRange
+	@rtype: str or None
+	"""
+	return str(perfrange) or None
+
+def decode_range(value):
+	"""
+	>>> decode_range("@10"), decode_range(None)
+	(PerfRange(Decimal('10'), Decimal('0'), True), None)
+	"""
+	return None if value is None else report.PerfRange.fromstr(str(value))
+
+
+def todict(result, stamp):
+	"""
+	@type result: Collector
+	@type stamp: float
+	@rtype: dict
+	@returns: a JSON serializable representation of the result
+	"""
+	alerts = [(alert.state, alert.message)
+			for state in sorted(result.alerts) for alert in result.alerts[state]]
+	metrics = [(metric.label, encode_number(metric.value), metric.uom, encode_range(metric.warn),
+				encode_range(metric.crit), encode_number(metric.minval), encode_number(metric.maxval))
+			for metric in result.metrics]
+	return dict(time=stamp, alerts=alerts, metrics=metrics)
+
+
+def result_key(args):
+	"""Checks with equal keys produce the same result when run at the same
+	time.
+	@type args: argparse.Namespace
+	@rtype: str
+	"""
+	specs = sorted(set(spec for value in args.select for spec in value.split(",") if spec))
+	identity = json.dumps([args.mock, args.agent, args.community, specs])
+	return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+	"""Stores check results in a directory.
+
+	@type directory: str
+	@ivar directory: is the shared directory containing the result files
+	@type max_age: float
+	@ivar max_age: is the number of seconds a result remains fresh
+	"""
+	def __init__(self, directory, max_age=60.0, clock=time.time):
+		assert max_age > 0
+		self.directory = directory
+		self.max_age = max_age
+		self.clock = clock
+		try:
+			os.makedirs(directory)
+		except OSError as err:
+			if err.errno != errno.EEXIST:
+				raise
+
+	def _load(self, fd):
+		"""Read the result stored in the locked file fd.
+		@rtype: StoredResult or None
+		@returns: the result unless there is none or it is stale
+		"""
+		content = b""
+		while True:
+			chunk = os.read(fd, 65536)
+			if not chunk:
+				break
+			content += chunk
+		try:
+			result = StoredResult.fromdict(json.loads(content.decode("utf-8")))
+		except (ValueError, KeyError, TypeError, decimal.InvalidOperation):  # new or corrupted file
+			return None
+		age = self.clock() - result.stamp
+		if not 0 <= age <= self.max_age:
+			return None
+		logger.debug("using result stored %.1fs ago", age)
+		return result
+
+	def _store(self, fd, result):
+		content = json.dumps(todict(result, self.clock()))
+		content = content.encode("utf-8")
+		os.lseek(fd, 0, os.SEEK_SET)
+		os.write(fd, content)
+		os.ftruncate(fd, len(content))
+
+	def lookup(self, key, poll):
+		"""Return the stored result for key if it is fresh. Otherwise call
+		poll and store its result.
+		@type key: str
+		@param poll: a function without parameters returning a Collector
+		@returns: a Collector or StoredResult
+		"""
+		fd = os.open(os.path.join(self.directory, "result-%s" % key), os.O_RDWR | os.O_CREAT, 0o644)
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX)  # wait for a concurrent poll
+			result = self._load(fd)
+			if result is None:
+				result = poll()
+				if result.state() != report.UNKNOWN:
+					self._store(fd, result)
+			return result
+		finally:
+			os.close(fd)  # also releases the lock
+
+
+def add_resultcache_options(parser):
+	group = parser.add_argument_group("result cache", "reuse recent results of identical checks")
+	group.add_argument("--result-cache", metavar="DIR", default=None,
+						help="store results in DIR and reuse those of identical checks")
+	group.add_argument("--max-age", type=float, default=60.0, metavar="SECONDS",
+						help="number of seconds a stored result is reused (default: %(default)s)")
+
+def setup_resultcache(namespace):
+	"""
+	@rtype: ResultCache or None
+	@returns: a ResultCache if requested by the parsed arguments
+	"""
+	if namespace.result_cache is None:
+		return None
+	return ResultCache(namespace.result_cache, namespace.max_age)
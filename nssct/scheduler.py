@@ -0,0 +1,216 @@
+# -*- encoding: utf-8 -*-
+
+"""Run checks periodically from within the daemon instead of having Nagios
+schedule them. The results are expected to be submitted as passive check
+results (see the passive module).
+
+A schedule file contains one job per line. A line consists of the interval in
+seconds followed by the arguments of the nssct command. Empty lines and lines
+starting with # are ignored::
+
+	300 --agent 192.0.2.1 --bulk 7 --cache --host sw1 --service CPU=cpu --command-file /var/lib/nagios3/rw/nagios.cmd
+
+Every job gets a random phase within its interval, so jobs with equal
+intervals are spread out instead of all starting at once. On top of that,
+each run is delayed by a random fraction of the interval limited by the
+jitter parameter. At most the given number of checks run at the same time.
+A job never runs concurrently with itself. When a run takes longer than the
+interval, the slots missed are skipped rather than run back to back, so an
+overloaded agent or daemon receives less load instead of more.
+"""
+
+import heapq
+import logging
+import random
+import shlex
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Job(object):
+	"""A check to be run periodically.
+	@type interval: float
+	@type argv: [str]
+	@ivar runs: number of completed runs
+	@ivar overruns: number of runs taking longer than the interval
+	@ivar skipped: number of slots skipped due to overruns or lack of
+			capacity
+	"""
+	def __init__(self, interval, argv):
+		assert interval > 0
+		self.interval = float(interval)
+		self.argv = argv
+		self.runs = 0
+		self.overruns = 0
+		self.skipped = 0
+
+	def __repr__(self):
+		return "Job(%r, %r)" % (self.interval, self.argv)
+
+
+def parse_schedule(lines):
+	"""
+	@type lines: iterable of str
+	@rtype: [Job]
+	@raises ValueError: for malformed lines
+
+	>>> parse_schedule(["# comment", "", "60 --mock 'some file'"])
+	[Job(60.0, ['--mock', 'some file'])]
+	"""
+	jobs = []
+	for number, line in enumerate(lines, 1):
+		words = shlex.split(line, comments=True)
+		if not words:
+			continue
+		try:
+			interval = float(words[0])
+		except ValueError:
+			raise ValueError("line %d: expected an interval, got %r" % (number, words[0]))
+		if interval <= 0:
+			raise ValueError("line %d: the interval must be positive" % number)
+		jobs.append(Job(interval, words[1:]))
+	return jobs
+
+
+class Scheduler(object):
+	"""Runs jobs periodically in threads.
+
+	@type jobs: [Job]
+	@type execute: function
+	@ivar execute: is called with the argv of a job to run it. Exceptions
+			are logged.
+	@type concurrency: int
+	@ivar concurrency: is the maximum number of jobs running at once
+	@type jitter: float
+	@ivar jitter: is the maximum delay of a run as a fraction of the interval
+	@ivar observe_lag: is None or called with the number of seconds a run
+			started after its planned start
+	"""
+	def __init__(self, jobs, execute, concurrency=8, jitter=0.1, clock=time.time, observe_lag=None):
+		assert concurrency > 0
+		assert 0 <= jitter < 1
+		self.jobs = jobs
+		self.execute = execute
+		self.concurrency = concurrency
+		self.jitter = jitter
+		self.clock = clock
+		self.observe_lag = observe_lag
+		self.cond = threading.Condition()
+		self.running = 0
+		self.stopped = False
+		self.heap = []  # (start time, sequence number, slot, job)
+		self.sequence = 0
+
+	def _push(self, slot, job):
+		start = slot + random.uniform(0, self.jitter * job.interval)
+		self.sequence += 1
+		heapq.heappush(self.heap, (start, self.sequence, slot, job))
+
+	def _finished(self, job, slot):
+		"""Schedule the next run of job after a run for slot completed."""
+		now = self.clock()
+		job.runs += 1
+		nextslot = slot + job.interval
+		if nextslot < now:
+			# Skip the slots that began while running instead of running
+			# back to back.
+			missed = int((now - slot) // job.interval)
+			logger.warning("%r took %.1fs exceeding its interval, skipping %d runs",
+							job, now - slot, missed)
+			job.overruns += 1
+			job.skipped += missed
+			nextslot = slot + (missed + 1) * job.interval
+		self._push(nextslot, job)
+
+	def _run(self, job, slot):
+		try:
+			self.execute(job.argv)
+		except Exception:
+			logger.exception("running %r failed", job)
+		finally:
+			with self.cond:
+				self.running -= 1
+				self._finished(job, slot)
+				self.cond.notify()
+
+	def _dispatch(self):
+		"""Start the next job if it is due and capacity is available.
+		@rtype: float or None
+		@returns: the number of seconds to wait for or None to wait until
+				a running job finishes
+		"""
+		if self.running >= self.concurrency or not self.heap:
+			return None
+		start, _, slot, job = self.heap[0]
+		now = self.clock()
+		if start > now:
+			return start - now
+		heapq.heappop(self.heap)
+		if now - slot > job.interval:
+			# Waited for capacity for more than a whole interval.
+			missed = int((now - slot) // job.interval)
+			logger.warning("no capacity to run %r for %.1fs, skipping %d runs", job, now - slot, missed)
+			job.skipped += missed
+			self._push(slot + missed * job.interval, job)
+			return 0
+		if self.observe_lag is not None:
+			self.observe_lag(now - start)
+		self.running += 1
+		thread = threading.Thread(target=self._run, args=(job, slot))
+		thread.daemon = True
+		thread.start()
+		return 0
+
+	def run(self, until=None):
+		"""Run the jobs until stop is called or the clock reaches until.
+		Running jobs are not waited for.
+		@type until: float or None
+		"""
+		with self.cond:
+			now = self.clock()
+			for job in self.jobs:
+				self._push(now + random.uniform(0, job.interval), job)
+			while not self.stopped:
+				timeout = self._dispatch()
+				if timeout == 0:
+					continue
+				if until is not None:
+					remaining = until - self.clock()
+					if remaining <= 0:
+						break
+					timeout = remaining if timeout is None else min(timeout, remaining)
+				self.cond.wait(timeout)
+
+	def stop(self):
+		with self.cond:
+			self.stopped = True
+			self.cond.notify()
+
+
+def add_scheduler_options(parser):
+	group = parser.add_argument_group("scheduling", "run checks periodically")
+	group.add_argument("--schedule", metavar="FILE",
+						help="run the checks listed in FILE periodically")
+	group.add_argument("--concurrency", type=int, default=8, metavar="N",
+						help="maximum number of scheduled checks running at once (default: %(default)s)")
+	group.add_argument("--jitter", type=float, default=0.1, metavar="FRACTION",
+						help="delay every run by up to FRACTION of its interval (default: %(default)s)")
+
+def setup_scheduler(namespace, execute, observe_lag=None):
+	"""Start a thread running the scheduled checks if requested.
+	@param execute: a function running a check given its arguments
+	@param observe_lag: see Scheduler
+	@rtype: Scheduler or None
+	"""
+	if namespace.schedule is None:
+		return None
+	with open(namespace.schedule) as schedfile:
+		jobs = parse_schedule(schedfile)
+	scheduler = Scheduler(jobs, execute, namespace.concurrency, namespace.jitter, observe_lag=observe_lag)
+	thread = threading.Thread(target=scheduler.run)
+	thread.daemon = True
+	thread.start()
+	logger.info("scheduling %d checks", len(jobs))
+	return scheduler
@@ -0,0 +1,231 @@
+# -*- encoding: utf-8 -*-
+
+"""Record the timeline of a check and export it in the trace event format of
+Chrome, which trace viewers such as chrome://tracing or Perfetto display.
+
+The timeline shows a lane per started plugin spanning from its start to its
+completion, a lane of engine steps and a lane of the PDUs sent with the oids
+they carried. Every request of a plugin to the engine is an asynchronous
+event from its issue to its completion. Its arguments tell whether it was
+served by a PDU (and which) or without one, e.g. from a cache. Plugins
+waiting on each other and requests that were not combined into one PDU
+become visible this way.
+"""
+
+import itertools
+import json
+import logging
+import time
+
+from . import backend
+from . import engine
+from . import future
+
+logger = logging.getLogger(__name__)
+
+
+def format_oid(oid):
+	"""
+	>>> format_oid((1, 3, 6, 1))
+	'1.3.6.1'
+	"""
+	return ".".join(map(str, oid))
+
+
+def plugin_name(plugin):
+	"""
+	>>> import functools
+	>>> plugin_name(functools.partial(format_oid, (1,)))
+	'format_oid'
+	>>> plugin_name("cpu")
+	'cpu'
+	"""
+	if isinstance(plugin, str):
+		return plugin
+	while hasattr(plugin, "func"):  # functools.partial
+		plugin = plugin.func
+	return getattr(plugin, "__name__", repr(plugin))
+
+
+class Tracer(object):
+	"""Collects trace events of one check.
+
+	@type events: [dict]
+	@ivar events: trace events in the Chrome trace event format
+	@type pdus: int
+	@ivar pdus: is the number of PDUs sent so far
+	@type steps: int
+	@ivar steps: is the number of engine steps started so far
+	"""
+	PID = 1
+	TID_ENGINE = 1
+	TID_SNMP = 2
+	TID_PLUGINS = 10  # first lane of plugins
+
+	def __init__(self, clock=time.time):
+		self.clock = clock
+		self.start = clock()
+		self.events = []
+		self.pdus = 0
+		self.steps = 0
+		self.lanes = itertools.count(self.TID_PLUGINS)
+		self.requests = itertools.count(1)
+		self._name_lane(self.TID_ENGINE, "engine steps")
+		self._name_lane(self.TID_SNMP, "snmp pdus")
+
+	def now(self):
+		"""
+		@rtype: float
+		@returns: microseconds since the creation of the tracer
+		"""
+		return 1e6 * (self.clock() - self.start)
+
+	def _name_lane(self, tid, name):
+		self.events.append(dict(name="thread_name", ph="M", pid=self.PID, tid=tid, args=dict(name=name)))
+
+	def span(self, name, cat, tid, start, args=None):
+		"""Record a complete event from start until now.
+		@type start: float
+		@param start: as returned from now
+		"""
+		self.events.append(dict(name=name, cat=cat, ph="X", pid=self.PID, tid=tid, ts=start,
+								dur=self.now() - start, args=args or {}))
+
+	def plugin_started(self, plugin):
+		"""
+		@returns: a token to pass to plugin_finished
+		"""
+		tid = next(self.lanes)
+		self._name_lane(tid, plugin_name(plugin))
+		return tid, self.now()
+
+	def plugin_finished(self, plugin, token, exc=None):
+		tid, start = token
+		args = {} if exc is None else dict(error=repr(exc))
+		self.span(plugin_name(plugin), "plugin", tid, start, args)
+
+	def request(self, operation, oid, fut):
+		"""Record a request to the engine from issue until completion of the
+		returned future.
+		@type fut: Future
+		@returns: fut
+		"""
+		ident = next(self.requests)
+		name = "%s %s" % (operation, format_oid(oid))
+		task = future.current_task()
+		pdus = self.pdus
+		self.events.append(dict(name=name, cat="request", ph="b", id=ident, pid=self.PID, tid=self.TID_ENGINE,
+								ts=self.now(), args=dict(plugin=plugin_name(task) if task is not None else None)))
+		def completion(fut):
+			args = dict(step=self.steps)
+			args["served_by"] = "pdu %d" % self.pdus if self.pdus > pdus else "no pdu"
+			exc = fut.exception()
+			if exc is not None:
+				args["error"] = repr(exc)
+			self.events.append(dict(name=name, cat="request", ph="e", id=ident, pid=self.PID,
+									tid=self.TID_ENGINE, ts=self.now(), args=args))
+		fut.add_done_callback(completion)
+		return fut
+
+	def chrome_trace(self):
+		"""
+		@rtype: dict
+		@returns: the events in the JSON object format of Chrome traces
+		"""
+		return dict(traceEvents=self.events, displayTimeUnit="ms")
+
+	def write(self, filename):
+		with open(filename, "w") as tracefile:
+			json.dump(self.chrome_trace(), tracefile)
+		logger.info("wrote %d trace events to %s", len(self.events), filename)
+
+
+class TracingBackend(backend.BackendBase):
+	"""Records a span for every PDU sent through another backend."""
+	def __init__(self, back, tracer):
+		"""
+		@type back: BackendBase
+		@type tracer: Tracer
+		"""
+		backend.BackendBase.__init__(self)
+		self.backend = back
+		self.tracer = tracer
+		self.address = getattr(back, "address", None)
+
+	def _query(self, operation, oids, function, *args):
+		self.tracer.pdus += 1
+		name = "pdu %d %s" % (self.tracer.pdus, operation)
+		spanargs = dict(oids=[format_oid(oid) for oid in oids])
+		start = self.tracer.now()
+		try:
+			result = function(*args)
+		except Exception as exc:
+			spanargs["error"] = repr(exc)
+			raise
+		else:
+			if operation == "getbulk":
+				spanargs["nonrep"], spanargs["maxrep"] = args[1:]
+				spanargs["varbinds"] = len(result)
+			return result
+		finally:
+			self.tracer.span(name, "pdu", Tracer.TID_SNMP, start, spanargs)
+
+	def get(self, oid):
+		return self._query("get", [oid], self.backend.get, oid)
+
+	def getnext(self, oid):
+		return self._query("getnext", [oid], self.backend.getnext, oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		return self._query("getbulk", oids, self.backend.getbulk, oids, nonrep, maxrep)
+
+	def __repr__(self):
+		return repr(self.backend)
+
+
+class TracingEngine(engine.AbstractEngine):
+	"""Records the requests to another engine and its steps."""
+	def __init__(self, eng, tracer):
+		"""
+		@type eng: AbstractEngine
+		@type tracer: Tracer
+		"""
+		engine.AbstractEngine.__init__(self)
+		self.engine = eng
+		self.batching = eng.batching
+		self.tracer = tracer
+
+	def get(self, oid):
+		return self.tracer.request("get", oid, self.engine.get(oid))
+
+	def getnext(self, oid):
+		return self.tracer.request("getnext", oid, self.engine.getnext(oid))
+
+	def walk(self, baseoid, startoid=None):
+		"""Only the first batch of a walk is recorded as a request."""
+		return self.tracer.request("walk", baseoid, self.engine.walk(baseoid, startoid))
+
+	def step(self):
+		self.tracer.steps += 1
+		start = self.tracer.now()
+		pdus = self.tracer.pdus
+		try:
+			return self.engine.step()
+		finally:
+			self.tracer.span("step %d" % self.tracer.steps, "step", Tracer.TID_ENGINE, start,
+							dict(pdus=self.tracer.pdus - pdus))
+
+
+def add_trace_options(parser):
+	group = parser.add_argument_group("tracing", "record the timeline of a check")
+	group.add_argument("--trace", metavar="FILE", default=None,
+						help="write the plugins, engine requests and steps and PDUs of the check to FILE in the Chrome trace event format")
+
+def setup_trace(namespace):
+	"""
+	@rtype: Tracer or None
+	@returns: a Tracer if requested by the parsed arguments
+	"""
+	if namespace.trace is None:
+		return None
+	return Tracer()
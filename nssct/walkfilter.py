@@ -41,8 +41,9 @@ def check_line(line, include_oids):
 				for checkoid in include_oids)
 
 def check_stream(inp, outp):
+	include_oids = detect.collect_oids()
 	for line in inp:
-		if check_line(line, detect.all_oids):
+		if check_line(line, include_oids):
 			outp.write(line)
 
 def transform(source, destination):
@@ -0,0 +1,255 @@
+# -*- encoding: utf-8 -*-
+
+"""This script generates synthetic snmpwalks of large devices in the format
+of the recorded test cases, such that engines and plugins can be benchmarked
+and profiled at table sizes far beyond those of the cases. A walk contains
+the objects queried by the plugins of a vendor sized by the number of units,
+ports, power supplies, fans and cpus, plus interface and VLAN tables as
+found on real devices, which the plugins have to skip.
+
+Faults are injected randomly: with probability --faults a component reports
+a failure and with probability --missing a table cell is left out. The
+output is reproducible for a given --seed::
+
+	python -m nssct.walkgen --vendor brocade --units 12 --ports 48 -o big.log
+	python -m nssct.bench.engines big.log
+"""
+
+import argparse
+import binascii
+import random
+import sys
+
+from .plugins import brocade
+from .plugins import cisco
+from .plugins import hp
+
+sysDescr = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+sysObjectID = (1, 3, 6, 1, 2, 1, 1, 2, 0)
+ifEntry = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+
+
+def hexstring(text):
+	"""
+	>>> hexstring("ok")
+	'Hex-STRING: 6F 6B'
+	>>> hexstring("")
+	'""'
+	"""
+	if not text:
+		return '""'
+	encoded = binascii.hexlify(text.encode("utf-8")).decode("ascii").upper()
+	return "Hex-STRING: " + " ".join(encoded[i:i + 2] for i in range(0, len(encoded), 2))
+
+
+def format_oid(oid):
+	return "." + ".".join(map(str, oid))
+
+
+class Walk(object):
+	"""Collects the objects of a synthetic walk.
+	@ivar objects: maps oids to values formatted as by snmpwalk
+	@type rng: random.Random
+	@type missing: float
+	@ivar missing: is the probability of leaving out a table cell
+	"""
+	def __init__(self, rng, missing=0.0):
+		self.objects = {}
+		self.rng = rng
+		self.missing = missing
+
+	def scalar(self, oid, value):
+		self.objects[oid] = value
+
+	def cell(self, column, index, value):
+		"""Add a table cell unless it is chosen to be missing.
+		@type index: (int,)
+		"""
+		if self.missing and self.rng.random() < self.missing:
+			return
+		self.objects[column + index] = value
+
+	def lines(self):
+		"""@returns: the walk as lines ordered by oid"""
+		return ["%s = %s\n" % (format_oid(oid), self.objects[oid]) for oid in sorted(self.objects)]
+
+
+class Device(object):
+	"""The dimensions of a synthetic device.
+	@ivar units: is the number of stack units, line cards or modules
+	@ivar ports: is the number of ports per unit
+	@ivar psus: is the number of power supplies per unit
+	@ivar fans: is the number of fans per unit
+	@ivar cpus: is the number of cpus per unit
+	@ivar vlans: is the number of VLANs
+	@ivar faults: is the probability of a component reporting a failure
+	"""
+	def __init__(self, units=1, ports=48, psus=2, fans=2, cpus=1, vlans=10, faults=0.0):
+		self.units = units
+		self.ports = ports
+		self.psus = psus
+		self.fans = fans
+		self.cpus = cpus
+		self.vlans = vlans
+		self.faults = faults
+
+
+def interfaces(walk, device):
+	"""Add the interface table shared by all vendors.
+	@rtype: [int]
+	@returns: the ifIndex of every port
+	"""
+	indices = []
+	for unit in range(1, device.units + 1):
+		for port in range(1, device.ports + 1):
+			ifindex = unit * 64 + port
+			indices.append(ifindex)
+			up = walk.rng.random() < 0.7
+			walk.cell(ifEntry + (1,), (ifindex,), "INTEGER: %d" % ifindex)
+			walk.cell(ifEntry + (2,), (ifindex,), hexstring("GigabitEthernet%d/1/%d" % (unit, port)))
+			walk.cell(ifEntry + (8,), (ifindex,), "INTEGER: %d" % (1 if up else 2))
+			walk.cell(ifEntry + (10,), (ifindex,), "Counter32: %d" % walk.rng.randrange(2 ** 32))
+			walk.cell(ifEntry + (16,), (ifindex,), "Counter32: %d" % walk.rng.randrange(2 ** 32))
+	return indices
+
+
+def brocade_walk(walk, device):
+	rng = walk.rng
+	faulty = lambda: rng.random() < device.faults
+	version = "08.0.30qT211"
+	walk.scalar(sysDescr, hexstring("Brocade Communications Systems, Inc. Stacking System ICX7450-48, "
+									"IronWare Version %s Compiled on Mar 06 2017" % version))
+	walk.scalar(sysObjectID, "OID: " + format_oid(brocade.brcdIp + (1, 3, 48, 4, 1)))
+	walk.scalar(brocade.snmpEngineTime, "INTEGER: %d seconds" % rng.randrange(86400, 86400 * 1000))
+	walk.scalar(brocade.snAgImgVer, hexstring(version))
+	walk.scalar(brocade.snAgFlashImgVer, hexstring(version))
+	walk.scalar(brocade.snAgGblDynMemTotal, "Gauge32: %d" % (2 ** 30))
+	walk.scalar(brocade.snAgGblDynMemFree, "Gauge32: %d" % rng.randrange(2 ** 28, 2 ** 30))
+	walk.scalar(brocade.snChasActualTemperature, "INTEGER: %d" % rng.randrange(60, 120))
+	walk.scalar(brocade.snChasWarningTemperature, "INTEGER: 156")
+	walk.scalar(brocade.snChasShutdownTemperature, "INTEGER: 176")
+	walk.scalar(brocade.snSWACLPerPortPerVlanMode, "INTEGER: 1")
+	walk.scalar(brocade.snStackingGlobalConfigSt, "INTEGER: %d" % (1 if device.units > 1 else 2))
+	walk.scalar(brocade.snStackingGlobalTopology, "INTEGER: %d" % (3 if device.units > 2 else 2))
+	for unit in range(1, device.units + 1):
+		index = (unit,)
+		walk.cell(brocade.snChasUnitActualTemp, index, "INTEGER: %d" % (rng.randrange(170, 200) if faulty() else rng.randrange(60, 120)))
+		walk.cell(brocade.snChasUnitWarningTem, index, "INTEGER: 156")
+		walk.cell(brocade.snChasUnitShutdownTemperature, index, "INTEGER: 176")
+		for sensor in (1, 2):
+			walk.cell(brocade.snAgentTempValue, (unit, sensor), "INTEGER: %d" % rng.randrange(60, 120))
+		for fan in range(1, device.fans + 1):
+			walk.cell(brocade.snChasFan2OperStatus, (unit, fan), "INTEGER: %d" % (3 if faulty() else 2))
+		for psu in range(1, device.psus + 1):
+			failed = faulty()
+			walk.cell(brocade.snChasPwrSupply2Description, (unit, psu),
+						hexstring("Power supply %d %s" % (psu, "failed" if failed else "present, status ok")))
+			walk.cell(brocade.snChasPwrSupply2OperStatus, (unit, psu), "INTEGER: %d" % (3 if failed else 2))
+		for cpu in range(1, device.cpus + 1):
+			for interval in (1, 5, 60, 300):
+				walk.cell(brocade.snAgentCpuUtilValue, (unit, cpu, interval), "Gauge32: %d" % rng.randrange(0, 10000))
+		if device.units > 1:
+			walk.cell(brocade.snStackingConfigUnitPriority, index, "INTEGER: %d" % (128 if unit == 1 else 0))
+			walk.cell(brocade.snStackingConfigUnitState, index, "INTEGER: %d" % (4 if faulty() else 1 if unit == 1 else 2))
+			walk.cell(brocade.snStackingOperUnitImgVer, index, hexstring("08.0.30pT211" if faulty() else version))
+			walk.cell(brocade.snStackingOperUnitBuildlVer, index, hexstring("08.0.30q"))
+	for fan in range(1, device.fans + 1):
+		walk.cell(brocade.snChasFanOperStatus, (fan,), "INTEGER: %d" % (3 if faulty() else 2))
+	for psu in range(1, device.psus + 1):
+		walk.cell(brocade.snChasPwrSupplyDescription, (psu,), hexstring("Power supply %d present, status ok" % psu))
+		walk.cell(brocade.snChasPwrSupplyOperStatus, (psu,), "INTEGER: 2")
+	ports = interfaces(walk, device)
+	for vlan in range(1, device.vlans + 1):
+		walk.cell(brocade.fdryDhcpSnoopVlanDhcpSnoopEnable, (vlan,), "INTEGER: %d" % (2 if faulty() else 1))
+		for position, ifindex in enumerate(ports):
+			if position % device.ports < 2:  # uplinks carry all VLANs tagged
+				walk.cell(brocade.snVLanByPortMemberTagMode, (vlan, ifindex), "INTEGER: 1")
+			elif position % device.vlans == vlan - 1:
+				walk.cell(brocade.snVLanByPortMemberTagMode, (vlan, ifindex), "INTEGER: 2")
+
+
+def cisco_walk(walk, device):
+	rng = walk.rng
+	faulty = lambda: rng.random() < device.faults
+	walk.scalar(sysObjectID, "OID: " + format_oid(cisco.cisco + (1, 427)))
+	for unit in range(1, device.units + 1):
+		for fan in range(1, device.fans + 1):
+			index = ((unit - 1) * device.fans + fan,)
+			walk.cell(cisco.ciscoEnvMonFanStatusDescr, index, hexstring("Switch#%d, Fan#%d" % (unit, fan)))
+			walk.cell(cisco.ciscoEnvMonFanState, index, "INTEGER: %d" % (3 if faulty() else 1))
+		for psu in range(1, device.psus + 1):
+			index = ((unit - 1) * device.psus + psu,)
+			walk.cell(cisco.ciscoEnvMonSupplyStatusDescr, index, hexstring("Sw%d, PS%d" % (unit, psu)))
+			walk.cell(cisco.ciscoEnvMonSupplyState, index, "INTEGER: %d" % (3 if faulty() else 1))
+	for unit in range(1, device.units + 1):
+		for offset, name in enumerate(("Processor", "I/O")):
+			index = (2 * unit - 1 + offset,)
+			walk.cell(cisco.ciscoMemoryPoolName, index, hexstring("%s%d" % (name, unit)))
+			walk.cell(cisco.ciscoMemoryPoolUsed, index, "Gauge32: %d" % rng.randrange(2 ** 20, 2 ** 24))
+			walk.cell(cisco.ciscoMemoryPoolFree, index, "Gauge32: %d" % rng.randrange(2 ** 20, 2 ** 24))
+	for index in range(1, device.units * device.cpus + 1):
+		walk.cell(cisco.ciscoCpmCPUTotal5minRev, (index,), "Gauge32: %d" % rng.randrange(0, 100))
+	interfaces(walk, device)
+
+
+def hp_walk(walk, device):
+	rng = walk.rng
+	faulty = lambda: rng.random() < device.faults
+	walk.scalar(sysObjectID, "OID: " + format_oid(hp.hpmib + (2, 3, 7, 11, 90)))
+	sensors = [(1, device.psus), (2, device.fans), (3, 1)]  # hpicfSensorObjectId types
+	index = 0
+	for unit in range(1, device.units + 1):
+		for kind, count in sensors:
+			for number in range(1, count + 1):
+				index += 1
+				walk.cell(hp.hpicfSensorEntry + (1,), (index,), "INTEGER: %d" % index)
+				walk.cell(hp.hpicfSensorEntry + (2,), (index,), "OID: " + format_oid(hp.icfSensors + (kind, number)))
+				walk.cell(hp.hpicfSensorEntry + (3,), (index,), "INTEGER: 1")
+				walk.cell(hp.hpicfSensorEntry + (4,), (index,), "INTEGER: %d" % (2 if faulty() else 4))
+				walk.cell(hp.hpicfSensorEntry + (5,), (index,), "Counter32: 0")
+				walk.cell(hp.hpicfSensorEntry + (6,), (index,), "Counter32: 0")
+				walk.cell(hp.hpicfSensorEntry + (7,), (index,), hexstring("Sensor %d of unit %d" % (number, unit)))
+		walk.cell(hp.hpGlobalMemTotalBytes, (unit,), "INTEGER: %d" % (2 ** 26))
+		walk.cell(hp.hpGlobalMemAllocBytes, (unit,), "INTEGER: %d" % rng.randrange(2 ** 22, 2 ** 26))
+	interfaces(walk, device)
+
+
+VENDORS = {"brocade": brocade_walk, "cisco": cisco_walk, "hp": hp_walk}
+
+
+def generate(vendor, device, seed=0, missing=0.0):
+	"""
+	@type vendor: str
+	@param vendor: one of VENDORS
+	@type device: Device
+	@rtype: [str]
+	@returns: the lines of the walk
+	"""
+	walk = Walk(random.Random(seed), missing)
+	VENDORS[vendor](walk, device)
+	return walk.lines()
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--vendor", choices=sorted(VENDORS), default="brocade")
+	parser.add_argument("--units", type=int, default=1, metavar="N", help="stack units (default: %(default)s)")
+	parser.add_argument("--ports", type=int, default=48, metavar="N", help="ports per unit (default: %(default)s)")
+	parser.add_argument("--psus", type=int, default=2, metavar="N", help="power supplies per unit (default: %(default)s)")
+	parser.add_argument("--fans", type=int, default=2, metavar="N", help="fans per unit (default: %(default)s)")
+	parser.add_argument("--cpus", type=int, default=1, metavar="N", help="cpus per unit (default: %(default)s)")
+	parser.add_argument("--vlans", type=int, default=10, metavar="N", help="VLANs (default: %(default)s)")
+	parser.add_argument("--faults", type=float, default=0.0, metavar="P",
+						help="probability of a component reporting a failure (default: %(default)s)")
+	parser.add_argument("--missing", type=float, default=0.0, metavar="P",
+						help="probability of a table cell missing (default: %(default)s)")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: %(default)s)")
+	parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout, metavar="FILE",
+						help="write the walk to FILE instead of stdout")
+	args = parser.parse_args()
+	device = Device(args.units, args.ports, args.psus, args.fans, args.cpus, args.vlans, args.faults)
+	args.output.writelines(generate(args.vendor, device, args.seed, args.missing))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+
+"""A parent process, that imports nssct, pysnmp and all plugins once and
+forks a child for every check request received on a Unix socket. The child
+runs the same main function as the nssct command, so every check still runs
+in a process of its own including the logging setup given on its command
+line. Only the import cost is saved. It speaks the protocol of the ipc module,
+so nssct-client works with either the zygote or the daemon.
+"""
+
+import argparse
+import errno
+import gc
+import logging
+import os
+import sys
+import traceback
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+from . import ipc
+from . import log
+from . import main as nssct_main
+from . import report
+
+logger = logging.getLogger(__name__)
+
+
+def run_main(argv):
+	"""Run the nssct command with the given arguments in this process and
+	capture its output and exit code. This must only happen in a forked
+	child, because the logging configuration of the process is replaced.
+	@type argv: [str]
+	@rtype: dict
+	@returns: a response message as described in the ipc module
+	"""
+	stdout = log.StringIO()
+	stderr = log.StringIO()
+	saved = sys.stdout, sys.stderr
+	sys.stdout, sys.stderr = stdout, stderr
+	del logging.getLogger("nssct").handlers[:]
+	try:
+		nssct_main.main(argv)
+		status = 0
+	except SystemExit as exc:
+		status = 0 if exc.code is None else exc.code
+	except Exception:
+		traceback.print_exc()
+		status = report.UNKNOWN
+	finally:
+		sys.stdout, sys.stderr = saved
+	return dict(output=stdout.getvalue(), errors=stderr.getvalue(), status=status)
+
+
+class ZygoteHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		try:
+			argv = ipc.request_argv(ipc.receive_message(self.rfile))
+		except ipc.ProtocolError as err:
+			logger.warning("dropping client: %s", err)
+			return
+		ipc.send_message(self.wfile, run_main(argv))
+
+
+class ZygoteServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+	def __init__(self, path, max_children=40):
+		"""
+		@type path: str
+		@param path: is where the socket is created. A stale socket is
+				replaced.
+		@type max_children: int
+		@param max_children: is the number of checks running concurrently.
+				Further requests wait.
+		"""
+		try:
+			os.unlink(path)
+		except OSError as err:
+			if err.errno != errno.ENOENT:
+				raise
+		socketserver.UnixStreamServer.__init__(self, path, ZygoteHandler)
+		self.max_children = max_children
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--socket", default=ipc.DEFAULT_SOCKET, metavar="PATH",
+						help="listen on the Unix socket PATH (default: %(default)s)")
+	parser.add_argument("--mode", default="0660", metavar="MODE",
+						help="permissions of the socket in octal (default: %(default)s)")
+	parser.add_argument("--max-children", type=int, default=40, metavar="N",
+						help="maximum number of concurrent checks (default: %(default)s)")
+	log.add_log_options(parser)
+	args = parser.parse_args()
+	log.setup_logging(args)
+	nssct_main.preload()
+	server = ZygoteServer(args.socket, args.max_children)
+	os.chmod(args.socket, int(args.mode, 8))
+	if hasattr(gc, "freeze"):
+		gc.freeze()  # keep the imported modules shared with the children
+	logger.info("forking checks from %s", args.socket)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.unlink(args.socket)
+
+if __name__ == "__main__":
+	main()
@@ -10,7 +10,12 @@ setup(
 		maintainer="Cygnus Networks GmbH",
 		maintainer_email="info@cygnusnetworks.de",
 		license="GPL-2",
-		packages=["nssct", "nssct.backend", "nssct.plugins"],
+		packages=["nssct", "nssct.backend", "nssct.bench", "nssct.plugins"],
 		test_suite="unittest2.collector",
-		entry_points=dict(console_scripts=["nssct=nssct.main:main"]),
+		entry_points=dict(console_scripts=[
+			"nssct=nssct.main:main",
+			"nssct-daemon=nssct.daemon:main",
+			"nssct-client=nssct.client:main",
+			"nssct-zygote=nssct.zygote:main",
+		]),
 	)
@@ -0,0 +1,81 @@
+import logging
+import os
+import unittest
+
+import nssct.accounting
+import nssct.backend.mock
+import nssct.controller
+import nssct.engine
+import nssct.future
+import nssct.main
+import nssct.report
+from nssct.plugins import detect
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+class ListHandler(logging.Handler):
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.records = []
+
+	def emit(self, record):
+		self.records.append(record)
+
+class AccountingTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+
+	def test_nested_runs(self):
+		clock = FakeClock()
+		costs = nssct.accounting.PluginCosts(clock, clock)
+		costs.enter("outer")
+		clock.now += 1.0
+		costs.enter("inner")
+		clock.now += 2.0
+		costs.leave("inner")
+		costs.leave("outer")
+		self.assertEqual(costs.costs["outer"]["wall_ms"], 1000.0)
+		self.assertEqual(costs.costs["inner"]["cpu_ms"], 2000.0)
+		self.assertEqual([name for name, _ in costs.rows()], ["inner", "outer"])
+
+	def test_check(self):
+		costs = nssct.accounting.PluginCosts()
+		back = nssct.backend.mock.MockBackend(self.case)
+		caching = nssct.engine.CachingEngine(nssct.engine.BulkEngine(back, lookahead=7))
+		control = nssct.controller.Controller(nssct.accounting.AccountingEngine(caching, costs))
+		previous = nssct.future.set_task_profiler(costs)
+		try:
+			control.run(nssct.report.Collector(), [detect.detect])
+		finally:
+			nssct.future.set_task_profiler(previous)
+		self.assertIsNone(previous)
+		self.assertEqual(costs.stack, [])
+		self.assertNotIn(None, costs.costs)
+		self.assertGreaterEqual(len(costs.costs), control.counters["plugin_started"] - 1)
+		self.assertEqual(costs.costs["detect"]["requests"], 1)
+		self.assertEqual(sum(counter["cache_hits"] for counter in costs.costs.values()), caching.saved())
+		self.assertEqual(sum(counter["requests"] for counter in costs.costs.values()),
+						sum(caching.counters[key] for key in ("get_hit", "get_negative", "get_coalesced", "get_miss",
+																"next_hit", "next_coalesced", "next_miss"))
+						+ control.counters["walk_started"])
+		self.assertGreater(costs.costs["brocade_agent_temperature_plugin"]["varbinds"], 1)
+		self.assertTrue(all(counter["wall_ms"] >= 0 for counter in costs.costs.values()))
+
+	def test_main(self):
+		handler = ListHandler()
+		logger = logging.getLogger("nssct.accounting")
+		logger.addHandler(handler)
+		logger.setLevel(logging.INFO)
+		try:
+			args = nssct.main.build_parser().parse_args(["--mock", self.case, "--plugin-costs"])
+			nssct.main.run(args, nssct.backend.mock.MockBackend(self.case))
+		finally:
+			logger.removeHandler(handler)
+			logger.setLevel(logging.NOTSET)
+		lines = [record.getMessage() for record in handler.records]
+		self.assertEqual(lines[0].split()[2:4], ["plugin", "requests"])
+		self.assertIn("detect", " ".join(lines))
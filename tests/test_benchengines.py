@@ -0,0 +1,25 @@
+import unittest
+
+import nssct.bench.engines
+
+class EngineBenchTests(unittest.TestCase):
+	case = "cases/cygnus-hp-1.log"
+
+	def test_matrix(self):
+		rows = nssct.bench.engines.run_matrix([self.case], [0, 7], 0.001)
+		self.assertEqual([row["engine"] for row in rows],
+						["simple", "bulk0", "bulk7", "simple+cache", "bulk0+cache", "bulk7+cache"])
+		simple, bulk7 = rows[0], rows[2]
+		self.assertEqual(simple["getbulk"], 0)
+		self.assertEqual(simple["pdus"], simple["varbinds"])
+		self.assertLess(bulk7["pdus"], simple["pdus"])
+		self.assertGreater(bulk7["futures"], 0)
+		self.assertEqual(nssct.bench.engines.regressions(rows, rows), [])
+		again = nssct.bench.engines.run_matrix([self.case], [0, 7], 0.001)
+		self.assertEqual([row["pdus"] for row in again], [row["pdus"] for row in rows])
+
+	def test_regressions(self):
+		baseline = [dict(case="a", engine="simple", pdus=10, cpu_ms=1.0)]
+		self.assertEqual(nssct.bench.engines.regressions(baseline, [dict(case="a", engine="simple", pdus=10, cpu_ms=1.2)]), [])
+		self.assertEqual(len(nssct.bench.engines.regressions(baseline, [dict(case="a", engine="simple", pdus=9, cpu_ms=1.3)])), 1)
+		self.assertEqual(nssct.bench.engines.regressions(baseline, [dict(case="b", engine="simple", pdus=20, cpu_ms=9)]), [])
@@ -0,0 +1,25 @@
+import unittest
+
+import nssct.bench.micro
+
+class MicroBenchTests(unittest.TestCase):
+	def test_benchmarks(self):
+		for name, setup, run in nssct.bench.micro.BENCHMARKS:
+			row = nssct.bench.micro.run_benchmark(name, setup, run, 200, 0.001)
+			self.assertEqual(row["benchmark"], name)
+			self.assertGreater(row["ops"], 0)
+			self.assertGreater(row["ops_per_sec"], 0)
+			self.assertEqual(nssct.bench.micro.regressions([row], [row]), [])
+
+	def test_random_oids(self):
+		import random
+		oids = nssct.bench.micro.random_oids(random.Random(0), 300)
+		self.assertEqual(len(set(oids)), 300)
+		self.assertNotEqual(oids, sorted(oids))
+
+	def test_regressions(self):
+		baseline = [dict(benchmark="get", size=10, ops_per_sec=100.0, peak_kb=10.0)]
+		regressions = nssct.bench.micro.regressions
+		self.assertEqual(regressions(baseline, [dict(benchmark="get", size=10, ops_per_sec=90.0, peak_kb=10.5)]), [])
+		self.assertEqual(len(regressions(baseline, [dict(benchmark="get", size=10, ops_per_sec=100.0, peak_kb=12.0)])), 1)
+		self.assertEqual(regressions(baseline, [dict(benchmark="get", size=20, ops_per_sec=1.0, peak_kb=None)]), [])
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import nssct.backend.mock
+import nssct.daemon
+import nssct.ipc
+import nssct.main
+import nssct.report
+import nssct.zygote
+
+class DaemonTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-1.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "socket")
+		self.server = nssct.daemon.CheckServer(self.path, nssct.daemon.CheckRunner(mock_dir=os.path.dirname(self.case)))
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.start()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.thread.join()
+		self.server.server_close()
+		shutil.rmtree(self.directory)
+
+	def test_check(self):
+		argv = ["--mock", self.case, "--bulk", "--cache"]
+		expected = nssct.main.run(nssct.main.build_parser().parse_args(argv), nssct.backend.mock.MockBackend(self.case))
+		for _ in range(2):
+			response = nssct.ipc.request(self.path, argv)
+			self.assertEqual(response["output"], str(expected) + "\n")
+			self.assertEqual(response["status"], expected.state())
+			self.assertEqual(response["errors"], "")
+
+	def test_concurrent(self):
+		argv = ["--mock", self.case]
+		responses = []
+		def client():
+			responses.append(nssct.ipc.request(self.path, argv))
+		threads = [threading.Thread(target=client) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(responses), 8)
+		for response in responses:
+			self.assertEqual(response, responses[0])
+
+	def test_bad_arguments(self):
+		response = nssct.ipc.request(self.path, ["--mock", self.case, "--bogus"])
+		self.assertEqual(response["status"], nssct.report.UNKNOWN)
+		self.assertIn("nssct: error: unrecognized arguments: --bogus", response["errors"])
+		self.assertEqual(response["output"], "")
+
+	def test_mock_dir(self):
+		response = nssct.ipc.request(self.path, ["--mock", os.path.basename(self.case)])
+		self.assertEqual(response["errors"], "")
+		self.assertNotEqual(response["status"], nssct.report.UNKNOWN)
+		response = nssct.ipc.request(self.path, ["--mock", os.path.join(os.pardir, "README.md")])
+		self.assertEqual(response["status"], nssct.report.UNKNOWN)
+		self.assertIn("nssct: error: --mock must name a file in", response["errors"])
+		response = nssct.daemon.CheckRunner().handle(dict(argv=["--mock", self.case]))
+		self.assertEqual(response["status"], nssct.report.UNKNOWN)
+		self.assertIn("nssct: error: not permitted in requests to the daemon: --mock", response["errors"])
+
+	def test_path_options(self):
+		trace = os.path.join(self.directory, "trace.json")
+		response = nssct.ipc.request(self.path, ["--mock", self.case, "--trace", trace])
+		self.assertEqual(response["status"], nssct.report.UNKNOWN)
+		self.assertIn("nssct: error: not permitted in requests to the daemon: --trace", response["errors"])
+		self.assertFalse(os.path.exists(trace))
+		response = self.server.runner.execute(["--mock", self.case, "--trace", trace], trusted=True)
+		self.assertEqual(response["errors"], "")
+		self.assertTrue(os.path.exists(trace))
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+class BackendPoolTests(unittest.TestCase):
+	cases = [os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-%d.log" % i) for i in (1, 2, 3)]
+
+	def setUp(self):
+		self.clock = FakeClock()
+		self.pool = nssct.daemon.BackendPool(max_idle=2, idle_timeout=60, clock=self.clock)
+		self.closed = []
+
+	def use(self, case):
+		args = nssct.main.build_parser().parse_args(["--mock", case])
+		with self.pool.backend(args) as back:
+			back.close = lambda: self.closed.append(case)
+			return back
+
+	def test_reuse(self):
+		first = self.use(self.cases[0])
+		self.assertIs(self.use(self.cases[0]), first)
+		self.assertIsNot(self.use(self.cases[1]), first)
+		self.assertEqual(self.closed, [])
+
+	def test_idle_timeout(self):
+		first = self.use(self.cases[0])
+		self.clock.now += 30
+		self.use(self.cases[1])
+		self.clock.now += 31
+		self.pool.expire()
+		self.assertEqual(self.closed, [self.cases[0]])
+		self.assertIsNot(self.use(self.cases[0]), first)
+
+	def test_max_idle(self):
+		for case in self.cases:
+			self.use(case)
+			self.clock.now += 1
+		self.assertEqual(self.closed, [self.cases[0]])
+		self.pool.close()
+		self.assertEqual(sorted(self.closed), sorted(self.cases))
+
+class ZygoteTests(unittest.TestCase):
+	case = DaemonTests.case
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "socket")
+		self.server = nssct.zygote.ZygoteServer(self.path)
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.start()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.thread.join()
+		self.server.server_close()
+		shutil.rmtree(self.directory)
+
+	def test_check(self):
+		argv = ["--mock", self.case, "--level", "ERROR"]
+		expected = nssct.main.run(nssct.main.build_parser().parse_args(argv), nssct.backend.mock.MockBackend(self.case))
+		response = nssct.ipc.request(self.path, argv)
+		self.assertEqual(response, dict(output=str(expected) + "\n", errors="", status=expected.state()))
+
+	def test_bad_arguments(self):
+		response = nssct.ipc.request(self.path, ["--bogus"])
+		self.assertEqual(response["status"], nssct.report.UNKNOWN)
+		self.assertIn("error: one of the arguments --mock --agent is required", response["errors"])
@@ -1,15 +1,43 @@
 import doctest
 import unittest
 
+import nssct.accounting
 import nssct.backend.mock
+import nssct.bench.engines
+import nssct.bench.micro
 import nssct.cache
+import nssct.future
+import nssct.governor
+import nssct.metrics
+import nssct.passive
+import nssct.perfdata
 import nssct.plugins
+import nssct.plugins.registry
+import nssct.profiling
 import nssct.report
+import nssct.resultcache
+import nssct.scheduler
+import nssct.trace
+import nssct.walkgen
 
 def load_tests(loader, tests, ignore):
 	suite = unittest.TestSuite()
+	suite.addTests(doctest.DocTestSuite(nssct.accounting))
 	suite.addTests(doctest.DocTestSuite(nssct.backend.mock))
+	suite.addTests(doctest.DocTestSuite(nssct.bench.engines))
+	suite.addTests(doctest.DocTestSuite(nssct.bench.micro))
 	suite.addTests(doctest.DocTestSuite(nssct.cache))
+	suite.addTests(doctest.DocTestSuite(nssct.future))
+	suite.addTests(doctest.DocTestSuite(nssct.governor))
+	suite.addTests(doctest.DocTestSuite(nssct.metrics))
+	suite.addTests(doctest.DocTestSuite(nssct.passive))
+	suite.addTests(doctest.DocTestSuite(nssct.perfdata))
 	suite.addTests(doctest.DocTestSuite(nssct.plugins))
+	suite.addTests(doctest.DocTestSuite(nssct.plugins.registry))
+	suite.addTests(doctest.DocTestSuite(nssct.profiling))
 	suite.addTests(doctest.DocTestSuite(nssct.report))
+	suite.addTests(doctest.DocTestSuite(nssct.resultcache))
+	suite.addTests(doctest.DocTestSuite(nssct.scheduler))
+	suite.addTests(doctest.DocTestSuite(nssct.trace))
+	suite.addTests(doctest.DocTestSuite(nssct.walkgen))
 	return suite
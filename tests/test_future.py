@@ -0,0 +1,104 @@
+import unittest
+
+import nssct.future
+
+class FutureTests(unittest.TestCase):
+	def test_callback_order(self):
+		fut = nssct.future.Future()
+		calls = []
+		for i in range(3):
+			fut.add_done_callback(lambda f, i=i: calls.append((i, f.result())))
+		fut.set_result("spam")
+		fut.add_done_callback(lambda f: calls.append((3, f.result())))
+		self.assertEqual(calls, [(0, "spam"), (1, "spam"), (2, "spam"), (3, "spam")])
+
+	def test_completed(self):
+		fut = nssct.future.completed("spam")
+		self.assertTrue(fut.done())
+		self.assertEqual(fut.result(), "spam")
+		fut = nssct.future.failed(ValueError("eggs"))
+		self.assertTrue(fut.done())
+		self.assertRaises(ValueError, fut.result)
+
+	def test_slots(self):
+		self.assertRaises(AttributeError, setattr, nssct.future.Future(), "spam", 1)
+
+	def test_coroutine(self):
+		pending = nssct.future.Future()
+		@nssct.future.coroutine
+		def add(fut):
+			first = (yield nssct.future.completed(1))
+			second = (yield fut)
+			nssct.future.return_(first + second)
+		res = add(pending)
+		self.assertFalse(res.done())
+		pending.set_result(2)
+		self.assertEqual(res.result(), 3)
+
+	def test_coroutine_exception(self):
+		@nssct.future.coroutine
+		def fail():
+			yield nssct.future.failed(KeyError("spam"))
+		self.assertRaises(KeyError, fail().result)
+
+class TrampolineTests(unittest.TestCase):
+	rows = 20000
+
+	def test_completed_chain(self):
+		@nssct.future.coroutine
+		def count():
+			total = 0
+			for i in range(self.rows):
+				total += (yield nssct.future.completed(1))
+			nssct.future.return_(total)
+		self.assertEqual(count().result(), self.rows)
+
+	def test_callback_chain(self):
+		@nssct.future.coroutine
+		def forward(fut):
+			nssct.future.return_((yield fut))
+		start = nssct.future.Future()
+		fut = start
+		for _ in range(self.rows):
+			fut = forward(fut)
+		start.set_result("spam")
+		self.assertEqual(fut.result(), "spam")
+
+	def test_nested_walk(self):
+		# each row is served by a new coroutine, as plugins.snmpwalk does
+		@nssct.future.coroutine
+		def row(i):
+			if i == self.rows:
+				nssct.future.return_(None)
+			yield nssct.future.completed(None)
+			nssct.future.return_((i, row(i + 1)))
+		@nssct.future.coroutine
+		def walk():
+			count = 0
+			fut = row(0)
+			while (yield fut):
+				_, fut = fut.result()
+				count += 1
+			nssct.future.return_(count)
+		self.assertEqual(walk().result(), self.rows)
+
+class TaskTests(unittest.TestCase):
+	def test_inherited(self):
+		pending = nssct.future.Future()
+		seen = []
+		@nssct.future.coroutine
+		def inner():
+			seen.append(nssct.future.current_task())
+			yield pending
+			seen.append(nssct.future.current_task())
+		@nssct.future.coroutine
+		def outer():
+			yield inner()
+			seen.append(nssct.future.current_task())
+		fut = nssct.future.run_in_task("a", outer)
+		nssct.future.run_in_task("b", inner)
+		self.assertEqual(seen, ["a", "b"])
+		pending.set_result(None)  # resumes both outside of any task
+		self.assertTrue(fut.done())
+		self.assertEqual(sorted(seen), ["a", "a", "a", "b", "b"])
+		self.assertIsNone(nssct.future.current_task())
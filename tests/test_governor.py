@@ -0,0 +1,43 @@
+import shutil
+import tempfile
+import unittest
+
+import nssct.backend.mock
+import nssct.governor
+
+class GovernorTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_slots_exhausted(self):
+		gov = nssct.governor.Governor(self.directory, slots=2, timeout=0.05)
+		other = nssct.governor.Governor(self.directory, slots=2, timeout=0.05)
+		first = gov.acquire_slot()
+		second = other.acquire_slot()
+		third = nssct.governor.Governor(self.directory, slots=2, timeout=0.05)
+		self.assertRaises(nssct.governor.GovernorTimeout, third.acquire_slot)
+		third.close()
+		gov.release_slot(first)
+		other.release_slot(second)
+		gov.close()
+		other.close()
+
+	def test_token_bucket(self):
+		gov = nssct.governor.Governor(self.directory, rate=0.001, burst=3, timeout=0.05)
+		for _ in range(3):
+			gov.take_token("192.0.2.1")
+		self.assertRaises(nssct.governor.GovernorTimeout, gov.take_token, "192.0.2.1")
+		# buckets are per agent
+		gov.take_token("192.0.2.2")
+
+	def test_governed_backend(self):
+		dump = [u".1.3.6.1.2.1.1.2.0 = OID: 0.1.2.3"]
+		back = nssct.backend.mock.MockBackend(dump)
+		gov = nssct.governor.Governor(self.directory, slots=1)
+		back = nssct.governor.GovernedBackend(back, gov, "192.0.2.1")
+		self.assertEqual(back.getnext((1,))[0], (1, 3, 6, 1, 2, 1, 1, 2, 0))
+		# the slot must have been released
+		gov.release_slot(gov.acquire_slot())
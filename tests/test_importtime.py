@@ -0,0 +1,21 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import nssct.bench.importtime
+
+class ImportTimeTests(unittest.TestCase):
+	def test_budgets(self):
+		for module, (budget, _) in nssct.bench.importtime.BUDGETS.items():
+			elapsed, modules = nssct.bench.importtime.best_probe(module, repeat=3)
+			self.assertEqual(nssct.bench.importtime.violations(module, modules), [])
+			self.assertLess(1000 * elapsed, budget, "importing %s took %.1fms" % (module, 1000 * elapsed))
+
+	def test_json_top(self):
+		output = subprocess.check_output([sys.executable, "-m", "nssct.bench.importtime", "--json", "--top", "2", "nssct.client"],
+										cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+		result = json.loads(output.decode("utf-8"))
+		self.assertEqual([row["module"] for row in result["modules"]], ["nssct.client"])
+		self.assertEqual(len(result["top"]["nssct.client"]), 2)
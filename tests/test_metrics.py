@@ -0,0 +1,72 @@
+import os
+import threading
+import unittest
+
+try:
+	from urllib.request import urlopen
+except ImportError:
+	from urllib2 import urlopen
+
+import nssct.controller
+import nssct.daemon
+import nssct.metrics
+
+class MetricsTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-1.log")
+
+	def test_histogram(self):
+		registry = nssct.metrics.Registry()
+		histogram = registry.histogram("nssct_rtt_seconds", "RTT", ["agent"], buckets=(0.1, 1))
+		histogram.observe(0.05, agent="a")
+		histogram.observe(0.5, agent="a")
+		histogram.observe(5, agent="a")
+		self.assertEqual(registry.render().splitlines()[2:], [
+			'nssct_rtt_seconds_bucket{agent="a",le="0.1"} 1',
+			'nssct_rtt_seconds_bucket{agent="a",le="1.0"} 2',
+			'nssct_rtt_seconds_bucket{agent="a",le="+Inf"} 3',
+			'nssct_rtt_seconds_sum{agent="a"} 5.55',
+			'nssct_rtt_seconds_count{agent="a"} 3',
+		])
+
+	def test_labels(self):
+		registry = nssct.metrics.Registry()
+		counter = registry.counter("nssct_spam_total", "spam", ["kind"])
+		self.assertRaises(ValueError, counter.inc)
+		self.assertIs(registry.counter("nssct_spam_total", "spam", ["kind"]), counter)
+		self.assertRaises(ValueError, registry.gauge, "nssct_spam_total", "spam", ["kind"])
+
+	def test_pending_plugins(self):
+		registry = nssct.metrics.Registry()
+		checks = nssct.metrics.CheckMetrics(registry)
+		control = nssct.controller.Controller(None)
+		control.pending_plugins.extend([object(), object()])
+		with checks.watch_run(control):
+			self.assertIn("nssct_pending_plugins 2\n", registry.render())
+		self.assertIn("nssct_pending_plugins 0\n", registry.render())
+
+	def test_daemon(self):
+		runner = nssct.daemon.CheckRunner(mock_dir=os.path.dirname(self.case))
+		for _ in range(2):
+			runner.execute(["--mock", self.case, "--bulk", "--cache"])
+		server = nssct.metrics.MetricsServer(("127.0.0.1", 0), runner.registry)
+		thread = threading.Thread(target=server.serve_forever)
+		thread.start()
+		try:
+			response = urlopen("http://127.0.0.1:%d/metrics" % server.server_address[1])
+			self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+			lines = response.read().decode("utf-8").splitlines()
+		finally:
+			server.shutdown()
+			thread.join()
+			server.server_close()
+		self.assertIn('nssct_checks_total{state="CRITICAL"} 2', lines)
+		self.assertIn('nssct_checks_running 0', lines)
+		self.assertIn('nssct_pending_plugins 0', lines)
+		samples = dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+		pdus = sum(int(value) for name, value in samples.items() if name.startswith("nssct_pdus_total{"))
+		self.assertGreater(pdus, 0)
+		# the daemon resolves the path of the recorded snmpwalk
+		self.assertEqual(samples['nssct_pdu_rtt_seconds_count{agent="%s"}' % os.path.realpath(self.case)], str(pdus))
+		self.assertGreater(int(samples['nssct_controller_events_total{event="plugin_started"}']), 0)
+		self.assertGreater(int(samples['nssct_cache_requests_total{result="get_miss"}']), 0)
+		self.assertEqual(samples["nssct_cache_entries_count"], "2")
@@ -1,12 +1,18 @@
 import io
+import os
 import unittest
 
 import pysnmp.proto.rfc1905
 
 import nssct.controller
+import nssct.future
 import nssct.engine
 import nssct.backend.mock
+import nssct.plugins
+import nssct.plugins.brocade
+import nssct.plugins.cisco
 import nssct.plugins.detect
+import nssct.plugins.hp
 import nssct.report
 
 class MockTests(unittest.TestCase):
@@ -47,3 +53,362 @@ class MockTests(unittest.TestCase):
 		engine.step()
 		self.assertTrue(res1.done())
 		self.assertRaises(nssct.engine.NoSuchObjectError, res1.result)
+
+class DetectTests(unittest.TestCase):
+	def test_vendor_prefixes(self):
+		lookup = nssct.plugins.detect.registry.lookup
+		self.assertEqual(lookup(nssct.plugins.brocade.brcdIp + (1,)).name, "brocade")
+		self.assertEqual(lookup(nssct.plugins.cisco.cisco + (1,)).name, "cisco")
+		self.assertEqual(lookup(nssct.plugins.hp.hpmib + (1,)).name, "hp")
+
+class SelectionTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-1.log")
+
+	def check(self, specs, case=None):
+		backend = CountingBackend(case or self.case)
+		cont = nssct.controller.Controller(nssct.engine.SimpleEngine(backend), nssct.controller.PluginSelection(specs))
+		collector = nssct.report.Collector()
+		cont.run(collector, [nssct.plugins.detect.detect])
+		return cont, collector, backend.calls
+
+	def test_cpu(self):
+		_, full, fullcalls = self.check([])
+		cont, collector, calls = self.check(["cpu"])
+		self.assertTrue(cont.selection.matched)
+		self.assertTrue(collector.metrics)
+		self.assertEqual([str(metric) for metric in full.metrics if metric.label.startswith("cpu_")],
+						[str(metric) for metric in collector.metrics])
+		# sysObjectID, one getnext per cpu and the end, one get per cpu
+		self.assertEqual(calls, 1 + 2 * len(collector.metrics) + 1)
+		self.assertLess(calls, fullcalls)
+
+	def test_by_name(self):
+		cont, collector, _ = self.check(["brocade_mem_usage_plugin"])
+		self.assertEqual([metric.label for metric in collector.metrics], ["dynmem"])
+
+	def test_nested_by_name(self):
+		case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+		cont, collector, _ = self.check(["brocade_stacking_topology_plugin"], case)
+		self.assertTrue(cont.selection.matched)
+		self.assertEqual(collector.state(), nssct.report.CRITICAL)
+		self.assertEqual([str(alert) for alert in collector.alerts[nssct.report.CRITICAL]],
+						["CRITICAL - stacking topology is other"])
+
+	def test_unmatched(self):
+		cont, collector, _ = self.check(["nonexistent"])
+		self.assertFalse(cont.selection.matched)
+		self.assertEqual(collector.metrics, [])
+
+class LargeWalkTests(unittest.TestCase):
+	rows = 10000
+	base = (1, 3, 6, 1, 4, 1, 99999, 1)
+
+	def setUp(self):
+		dump = [u".%s.%d = INTEGER: %d" % (".".join(map(str, self.base)), i, i) for i in range(self.rows)]
+		self.backend = nssct.backend.mock.MockBackend(dump)
+
+	def walk(self, engine):
+		cont = nssct.controller.Controller(engine)
+		collector = nssct.report.Collector()
+		@nssct.future.coroutine
+		def plugin(controller, collector):
+			count = 0
+			fut = nssct.plugins.snmpwalk(controller, self.base)
+			while (yield fut):
+				_, _, fut = fut.result()
+				count += 1
+			collector.add_alert(nssct.report.Alert(nssct.report.OK, "%d rows" % count))
+		cont.run(collector, [plugin])
+		self.assertEqual(cont.pending_plugins, [])
+		self.assertEqual([alert.message for alert in collector.alerts[nssct.report.OK]], ["%d rows" % self.rows])
+
+	def test_simple(self):
+		self.walk(nssct.engine.SimpleEngine(self.backend))
+
+	def test_cached(self):
+		engine = nssct.engine.CachingEngine(nssct.engine.SimpleEngine(self.backend))
+		self.walk(engine)
+		self.walk(engine)  # served from the cache
+
+	def test_bulk_cached(self):
+		self.walk(nssct.engine.CachingEngine(nssct.engine.BulkEngine(self.backend, lookahead=16)))
+
+class CountingBackend(nssct.backend.mock.MockBackend):
+	def __init__(self, dump):
+		nssct.backend.mock.MockBackend.__init__(self, dump)
+		self.calls = 0
+
+	def get(self, oid):
+		self.calls += 1
+		return nssct.backend.mock.MockBackend.get(self, oid)
+
+	def getnext(self, oid):
+		self.calls += 1
+		return nssct.backend.mock.MockBackend.getnext(self, oid)
+
+	def getbulk(self, oids, nonrep, maxrep):
+		self.calls += 1
+		# the default implementation is backed by getnext
+		calls = self.calls
+		try:
+			return nssct.backend.mock.MockBackend.getbulk(self, oids, nonrep, maxrep)
+		finally:
+			self.calls = calls
+
+class EngineWalkTests(unittest.TestCase):
+	base = (1, 3, 6, 1, 4, 1, 99999, 1)
+	rows = [((1, 3, 6, 1, 4, 1, 99999, 1, i), i) for i in range(1, 101)]
+
+	def setUp(self):
+		dump = [u".1.2.3 = INTEGER: 1"]
+		dump.extend(u".%s = INTEGER: %d" % (".".join(map(str, oid)), value) for oid, value in self.rows)
+		dump.append(u".1.3.6.1.4.1.99999.2.1 = INTEGER: 1")
+		self.backend = CountingBackend(dump)
+
+	def engines(self):
+		yield nssct.engine.SimpleEngine(self.backend)
+		yield nssct.engine.CachingEngine(nssct.engine.SimpleEngine(self.backend))
+		yield nssct.engine.BulkEngine(self.backend)
+		yield nssct.engine.BulkEngine(self.backend, lookahead=9)
+		yield nssct.engine.CachingEngine(nssct.engine.BulkEngine(self.backend, lookahead=9))
+
+	def run_engine(self, engine, fut):
+		while engine.step():
+			pass
+		return fut.result()
+
+	def test_walk_all(self):
+		for engine in self.engines():
+			rows = self.run_engine(engine, engine.walk_all(self.base))
+			self.assertEqual([(oid, int(value)) for oid, value in rows], self.rows)
+
+	def test_walk_start(self):
+		for engine in self.engines():
+			fut = engine.walk(self.base, self.rows[89][0])
+			rows = []
+			while fut:
+				batch, fut = self.run_engine(engine, fut)
+				rows.extend(oid for oid, _ in batch)
+			self.assertEqual(rows, [oid for oid, _ in self.rows[90:]])
+
+	def test_walk_empty(self):
+		for engine in self.engines():
+			self.assertEqual(self.run_engine(engine, engine.walk_all((1, 3, 6, 1, 4, 1, 99998))), [])
+			self.assertEqual(self.run_engine(engine, engine.walk_all((1, 3, 6, 1, 4, 1, 99999, 2, 1))), [])
+
+	def test_bulk_batches(self):
+		engine = nssct.engine.BulkEngine(self.backend, lookahead=9)
+		fut = engine.walk(self.base)
+		batches = 0
+		while fut:
+			batch, fut = self.run_engine(engine, fut)
+			self.assertTrue(len(batch) <= 10)
+			batches += 1
+		self.assertEqual(batches, 11)
+		self.assertEqual(self.backend.calls, 11)
+
+	def test_cached_walk(self):
+		engine = nssct.engine.CachingEngine(nssct.engine.BulkEngine(self.backend, lookahead=9))
+		self.run_engine(engine, engine.walk_all(self.base))
+		calls = self.backend.calls
+		rows = self.run_engine(engine, engine.walk_all(self.base))
+		self.assertEqual(len(rows), len(self.rows))
+		self.assertEqual(self.backend.calls, calls)
+
+class TableTests(unittest.TestCase):
+	def setUp(self):
+		dump = [u".1.3.6.1.4.1.99999.1.1.%d = INTEGER: %d" % (i, i) for i in range(1, 21)]
+		dump.extend(u".1.3.6.1.4.1.99999.1.2.%d = INTEGER: %d" % (i, 10 * i) for i in range(1, 21) if i != 5)
+		self.backend = CountingBackend(dump)
+
+	def test_table(self):
+		engine = nssct.engine.BulkEngine(self.backend, lookahead=9)
+		cont = nssct.controller.Controller(engine)
+		fut = nssct.plugins.table(cont, ((1, 3, 6, 1, 4, 1, 99999, 1, 1), (1, 3, 6, 1, 4, 1, 99999, 1, 2)))
+		while engine.step():
+			pass
+		rows = [(index, [None if value is None else int(value) for value in values]) for index, values in fut.result()]
+		self.assertEqual(len(rows), 20)
+		self.assertEqual(rows[0], ((1,), [1, 10]))
+		self.assertEqual(rows[4], ((5,), [5, None]))
+		# both columns share the bulk requests
+		self.assertEqual(self.backend.calls, 3)
+
+class SelectRowsTests(unittest.TestCase):
+	column = (1, 3, 6, 1, 4, 1, 99999, 1, 4)
+	cpus = [(slot, cpu) for slot in (1, 2, 3) for cpu in (1, 2)]
+
+	def setUp(self):
+		dump = [u".1.3.6.1.4.1.99999.1.4.%d.%d.%d = INTEGER: %d" % (slot, cpu, interval, slot * 10 + cpu)
+				for slot, cpu in self.cpus for interval in (1, 5, 60, 300)]
+		dump.append(u".1.3.6.1.4.1.99999.1.5.1.1.1 = INTEGER: 0")
+		self.backend = CountingBackend(dump)
+
+	def select(self, cont):
+		fut = nssct.plugins.table_indices(cont, self.column, 2)
+		self.assertIs(fut, nssct.plugins.table_indices(cont, self.column, 2))
+		while cont.engine.step():
+			pass
+		fut = nssct.plugins.select_rows(cont, self.column, [cpu + (300,) for cpu in fut.result()] + [(9, 9, 300)])
+		while cont.engine.step():
+			pass
+		self.assertEqual([(index, int(value)) for index, value in fut.result()],
+						[(cpu + (300,), cpu[0] * 10 + cpu[1]) for cpu in self.cpus])
+
+	def test_skipscan(self):
+		self.select(nssct.controller.Controller(nssct.engine.SimpleEngine(self.backend)))
+		# one getnext per cpu and one to find the end, then one get per row
+		self.assertEqual(self.backend.calls, 2 * len(self.cpus) + 2)
+
+	def test_batched(self):
+		self.select(nssct.controller.Controller(nssct.engine.BulkEngine(self.backend)))
+		self.assertEqual(self.backend.calls, len(self.cpus) + 2)
+
+	def test_walked(self):
+		cont = nssct.controller.Controller(nssct.engine.SimpleEngine(self.backend))
+		cont.walk(self.column)
+		calls = self.backend.calls
+		self.select(cont)
+		# the indices are taken from the walk
+		self.assertEqual(self.backend.calls, calls + len(self.cpus) + 1)
+
+class BrocadeCpuTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-5.log")
+	column = nssct.plugins.brocade.snAgentCpuUtilValue
+
+	def pdus(self, create, function):
+		backend = CountingBackend(self.case)
+		cont = nssct.controller.Controller(create(backend))
+		collector = nssct.report.Collector()
+		function(cont, collector)
+		return backend.calls, collector
+
+	def plugin(self, cont, collector):
+		cont.run(collector, [nssct.plugins.brocade.brocade_cpu_usage_plugin])
+
+	def walk(self, cont, collector):
+		fut = cont.walk_all(self.column)
+		while cont.engine.step():
+			pass
+		self.assertTrue(fut.done())
+
+	def test_bulk(self):
+		create = lambda backend: nssct.engine.BulkEngine(backend, lookahead=7)
+		calls, collector = self.pdus(create, self.plugin)
+		# as many PDUs as walking the column as the plugin did before
+		self.assertEqual(calls, self.pdus(create, self.walk)[0])
+		self.assertEqual(calls, 4)
+		self.assertEqual(len(collector.metrics), 6)
+
+	def test_simple(self):
+		create = nssct.engine.SimpleEngine
+		calls, collector = self.pdus(create, self.plugin)
+		self.assertLess(calls, self.pdus(create, self.walk)[0])
+		self.assertEqual(len(collector.metrics), 6)
+
+	def test_caching_simple(self):
+		create = lambda backend: nssct.engine.CachingEngine(nssct.engine.SimpleEngine(backend))
+		calls, collector = self.pdus(create, self.plugin)
+		# the cache must not make the plugin walk the whole column
+		self.assertEqual(calls, self.pdus(nssct.engine.SimpleEngine, self.plugin)[0])
+		self.assertEqual(len(collector.metrics), 6)
+
+	def test_caching_bulk(self):
+		create = lambda backend: nssct.engine.CachingEngine(nssct.engine.BulkEngine(backend, lookahead=7))
+		calls, _ = self.pdus(create, self.plugin)
+		self.assertEqual(calls, 4)
+
+	def test_same_metrics(self):
+		outputs = set()
+		for create in (nssct.engine.SimpleEngine, lambda backend: nssct.engine.BulkEngine(backend, lookahead=7),
+						lambda backend: nssct.engine.CachingEngine(nssct.engine.SimpleEngine(backend))):
+			outputs.add(tuple(map(str, self.pdus(create, self.plugin)[1].metrics)))
+		self.assertEqual(len(outputs), 1)
+
+class SharedWalkTests(unittest.TestCase):
+	base = (1, 3, 6, 1, 4, 1, 99999, 1)
+	rows = 100
+
+	def setUp(self):
+		dump = [u".%s.%d = INTEGER: %d" % (".".join(map(str, self.base)), i, i) for i in range(1, self.rows + 1)]
+		dump.append(u".1.3.6.1.4.1.99999.2.1 = INTEGER: 1")
+		self.backend = CountingBackend(dump)
+
+	def run_engine(self, engine, fut):
+		while engine.step():
+			pass
+		return fut.result()
+
+	def run_walks(self, engine, sequential):
+		cont = nssct.controller.Controller(engine)
+		first = nssct.plugins.walk_all(cont, self.base)
+		if sequential:
+			self.run_engine(engine, first)
+		second = nssct.plugins.walk_all(cont, self.base)
+		self.assertEqual(self.run_engine(engine, second), self.run_engine(engine, first))
+		return cont
+
+	def test_shared(self):
+		for sequential in (False, True):
+			for engine in (nssct.engine.SimpleEngine(self.backend), nssct.engine.BulkEngine(self.backend, lookahead=9)):
+				self.backend.calls = 0
+				self.run_engine(engine, engine.walk_all(self.base))
+				calls = self.backend.calls
+				self.backend.calls = 0
+				cont = self.run_walks(engine, sequential)
+				self.assertEqual(self.backend.calls, calls)
+				self.assertEqual(cont.counters["walk_joined"], 1)
+				self.assertEqual(cont.counters["walk_shared_rows"], self.rows)
+
+class CachingTests(unittest.TestCase):
+	def setUp(self):
+		self.backend = CountingBackend([u".1.3.6.1.2.1.1.2.0 = OID: 0.1.2.3"])
+		self.engine = nssct.engine.CachingEngine(nssct.engine.BulkEngine(self.backend))
+
+	def test_coalesce_get(self):
+		res1 = self.engine.get((1, 3, 6, 1, 2, 1, 1, 2, 0))
+		res2 = self.engine.get((1, 3, 6, 1, 2, 1, 1, 2, 0))
+		while self.engine.step():
+			pass
+		self.assertEqual(res1.result(), res2.result())
+		self.assertEqual(self.backend.calls, 1)
+		self.assertEqual(self.engine.counters["get_coalesced"], 1)
+		self.assertEqual(self.engine.pendingget, {})
+
+	def test_coalesce_getnext(self):
+		res1 = self.engine.getnext((1, 3))
+		res2 = self.engine.getnext((1, 3))
+		while self.engine.step():
+			pass
+		self.assertEqual(res1.result(), res2.result())
+		self.assertEqual(self.backend.calls, 1)
+		self.assertEqual(self.engine.pendingnext, {})
+
+	def test_negative(self):
+		for _ in range(2):
+			res = self.engine.get((1, 2, 3, 4))
+			while self.engine.step():
+				pass
+			self.assertRaises(nssct.engine.NoSuchObjectError, res.result)
+		self.assertEqual(self.backend.calls, 1)
+		self.assertEqual(self.engine.counters["get_negative"], 1)
+		self.assertEqual(self.engine.pendingget, {})
+
+class FactsTests(unittest.TestCase):
+	def setUp(self):
+		self.backend = CountingBackend([u".1.3.6.1.2.1.1.2.0 = OID: 0.1.2.3"])
+		self.controller = nssct.controller.Controller(nssct.engine.SimpleEngine(self.backend))
+
+	def test_memoized(self):
+		res1 = self.controller.facts.get(nssct.plugins.sys_object_id)
+		res2 = self.controller.facts.get(nssct.plugins.sys_object_id)
+		self.assertIs(res1, res2)
+		while self.controller.engine.step():
+			pass
+		self.assertEqual(res1.result(), (0, 1, 2, 3))
+		self.assertEqual(self.backend.calls, 1)
+
+	def test_set(self):
+		self.controller.facts.set(nssct.plugins.agent_address, "192.0.2.1")
+		self.assertEqual(self.controller.facts.get(nssct.plugins.agent_address).result(), "192.0.2.1")
+		self.assertEqual(self.backend.calls, 0)
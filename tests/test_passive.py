@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import nssct.backend.mock
+import nssct.main
+import nssct.report
+
+class PassiveTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def run_check(self, *argv):
+		args = nssct.main.build_parser().parse_args(["--mock", self.case] + list(argv))
+		return nssct.main.run(args, nssct.backend.mock.MockBackend(self.case))
+
+	def test_command_file(self):
+		path = os.path.join(self.directory, "nagios.cmd")
+		open(path, "w").close()
+		collector = self.run_check("--host", "sw1", "--service", "CPU=cpu", "--service", "Stack=stack", "--command-file", path)
+		self.assertEqual(collector.state(), nssct.report.OK)
+		with open(path) as cmdfile:
+			lines = cmdfile.read().splitlines()
+		self.assertEqual(len(lines), 2)
+		fields = lines[0].split(";", 4)
+		self.assertEqual(fields[1:4], ["sw1", "CPU", "0"])
+		self.assertTrue(fields[4].startswith("OK - cpu_1_1="))
+		fields = lines[1].split(";", 4)
+		self.assertEqual(fields[1:4], ["sw1", "Stack", "2"])
+		self.assertEqual(fields[4], "CRITICAL - stacking topology is other\\nOK - stacking switch with 2 units")
+
+	def test_command_file_not_read(self):
+		path = os.path.join(self.directory, "nagios.cmd")
+		os.mkfifo(path)
+		results = []
+		thread = threading.Thread(target=lambda: results.append(
+			self.run_check("--host", "sw1", "--service", "CPU=cpu", "--command-file", path)))
+		thread.daemon = True  # opening the pipe used to block forever
+		thread.start()
+		thread.join(10)
+		self.assertEqual(len(results), 1)
+		self.assertEqual(results[0].state(), nssct.report.UNKNOWN)
+		self.assertIn("nagios does not read the command file", str(results[0]))
+
+	def test_checkresult_dir(self):
+		full = self.run_check("--select", "environment")
+		self.run_check("--host", "sw1", "--service", "Env=environment", "--checkresult-dir", self.directory)
+		names = sorted(os.listdir(self.directory))
+		self.assertEqual(len(names), 2)
+		self.assertEqual(len(names[0]), 7)
+		self.assertEqual(names[1], names[0] + ".ok")
+		with open(os.path.join(self.directory, names[0])) as resultfile:
+			lines = resultfile.read().splitlines()
+		self.assertIn("service_description=Env", lines)
+		self.assertIn("return_code=%d" % full.state(), lines)
+		self.assertIn("output=%s" % str(full).replace("\n", "\\n"), lines)
+
+	def test_usage_error(self):
+		collector = self.run_check("--service", "CPU=cpu")
+		self.assertEqual(collector.state(), nssct.report.UNKNOWN)
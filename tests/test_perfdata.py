@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import nssct.backend.mock
+import nssct.main
+import nssct.perfdata
+import nssct.report
+
+class PerfdataTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.spooldir = os.path.join(self.directory, "spool")
+
+	def tearDown(self):
+		nssct.perfdata.flush_all()
+		nssct.perfdata._spools.clear()
+		shutil.rmtree(self.directory)
+
+	def collector(self, value):
+		collector = nssct.report.Collector()
+		collector.add_metric(nssct.report.PerfMetric("cpu", value, "%"))
+		return collector
+
+	def spooled(self):
+		"""@returns: the lines of all spool files ordered by name"""
+		lines = []
+		for name in sorted(os.listdir(self.spooldir)):
+			self.assertFalse(name.startswith("."))
+			with open(os.path.join(self.spooldir, name)) as spoolfile:
+				lines.append(spoolfile.read().splitlines())
+		return lines
+
+	def test_batches(self):
+		spool = nssct.perfdata.Spool(self.spooldir, "line", batch=2, delay=60)
+		spool.add("sw1", [("CPU %d" % i, self.collector(i)) for i in range(5)], now=1000)
+		self.assertEqual([len(lines) for lines in self.spooled()], [2, 2])
+		spool.flush()
+		lines = self.spooled()
+		self.assertEqual([len(lines) for lines in lines], [2, 2, 1])
+		self.assertEqual(lines[2], ["nssct,host=sw1,service=CPU\\ 4,label=cpu,uom=% value=4.0 1000000000000"])
+
+	def test_delay(self):
+		spool = nssct.perfdata.Spool(self.spooldir, "npcd", batch=100, delay=0.05)
+		spool.add("sw1", [("CPU", self.collector(1))])
+		self.assertEqual(self.spooled(), [])
+		time.sleep(0.2)
+		self.assertEqual(len(self.spooled()), 1)
+
+	def test_passive(self):
+		path = os.path.join(self.directory, "nagios.cmd")
+		open(path, "w").close()
+		args = nssct.main.build_parser().parse_args(["--mock", self.case, "--host", "sw1", "--service", "CPU=cpu",
+													"--command-file", path, "--perfdata-dir", self.spooldir])
+		collector = nssct.main.run(args, nssct.backend.mock.MockBackend(self.case))
+		self.assertEqual(collector.state(), nssct.report.OK)
+		with open(path) as cmdfile:
+			line = cmdfile.read()
+		self.assertIn(";CPU;0;OK - ", line)
+		self.assertNotIn("|", line)
+		nssct.perfdata.flush_all()
+		lines = self.spooled()
+		self.assertEqual(len(lines), 1)
+		self.assertEqual(len(lines[0]), 1)
+		self.assertIn("\tSERVICEPERFDATA::cpu_1_1=", lines[0][0])
+
+	def test_usage_error(self):
+		args = nssct.main.build_parser().parse_args(["--mock", self.case, "--perfdata-dir", self.spooldir])
+		collector = nssct.main.run(args, nssct.backend.mock.MockBackend(self.case))
+		self.assertEqual(collector.state(), nssct.report.UNKNOWN)
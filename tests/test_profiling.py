@@ -0,0 +1,115 @@
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import nssct.backend.mock
+import nssct.future
+import nssct.plugins
+import nssct.profiling
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+class SlowBackend(nssct.backend.mock.MockBackend):
+	def __init__(self, filename, clock):
+		nssct.backend.mock.MockBackend.__init__(self, filename)
+		self.clock = clock
+
+	def get(self, oid):
+		self.clock.now += 0.5
+		return nssct.backend.mock.MockBackend.get(self, oid)
+
+class ProfilingTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-hp-1.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_nested_phases(self):
+		clock = FakeClock()
+		timer = nssct.profiling.PhaseTimer(clock)
+		back = nssct.profiling.TimedBackend(SlowBackend(self.case, clock), timer)
+		with timer.phase("poll"):
+			clock.now += 1.0
+			back.get((1, 3, 6, 1, 2, 1, 1, 2, 0))
+			back.get((1, 3, 6, 1, 2, 1, 1, 2, 0))
+		with timer.phase("poll"):
+			clock.now += 0.25
+		self.assertEqual(dict(timer.durations), dict(poll=1.25, snmp=1.0))
+		self.assertEqual(timer.total(), 2.25)
+		self.assertEqual([str(metric) for metric in timer.metrics()], ["phase_poll=1250.0ms;;;0", "phase_snmp=1000.0ms;;;0"])
+
+	def test_exception(self):
+		timer = nssct.profiling.PhaseTimer()
+		with self.assertRaises(ValueError):
+			with timer.phase("parse"):
+				raise ValueError()
+		self.assertEqual(list(timer.durations), ["parse"])
+		self.assertEqual(timer.stack, [])
+
+	def run_main(self, *argv):
+		proc = subprocess.Popen([sys.executable, "-m", "nssct.main", "--mock", self.case, "--level", "ERROR"] + list(argv),
+								stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+								cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+		output = proc.communicate()[0].decode("ascii")
+		self.assertEqual(proc.returncode, 0)
+		return output
+
+	def test_main(self):
+		filename = os.path.join(self.directory, "check.prof")
+		output = self.run_main("--phase-perfdata", "--profile", filename, "--profile-memory", "3")
+		perfdata = output.split("|")[1].split()
+		phases = [metric.split("=")[0] for metric in perfdata if metric.startswith("phase_")]
+		self.assertEqual(phases[:4], ["phase_imports", "phase_parse", "phase_backend", "phase_poll"])
+		self.assertEqual(sorted(phases[4:]), ["phase_detect", "phase_engine", "phase_flush", "phase_plugins", "phase_snmp"])
+		self.assertGreater(pstats.Stats(filename).total_calls, 0)
+
+	def test_failure_profile(self):
+		filename = os.path.join(self.directory, "check.prof")
+		proc = subprocess.Popen([sys.executable, "-m", "nssct.main", "--agent", "nonexistent.invalid", "--level", "CRITICAL",
+								"--profile", filename],
+								stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+								cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+		proc.communicate()
+		self.assertNotEqual(proc.returncode, 0)
+		self.assertGreater(pstats.Stats(filename).total_calls, 0)
+
+	def test_task_phases(self):
+		clock = FakeClock()
+		timer = nssct.profiling.PhaseTimer(clock)
+		@nssct.plugins.tags("cpu")
+		def plugin():
+			clock.now += 2.0
+			return nssct.future.completed()
+		def detect():
+			clock.now += 1.0
+			nssct.future.run_in_task(plugin, plugin)
+			clock.now += 0.5
+			return nssct.future.completed()
+		previous = nssct.future.set_task_profiler(nssct.profiling.TaskPhases(timer))
+		try:
+			nssct.future.run_in_task(detect, detect)
+		finally:
+			nssct.future.set_task_profiler(previous)
+		self.assertEqual(dict(timer.durations), dict(detect=1.5, plugins=2.0))
+
+	def test_stored_result(self):
+		resultdir = os.path.join(self.directory, "results")
+		outputs = [self.run_main("--phase-perfdata", "--result-cache", resultdir) for _ in range(2)]
+		first, second = [[metric.split("=")[0] for metric in output.split("|")[1].split()] for output in outputs]
+		self.assertEqual([label for label in second if not label.startswith("phase_")],
+						[label for label in first if not label.startswith("phase_")])
+		# the stored result does not wait for the agent
+		self.assertEqual([label for label in second if label.startswith("phase_")],
+						["phase_imports", "phase_parse", "phase_backend", "phase_poll", "phase_flush"])
@@ -0,0 +1,50 @@
+import unittest
+
+import nssct.plugins.registry
+
+class RegistryTests(unittest.TestCase):
+	def setUp(self):
+		self.registry = nssct.plugins.registry.VendorRegistry(entry_point_group=None)
+		self.loaded = []
+
+	def loader(self, name):
+		def load():
+			self.loaded.append(name)
+			return name
+		return load
+
+	def test_longest_prefix(self):
+		self.registry.register("vendor", (1, 3, 6, 1, 4, 1, 99), self.loader("vendor"))
+		self.registry.register("family", (1, 3, 6, 1, 4, 1, 99, 1, 2), self.loader("family"))
+		self.assertEqual(self.registry.lookup((1, 3, 6, 1, 4, 1, 99, 1, 2, 3)).name, "family")
+		self.assertEqual(self.registry.lookup((1, 3, 6, 1, 4, 1, 99, 1, 3)).name, "vendor")
+		self.assertEqual(self.registry.lookup((1, 3, 6, 1, 4, 1, 99, 1)).name, "vendor")
+		self.assertIsNone(self.registry.lookup((1, 3, 6, 1, 4, 1, 98, 1)))
+		self.assertIsNone(self.registry.lookup((1, 3)))
+
+	def test_lazy(self):
+		for i in range(500):
+			self.registry.register("vendor%d" % i, (1, 3, 6, 1, 4, 1, i), self.loader("vendor%d" % i))
+		found = self.registry.lookup((1, 3, 6, 1, 4, 1, 123, 7))
+		self.assertEqual(self.loaded, [])
+		self.assertEqual(found.load(), "vendor123")
+		self.assertEqual(found.load(), "vendor123")
+		self.assertEqual(self.loaded, ["vendor123"])
+		self.assertEqual(len(self.registry.vendors()), 500)
+
+	def test_import_target(self):
+		self.registry.register("mock", (1, 2), "nssct.backend.mock:MockBackend")
+		import nssct.backend.mock
+		self.assertIs(self.registry.lookup((1, 2, 3)).load(), nssct.backend.mock.MockBackend)
+
+	def test_entry_points(self):
+		registry = nssct.plugins.registry.VendorRegistry()
+		# there are no third party vendors installed, but scanning must work
+		self.assertIsNone(registry.lookup((1, 2, 3)))
+		self.assertEqual(registry.entry_point_trie, {})
+
+	def test_entry_points_on_miss(self):
+		registry = nssct.plugins.registry.VendorRegistry()
+		registry.register("vendor", (1, 2), self.loader("vendor"))
+		self.assertEqual(registry.lookup((1, 2, 3)).name, "vendor")
+		self.assertIsNone(registry.entry_point_trie)
@@ -0,0 +1,117 @@
+import decimal
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import nssct.backend.mock
+import nssct.main
+import nssct.report
+import nssct.resultcache
+
+class CountingBackend(nssct.backend.mock.MockBackend):
+	def __init__(self, filename):
+		nssct.backend.mock.MockBackend.__init__(self, filename)
+		self.queries = 0
+
+	def get(self, oid):
+		self.queries += 1
+		return nssct.backend.mock.MockBackend.get(self, oid)
+
+	def getnext(self, oid):
+		self.queries += 1
+		return nssct.backend.mock.MockBackend.getnext(self, oid)
+
+class ResultCacheTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.now = 1000.0
+		self.cache = nssct.resultcache.ResultCache(self.directory, max_age=60, clock=lambda: self.now)
+		self.polls = 0
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def poll(self, state=nssct.report.OK):
+		self.polls += 1
+		collector = nssct.report.Collector()
+		collector.add_alert(nssct.report.Alert(state, "poll %d" % self.polls))
+		return collector
+
+	def test_fresh(self):
+		first = self.cache.lookup("key", self.poll)
+		second = self.cache.lookup("key", self.poll)
+		self.assertEqual(self.polls, 1)
+		self.assertEqual(str(second), str(first))
+		self.assertEqual(second.state(), nssct.report.OK)
+		self.cache.lookup("other", self.poll)
+		self.assertEqual(self.polls, 2)
+
+	def test_collector(self):
+		def poll():
+			collector = nssct.report.Collector()
+			collector.add_alert(nssct.report.Alert(nssct.report.WARNING, "fan"))
+			collector.add_metric(nssct.report.PerfMetric("temp", decimal.Decimal("40.5"), "C", 40, "@60:70", 0))
+			collector.add_metric(nssct.report.PerfMetric("load", 0.25))
+			return collector
+		first = self.cache.lookup("key", poll)
+		second = self.cache.lookup("key", poll)
+		self.assertIsInstance(second, nssct.report.Collector)
+		self.assertEqual(second.output(), first.output())
+		self.assertEqual(second.output(perfdata=False), first.output(perfdata=False))
+		self.assertEqual([str(metric) for metric in second.metrics], ["temp=40.5C;40;@60:70;0", "load=0.25"])
+		self.assertEqual(sorted(second.alerts), [nssct.report.OK, nssct.report.WARNING])
+
+	def test_corrupted(self):
+		with open(os.path.join(self.directory, "result-key"), "w") as resultfile:
+			resultfile.write('{"time": 1000.0, "alerts": [[7, "spam"]], "metrics": []}')
+		self.assertEqual(str(self.cache.lookup("key", self.poll)), "OK - poll 1")
+
+	def test_stale(self):
+		self.cache.lookup("key", self.poll)
+		self.now += 61
+		self.assertEqual(str(self.cache.lookup("key", self.poll)), "OK - poll 2")
+
+	def test_unknown(self):
+		self.cache.lookup("key", lambda: self.poll(nssct.report.UNKNOWN))
+		self.cache.lookup("key", self.poll)
+		self.assertEqual(self.polls, 2)
+
+	def test_concurrent(self):
+		def slowpoll():
+			time.sleep(0.1)
+			return self.poll()
+		results = []
+		threads = [threading.Thread(target=lambda: results.append(str(self.cache.lookup("key", slowpoll))))
+					for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(self.polls, 1)
+		self.assertEqual(results, ["OK - poll 1"] * 4)
+
+	def run_check(self, *argv):
+		args = nssct.main.build_parser().parse_args(["--mock", self.case, "--result-cache", self.directory] + list(argv))
+		backend = CountingBackend(self.case)
+		return nssct.main.run(args, backend), backend.queries
+
+	def test_check(self):
+		first, queries = self.run_check()
+		self.assertGreater(queries, 0)
+		second, queries = self.run_check()
+		self.assertEqual(queries, 0)
+		self.assertEqual(str(second), str(first))
+		self.assertEqual(second.state(), first.state())
+		_, queries = self.run_check("--select", "cpu")
+		self.assertGreater(queries, 0)
+
+	def test_trace(self):
+		self.run_check()
+		_, queries = self.run_check("--trace", os.path.join(self.directory, "trace.json"))
+		self.assertGreater(queries, 0)
+		self.assertTrue(os.path.exists(os.path.join(self.directory, "trace.json")))
@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+
+import nssct.scheduler
+
+class SchedulerTests(unittest.TestCase):
+	def setUp(self):
+		self.lock = threading.Lock()
+		self.active = {}
+		self.maxactive = 0
+		self.starts = []
+
+	def execute(self, argv, duration=0.0):
+		with self.lock:
+			self.assertNotIn(argv[0], self.active)  # never concurrent with itself
+			self.active[argv[0]] = True
+			self.maxactive = max(self.maxactive, len(self.active))
+			self.starts.append((argv[0], time.time()))
+		time.sleep(duration)
+		with self.lock:
+			del self.active[argv[0]]
+
+	def run_scheduler(self, jobs, execute, duration, **kwargs):
+		sched = nssct.scheduler.Scheduler(jobs, execute, **kwargs)
+		sched.run(until=time.time() + duration)
+		sched.stop()
+		time.sleep(0.1)  # let running jobs finish
+		return sched
+
+	def test_periodic(self):
+		job = nssct.scheduler.Job(0.05, ["a"])
+		self.run_scheduler([job], self.execute, 0.5, jitter=0.1)
+		# the first run happens within the first interval
+		self.assertGreaterEqual(job.runs, 8)
+		self.assertLessEqual(job.runs, 11)
+		self.assertEqual(job.overruns, 0)
+
+	def test_concurrency(self):
+		jobs = [nssct.scheduler.Job(0.05, [str(i)]) for i in range(10)]
+		self.run_scheduler(jobs, lambda argv: self.execute(argv, 0.03), 0.4, concurrency=3)
+		self.assertEqual(self.maxactive, 3)
+		self.assertTrue(sum(job.skipped for job in jobs) > 0)
+
+	def test_overrun(self):
+		job = nssct.scheduler.Job(0.05, ["slow"])
+		self.run_scheduler([job], lambda argv: self.execute(argv, 0.12), 0.6)
+		self.assertGreater(job.overruns, 0)
+		self.assertGreater(job.skipped, 0)
+		starts = [start for _, start in self.starts]
+		# runs are not started back to back
+		for first, second in zip(starts, starts[1:]):
+			self.assertGreaterEqual(second - first, 0.12)
+
+	def test_exception(self):
+		job = nssct.scheduler.Job(0.05, ["fail"])
+		def execute(argv):
+			raise ValueError("oops")
+		self.run_scheduler([job], execute, 0.3)
+		self.assertGreater(job.runs, 2)
+
+	def test_parse(self):
+		self.assertRaises(ValueError, nssct.scheduler.parse_schedule, ["--agent 192.0.2.1"])
+		self.assertRaises(ValueError, nssct.scheduler.parse_schedule, ["0 --agent 192.0.2.1"])
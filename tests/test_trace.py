@@ -0,0 +1,80 @@
+import collections
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import nssct.backend.mock
+import nssct.controller
+import nssct.engine
+import nssct.future
+import nssct.main
+import nssct.report
+import nssct.trace
+from nssct.plugins import detect
+
+class TraceTests(unittest.TestCase):
+	case = os.path.join(os.path.dirname(__file__), os.pardir, "cases", "cygnus-brocade-8.log")
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def run_check(self, create):
+		tracer = nssct.trace.Tracer()
+		back = nssct.trace.TracingBackend(nssct.backend.mock.MockBackend(self.case), tracer)
+		eng = nssct.trace.TracingEngine(create(back), tracer)
+		control = nssct.controller.Controller(eng, tracer=tracer)
+		control.run(nssct.report.Collector(), [detect.detect])
+		return control, tracer
+
+	def events(self, tracer, cat, ph=None):
+		return [event for event in tracer.events if event.get("cat") == cat and (ph is None or event["ph"] == ph)]
+
+	def test_bulk(self):
+		control, tracer = self.run_check(lambda back: nssct.engine.BulkEngine(back, lookahead=7))
+		plugins = self.events(tracer, "plugin")
+		self.assertEqual(len(plugins), control.counters["plugin_started"])
+		self.assertEqual(plugins[0]["name"], "detect")
+		begins = self.events(tracer, "request", "b")
+		ends = self.events(tracer, "request", "e")
+		self.assertEqual(sorted(event["id"] for event in begins), sorted(event["id"] for event in ends))
+		self.assertIn("brocade_fan_table_plugin", set(event["args"]["plugin"] for event in begins))
+		pdus = self.events(tracer, "pdu")
+		self.assertEqual(len(pdus), tracer.pdus)
+		self.assertEqual(set(event["args"]["served_by"] for event in ends),
+						set("pdu %d" % i for i in range(1, tracer.pdus + 1)))
+		steps = self.events(tracer, "step")
+		self.assertEqual(len(steps), tracer.steps)
+		self.assertEqual(sum(event["args"]["pdus"] for event in steps), tracer.pdus)
+
+	def test_cache(self):
+		_, tracer = self.run_check(lambda back: nssct.engine.CachingEngine(nssct.engine.SimpleEngine(back)))
+		served = collections.Counter(event["args"]["served_by"] for event in self.events(tracer, "request", "e"))
+		self.assertGreater(served["no pdu"], 0)
+
+	def test_failure_without_collector(self):
+		@nssct.future.coroutine
+		def failing(controller, collector):
+			yield nssct.future.completed()
+			raise ValueError("spam")
+		tracer = nssct.trace.Tracer()
+		control = nssct.controller.Controller(nssct.engine.SimpleEngine(nssct.backend.mock.MockBackend(self.case)), tracer=tracer)
+		with self.assertLogs("nssct", "ERROR") as logs:
+			control.run(None, [failing])
+		self.assertEqual([record.name for record in logs.records], ["nssct.controller"])
+		self.assertEqual(control.counters["plugin_failed"], 1)
+		self.assertEqual(self.events(tracer, "plugin")[0]["args"]["error"], repr(ValueError("spam")))
+
+	def test_main(self):
+		filename = os.path.join(self.directory, "trace.json")
+		args = nssct.main.build_parser().parse_args(["--mock", self.case, "--bulk", "--trace", filename])
+		collector = nssct.main.run(args, nssct.backend.mock.MockBackend(self.case))
+		self.assertEqual(collector.state(), nssct.report.CRITICAL)
+		with open(filename) as tracefile:
+			trace = json.load(tracefile)
+		self.assertEqual(trace["displayTimeUnit"], "ms")
+		self.assertIn("pdu", set(event.get("cat") for event in trace["traceEvents"]))
@@ -0,0 +1,52 @@
+import io
+import unittest
+
+import nssct.backend.mock
+import nssct.controller
+import nssct.engine
+import nssct.plugins.detect
+import nssct.report
+import nssct.walkgen
+
+class WalkGenTests(unittest.TestCase):
+	def run_check(self, vendor, device, **kwargs):
+		lines = nssct.walkgen.generate(vendor, device, **kwargs)
+		backend = nssct.backend.mock.MockBackend(io.StringIO(u"".join(lines)))
+		self.controller = nssct.controller.Controller(nssct.engine.CachingEngine(nssct.engine.BulkEngine(backend, lookahead=7)))
+		collector = nssct.report.Collector()
+		self.controller.run(collector, [nssct.plugins.detect.detect])
+		self.assertEqual(self.controller.pending_plugins, [])
+		self.assertEqual(self.controller.counters["plugin_failed"], 0)
+		return collector
+
+	def messages(self, collector):
+		return [alert.message for alerts in collector.alerts.values() for alert in alerts]
+
+	def test_brocade(self):
+		collector = self.run_check("brocade", nssct.walkgen.Device(units=12, ports=8, cpus=2, vlans=4))
+		self.assertEqual(collector.state(), nssct.report.OK)
+		metrics = [metric.label for metric in collector.metrics]
+		self.assertEqual(len([label for label in metrics if label.startswith("cpu_")]), 24)
+		self.assertEqual(len([label for label in metrics if label.startswith("chasunit")]), 12)
+		messages = self.messages(collector)
+		self.assertIn("stacking switch with 12 units", messages)
+		self.assertIn("stack psu 12_2 is ok", messages)
+
+	def test_cisco(self):
+		collector = self.run_check("cisco", nssct.walkgen.Device(units=4, psus=3))
+		self.assertEqual(collector.state(), nssct.report.OK)
+		self.assertEqual(len([message for message in self.messages(collector) if message.startswith("psu_")]), 12)
+
+	def test_faults(self):
+		for vendor in sorted(nssct.walkgen.VENDORS):
+			collector = self.run_check(vendor, nssct.walkgen.Device(units=2, ports=2, faults=1.0))
+			self.assertEqual(collector.state(), nssct.report.CRITICAL, vendor)
+
+	def test_missing(self):
+		for vendor in sorted(nssct.walkgen.VENDORS):
+			self.run_check(vendor, nssct.walkgen.Device(units=4, ports=2), missing=0.3)
+
+	def test_seed(self):
+		device = nssct.walkgen.Device(units=2, faults=0.5)
+		self.assertEqual(nssct.walkgen.generate("brocade", device, seed=3), nssct.walkgen.generate("brocade", device, seed=3))
+		self.assertNotEqual(nssct.walkgen.generate("brocade", device, seed=3), nssct.walkgen.generate("brocade", device, seed=4))